@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import time
+from typing import Iterable
+
+import config
+from async_http import send_request_async, get_async_pool
+from cookie_jar import CookieJar
+from metrics import get_registry
+from request_plan import RequestPlan
+from response_check import DEFAULT_CHECK, SuccessCheck
+from retry_policy import (DEFAULT_POLICY, RetryPolicy, circuit_open_result, get_circuit_breaker,
+                          get_retry_budget, next_retry_delay)
+from task_runner import (format_duration, task_concurrency, deadline_passed, time_left, deadline_cancel_message,
+                         DEADLINE_DETAIL)
+
+logger = logging.getLogger('CheckinTask')
+
+
+async def _send_request_with_retry_async(task_name: str, plan: RequestPlan, current_count: str, total_count: str, cookie_jar: CookieJar,
+                                        check: SuccessCheck = DEFAULT_CHECK, policy: RetryPolicy = DEFAULT_POLICY) -> tuple[bool, str]:
+    """
+    _send_request_with_retry 的协程版本，重试等待不会占用线程。
+    """
+    breaker = get_circuit_breaker()
+    get_retry_budget().deposit()
+
+    attempt = 0
+    while True:
+        if not breaker.allow(plan.netloc):
+            result = circuit_open_result(plan.netloc)
+            logger.warning(f"任务 '{task_name}' 第 {current_count}/{total_count} 次发送跳过: {result.message}")
+            return False, result.message
+        if attempt:
+            get_registry().record_retry(task_name, plan.netloc)
+        result = await send_request_async(plan, cookie_jar, task_name, check, time_left())
+        breaker.record(plan.netloc, result, policy)
+        if result.success:
+            return True, "OK"
+        if result.error == 'deadline':
+            return False, DEADLINE_DETAIL
+
+        logger.warning(f"任务 '{task_name}' 第 {current_count}/{total_count} 次发送失败 (尝试 {attempt + 1}/{policy.max_attempts}): {result.message}")
+        delay = next_retry_delay(policy, attempt, result)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    logger.error(f"任务 '{task_name}' 第 {current_count}/{total_count} 次发送失败，共尝试 {attempt + 1} 次。最后错误: {result.message}")
+    return False, result.message
+
+
+async def _run_round_async(task_name: str, requests_list: list[RequestPlan], round_idx: int, count: int,
+                           success_check: SuccessCheck, retry_policy: RetryPolicy) -> tuple[bool, str]:
+    """run_round 的协程版本：按顺序发送所有步骤，步骤间保持 Cookie。"""
+    logger.info(f"任务 '{task_name}': 正在进行第 {round_idx + 1}/{count} 轮执行。")
+    cookie_jar = CookieJar()
+
+    steps_total = len(requests_list)
+    for step_idx, plan in enumerate(requests_list):
+        step_num = step_idx + 1
+        if deadline_passed():
+            return False, DEADLINE_DETAIL
+        if steps_total > 1:
+            logger.info(f"  -> 步骤 {step_num}/{steps_total}: {plan.method} {plan.url}")
+
+        success, msg = await _send_request_with_retry_async(
+            task_name,
+            plan,
+            f"{round_idx+1}-{step_num}",
+            f"{count}-{steps_total}",
+            cookie_jar,
+            success_check if success_check.applies_to(step_num) else DEFAULT_CHECK,
+            retry_policy
+        )
+
+        if msg == DEADLINE_DETAIL:
+            return False, DEADLINE_DETAIL
+        if not success:
+            return False, f"步骤 {step_num} 失败 - {msg}"
+
+    return True, ""
+
+
+async def _run_rounds_concurrently_async(task_name: str, requests_list: list[RequestPlan], count: int,
+                                         interval: float, concurrency: int, success_check: SuccessCheck,
+                                         retry_policy: RetryPolicy) -> tuple[bool, str, int]:
+    """
+    以最多 concurrency 轮同时进行的窗口执行各轮，相邻两轮的开始时间至少间隔 interval 秒。
+    任意一轮失败后不再开始新的轮次，并取消进行中的轮次；到达运行截止时间后不再开始新的轮次。
+    :return: (是否成功, 第一个失败轮次的说明, 成功完成的轮数)
+    """
+    loop = asyncio.get_running_loop()
+    task_to_round = {}
+    pending = set()
+    failure = None
+    completed = 0
+
+    def _check(done):
+        nonlocal failure, completed
+        for round_task in done:
+            success, detail = round_task.result()
+            if success:
+                completed += 1
+            elif detail != DEADLINE_DETAIL and failure is None:
+                failure = f"第 {task_to_round[round_task] + 1} 轮{detail}"
+
+    try:
+        next_start = loop.time()
+        for i in range(count):
+            # 窗口已满或间隔未到时等待，期间已有轮次失败则不再开始新的轮次
+            while failure is None and not deadline_passed():
+                delay = next_start - loop.time()
+                if len(pending) < concurrency and delay <= 0:
+                    break
+                # 有截止时间时最多等到截止时间，以便及时停止开始新的轮次
+                remaining = time_left()
+                timeout = remaining if len(pending) >= concurrency else delay
+                if remaining is not None and timeout is not None:
+                    timeout = max(0.0, min(timeout, remaining))
+                if not pending:
+                    await asyncio.sleep(timeout)
+                    continue
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                _check(done)
+            if failure is not None or deadline_passed():
+                break
+            round_task = asyncio.ensure_future(
+                _run_round_async(task_name, requests_list, i, count, success_check, retry_policy))
+            task_to_round[round_task] = i
+            pending.add(round_task)
+            next_start = loop.time() + interval
+
+        while pending and failure is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            _check(done)
+    finally:
+        # 失败、异常或被取消时，取消仍在进行的轮次
+        for round_task in pending:
+            round_task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return failure is None, failure or "", completed
+
+
+async def run_task_async(task_config: dict, requests_list: list[RequestPlan]) -> dict:
+    """
+    run_task 的协程版本。轮次、步骤、重试与间隔等待均以协程方式执行，
+    返回的结果字典与 run_task 完全一致。
+    """
+    task_name = task_config.get('name', '未命名任务')
+    count = task_config.get('count', 1)
+    interval = task_config.get('interval_seconds', 0)
+    success_msg = task_config.get('success_msg', '任务完成')
+    fail_msg = task_config.get('fail_msg', '任务失败')
+    success_check = SuccessCheck.from_task(task_config)
+    retry_policy = RetryPolicy.from_task(task_config)
+    concurrency = task_concurrency(task_config)
+
+    task_start_time = time.time()
+    logger.info(f"--- [协程开始] 任务: {task_name} ---")
+
+    final_success = True
+    final_message = success_msg
+
+    if concurrency > 1 and count > 1:
+        success, detail, completed = await _run_rounds_concurrently_async(
+            task_name, requests_list, count, interval, concurrency, success_check, retry_policy)
+        if not success:
+            final_success, final_message = False, f"{fail_msg}: {detail}"
+        elif completed < count:
+            final_success, final_message = False, deadline_cancel_message(task_name, completed, count)
+    else:
+        for i in range(count):
+            if deadline_passed():
+                success, detail = False, DEADLINE_DETAIL
+            else:
+                success, detail = await _run_round_async(task_name, requests_list, i, count,
+                                                         success_check, retry_policy)
+            if detail == DEADLINE_DETAIL:
+                final_success, final_message = False, deadline_cancel_message(task_name, i, count)
+                break
+            if not success:
+                final_success = False
+                final_message = f"{fail_msg}: {detail}"
+                break
+
+            if i < count - 1 and interval > 0:
+                logger.info(f"任务 '{task_name}': 等待 {interval} 秒...")
+                remaining = time_left()
+                await asyncio.sleep(interval if remaining is None else max(0.0, min(interval, remaining)))
+
+    duration = time.time() - task_start_time
+    logger.info(f"--- [协程结束] 任务: {task_name} 执行完毕, 耗时: {format_duration(duration)} ---")
+
+    return {
+        "name": task_name,
+        "success": final_success,
+        "duration": duration,
+        "message": final_message
+    }
+
+
+async def _run_all(jobs: Iterable[tuple[dict, list[RequestPlan]]]) -> list[dict]:
+    # 限制同时在途的任务数量，避免瞬间打开过多连接
+    semaphore = asyncio.Semaphore(max(1, config.ASYNC_MAX_CONCURRENCY))
+
+    async def _guarded(task, requests_list):
+        async with semaphore:
+            return await run_task_async(task, requests_list)
+
+    # jobs 可能是边解析 HAR 边产出的迭代器: 在线程中取下一个任务，取到后立即开始执行，
+    # 等待期间事件循环继续运行已开始的任务
+    started, futures = [], []
+    job_iter = iter(jobs)
+    while (job := await asyncio.to_thread(next, job_iter, None)) is not None:
+        started.append(job)
+        futures.append(asyncio.ensure_future(_guarded(*job)))
+    outcomes = await asyncio.gather(*futures, return_exceptions=True)
+
+    results = []
+    for (task, _), outcome in zip(started, outcomes):
+        if isinstance(outcome, BaseException):
+            task_name = task.get('name', '未命名任务')
+            logger.error(f"任务 '{task_name}' 在执行期间产生异常: {outcome}",
+                         exc_info=(type(outcome), outcome, outcome.__traceback__) if config.DEBUG_MODE else None)
+            results.append({
+                "name": task_name,
+                "success": False,
+                "duration": 0,
+                "message": f"执行异常: {str(outcome)}"
+            })
+        else:
+            results.append(outcome)
+
+    pool = get_async_pool()
+    pool_stats = pool.stats()
+    logger.info(f"连接池统计: 复用 {pool_stats['hits']} 次, 新建 {pool_stats['misses']} 次")
+    await pool.close_all()
+    return results
+
+
+def run_tasks_async(jobs: Iterable[tuple[dict, list[RequestPlan]]]) -> list[dict]:
+    """
+    使用 asyncio 事件循环并发执行所有任务。
+    :param jobs: (任务配置, 请求列表) 元组的列表，或按 HAR 解析进度逐个产出的迭代器。
+    :return: 与线程池模式相同格式的任务结果列表。
+    """
+    return asyncio.run(_run_all(jobs))
@@ -0,0 +1,399 @@
+import asyncio
+import http.client
+import logging
+import socket
+import ssl
+import time
+import weakref
+
+import config
+from blob_store import as_buffer
+from dns_cache import get_dns_cache
+from request_plan import RequestPlan
+from cookie_jar import CookieJar
+from metrics import RequestTimings, get_registry
+from rate_limiter import deadline_result, get_rate_limiter, parse_retry_after
+from content_encoding import BodyDecoder, DecodeError, accept_encoding
+from response_check import DEFAULT_CHECK, SendResult, SuccessCheck, ResponseValidator
+
+logger = logging.getLogger('CheckinTask')
+
+# 复用的 keep-alive 连接可能已被服务器关闭，此时在新连接上重发一次。
+# 与同步客户端一致，只在收到响应头之前出错时重发：之后出错说明服务器已经处理了请求，重发可能重复执行
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+# 不携带响应体的状态码
+_NO_BODY_STATUSES = (204, 304)
+# 流式读取响应体时每次读取的字节数
+_READ_CHUNK_SIZE = 16 * 1024
+
+
+class _Response:
+    """
+    一个 HTTP 响应。响应体不保留在内存中，而是在读取时经 decoder 解压后交给 validator 增量校验。
+    """
+    def __init__(self, status: int, headers: list[tuple[str, str]], validator: ResponseValidator, will_close: bool):
+        self.status = status
+        self.headers = headers
+        self.validator = validator
+        self.decoder = BodyDecoder(self.getheader('Content-Encoding'))
+        self.will_close = will_close
+
+    def getheader(self, name: str, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+
+class AsyncConnectionPool:
+    """
+    基于 asyncio 流的非阻塞连接池，按 (scheme, host, port) 保存 keep-alive 连接。
+    每个事件循环拥有独立的连接池，通过 get_async_pool() 获取。
+    """
+    def __init__(self, max_per_host: int = 10, idle_timeout: float = 60.0):
+        self.max_per_host = max(1, max_per_host)
+        self.idle_timeout = idle_timeout
+        self._idle = {}   # key -> [(reader, writer, 最后使用时间), ...]
+        self._slots = {}  # key -> asyncio.Semaphore
+        self._ssl_context = ssl.create_default_context()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    async def acquire(self, scheme: str, host: str, port: int | None):
+        """
+        借出一个连接，返回 (reader, writer, 新建连接时的各阶段耗时)。
+        复用的连接没有建连耗时，第三项为 None。
+        """
+        key = (scheme, host, port)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = asyncio.Semaphore(self.max_per_host)
+        await slot.acquire()
+
+        now = time.monotonic()
+        idle_list = self._idle.get(key)
+        while idle_list:
+            reader, writer, last_used = idle_list.pop()
+            if now - last_used > self.idle_timeout or writer.is_closing() or reader.at_eof():
+                writer.close()
+                self._stats["evictions"] += 1
+                continue
+            self._stats["hits"] += 1
+            return reader, writer, None
+
+        try:
+            reader, writer, connect_timings = await self._open(scheme, host, port)
+        except BaseException:
+            slot.release()
+            raise
+        self._stats["misses"] += 1
+        return reader, writer, connect_timings
+
+    async def _open(self, scheme: str, host: str, port: int | None):
+        """新建连接，并分别记录 DNS 解析、TCP 连接与 TLS 握手的耗时（秒）。"""
+        loop = asyncio.get_running_loop()
+        port = port or (443 if scheme == 'https' else 80)
+        start = time.perf_counter()
+        if config.DNS_CACHE_ENABLED:
+            dns_cache = get_dns_cache()
+            addresses = dns_cache.lookup(host, port)
+            if addresses is None:
+                addresses = await loop.run_in_executor(None, dns_cache.resolve, host, port)
+        else:
+            addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+
+        last_error = None
+        for _, _, _, _, address in addresses:
+            try:
+                reader, writer = await asyncio.open_connection(address[0], address[1])
+                break
+            except OSError as e:
+                last_error = e
+        else:
+            raise last_error or OSError(f"无法解析主机: {host}")
+        connected = time.perf_counter()
+        timings = {'dns': resolved - start, 'connect': connected - resolved}
+
+        if scheme == 'https':
+            try:
+                await writer.start_tls(self._ssl_context, server_hostname=host)
+            except BaseException:
+                writer.close()
+                raise
+            timings['tls'] = time.perf_counter() - connected
+        return reader, writer, timings
+
+    def release(self, key, reader, writer, reusable: bool) -> None:
+        """归还连接，不可复用时直接关闭。"""
+        if reusable and not writer.is_closing():
+            self._idle.setdefault(key, []).append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        self._slots[key].release()
+
+    def stats(self) -> dict:
+        """返回连接池命中/未命中等统计计数的快照。"""
+        snapshot = dict(self._stats)
+        snapshot["idle"] = sum(len(v) for v in self._idle.values())
+        return snapshot
+
+    async def close_all(self) -> None:
+        """关闭所有空闲连接。"""
+        idle, self._idle = self._idle, {}
+        writers = [writer for idle_list in idle.values() for _, writer, _ in idle_list]
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_pool() -> AsyncConnectionPool:
+    """获取当前事件循环对应的连接池（首次调用时创建）。"""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = AsyncConnectionPool(
+            max_per_host=config.POOL_MAX_PER_HOST,
+            idle_timeout=config.POOL_IDLE_TIMEOUT,
+        )
+    return pool
+
+
+def _build_request(plan: RequestPlan, cookie: str) -> bytes:
+    """按 HTTP/1.1 格式序列化请求行与请求头 (请求体单独写出)。"""
+    lines = [f"{plan.method} {plan.path} HTTP/1.1"]
+    if not plan.skip_host:
+        lines.append(f"Host: {plan.netloc}")
+    lines.append(f"Accept-Encoding: {accept_encoding()}")
+    lines.extend(f"{name}: {value}" for name, value in plan.headers)
+    if cookie:
+        lines.append(f"Cookie: {cookie}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1', errors='replace')
+
+
+async def _iter_body(reader: asyncio.StreamReader, response: _Response):
+    """按块产出响应体，支持 chunked、Content-Length 与读到连接关闭三种形式。"""
+    if (response.getheader('Transfer-Encoding') or '').lower() == 'chunked':
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+            if size == 0:
+                # 读取并丢弃 trailer
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            while size:
+                chunk = await reader.read(min(size, _READ_CHUNK_SIZE))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b'', size)
+                size -= len(chunk)
+                yield chunk
+            await reader.readexactly(2)
+    elif response.getheader('Content-Length') is not None:
+        remaining = int(response.getheader('Content-Length'))
+        while remaining:
+            chunk = await reader.read(min(remaining, _READ_CHUNK_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            yield chunk
+    else:
+        response.will_close = True
+        while chunk := await reader.read(_READ_CHUNK_SIZE):
+            yield chunk
+
+
+async def _read_head(reader: asyncio.StreamReader, timings: RequestTimings
+                     ) -> tuple[str, int, list[tuple[str, str]]]:
+    """
+    读取响应的状态行与响应头 (跳过 100 Continue 等信息性响应)，首字节等待耗时记录到 timings 中。
+    没有收到任何响应就被关闭时抛出 RemoteDisconnected。
+    :return: (HTTP 版本, 状态码, 响应头列表)
+    """
+    written = time.perf_counter()
+    while True:
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        if not timings.ttfb:
+            timings.ttfb = time.perf_counter() - written
+        try:
+            version, status_text = status_line.decode('latin-1').split(None, 2)[:2]
+            status = int(status_text)
+        except ValueError:
+            raise http.client.BadStatusLine(status_line.decode('latin-1', errors='replace'))
+
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip(), value.strip()))
+
+        # 跳过 100 Continue 等信息性响应
+        if status >= 200 or status == 101:
+            return version, status, headers
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str, head: tuple[str, int, list[tuple[str, str]]],
+                         timings: RequestTimings, check: SuccessCheck) -> _Response:
+    """
+    在已读取的响应头之后读取响应体，响应体分块交给校验器，结论确定后即停止读取。
+    响应体读取耗时记录到 timings 中。
+    """
+    version, status, headers = head
+    response = _Response(status, headers, check.validator(status, config.RESPONSE_MAX_BYTES), False)
+    connection = (response.getheader('Connection') or '').lower()
+    response.will_close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+
+    if method == 'HEAD' or status in _NO_BODY_STATUSES:
+        return response
+
+    body_start = time.perf_counter()
+    body = _iter_body(reader, response)
+    sink = response.validator.feed
+    try:
+        async for chunk in body:
+            if response.decoder.feed(chunk, sink):
+                # 提前停止时连接上还残留未读的响应体，不能再复用
+                response.will_close = True
+                break
+        else:
+            response.decoder.finish(sink)
+    finally:
+        await body.aclose()
+        timings.body = time.perf_counter() - body_start
+    return response
+
+
+async def _request_on_pool(pool: AsyncConnectionPool, plan: RequestPlan, cookie: str, timings: RequestTimings,
+                           check: SuccessCheck):
+    """从连接池借出连接并完成一次请求/响应交换，各阶段耗时记录到 timings 中。"""
+    key = (plan.scheme, plan.host, plan.port)
+    head = _build_request(plan, cookie)
+    # 大请求体是内存映射上的 memoryview，不与请求头拼接，避免复制
+    body = as_buffer(plan.body)
+    timings.bytes_out = len(head) + (len(body) if body else 0)
+    while True:
+        reader, writer, connect_timings = await pool.acquire(*key)
+        if connect_timings:
+            timings.dns = connect_timings['dns']
+            timings.connect = connect_timings['connect']
+            timings.tls = connect_timings.get('tls', 0.0)
+        try:
+            writer.write(head)
+            if body:
+                writer.write(body)
+            await writer.drain()
+            head = await _read_head(reader, timings)
+        except _STALE_CONNECTION_ERRORS:
+            pool.release(key, reader, writer, False)
+            if connect_timings:
+                raise
+            logger.debug(f"复用的连接已失效，使用新连接重试: {plan.netloc}")
+            continue
+        except BaseException:
+            pool.release(key, reader, writer, False)
+            raise
+        # 已收到响应头：此后的错误 (如响应体读到一半连接断开) 交给重试策略处理，不在这里重发
+        try:
+            response = await _read_response(reader, plan.method, head, timings, check)
+        except BaseException:
+            pool.release(key, reader, writer, False)
+            raise
+        pool.release(key, reader, writer, not response.will_close)
+        return response
+
+
+async def send_request_async(plan: RequestPlan, cookie_jar: CookieJar | None = None, task_name: str = '',
+                             check: SuccessCheck = DEFAULT_CHECK, max_wait: float | None = None) -> SendResult:
+    """
+    send_request 的协程版本，行为与返回值保持一致，但全程不阻塞事件循环。
+
+    :param plan: 由 parse_har 生成的 RequestPlan。
+    :param cookie_jar: 会话 Cookie 容器，响应中的 Set-Cookie 会原地更新到其中。
+    :param task_name: 所属任务名称，用于按任务汇总指标。
+    :param check: 成功判定条件，默认只要求 2xx 状态码。
+    :param max_wait: 限速等待的上限（秒），见 send_request。
+    :return: 与 send_request 相同的 SendResult。
+    """
+    method = plan.method
+    url = plan.url
+
+    if cookie_jar is None:
+        cookie_jar = CookieJar()
+    cookie = cookie_jar.header_for(plan)
+
+    # 按主机限速：等待轮到本请求的发送时刻
+    limiter = get_rate_limiter()
+    wait = limiter.reserve(plan.netloc, max_wait)
+    if wait is None:
+        return deadline_result(plan.netloc)
+    if wait > 0:
+        get_registry().record_rate_limit_wait(plan.netloc, wait)
+        await asyncio.sleep(wait)
+
+    success = False
+    timings = RequestTimings()
+    start = time.perf_counter()
+    try:
+        logger.debug(f"准备发送请求: {method} {url}")
+        resp = await asyncio.wait_for(
+            _request_on_pool(get_async_pool(), plan, cookie, timings, check),
+            timeout=config.REQUEST_TIMEOUT,
+        )
+        logger.debug(f"收到响应: 状态码 {resp.status}")
+        validator = resp.validator
+        timings.bytes_decoded = resp.decoder.decoded_bytes
+        timings.bytes_in = resp.decoder.wire_bytes + sum(len(k) + len(v) + 4 for k, v in resp.headers)
+
+        set_cookie_headers = [v for k, v in resp.headers if k.lower() == 'set-cookie']
+        cookie_jar.update_from_response(set_cookie_headers, plan)
+
+        if resp.status in (301, 302, 303, 307, 308):
+            redirect_url = resp.getheader('Location')
+            if redirect_url:
+                logger.info(f"检测到重定向 ({resp.status}) -> {redirect_url}")
+                if not redirect_url.startswith('http'):
+                    redirect_url = f"{plan.scheme}://{plan.netloc}{redirect_url}"
+                success = True
+                return await send_request_async(plan.redirect_to(redirect_url), cookie_jar, task_name, check)
+
+        if resp.status in (429, 503):
+            retry_after = parse_retry_after(resp.getheader('Retry-After'))
+            if retry_after is not None:
+                limiter.pause(plan.netloc, retry_after)
+
+        result = validator.result()
+        success = result.success
+        if success:
+            logger.info(f"请求成功: {method} {url} - 状态码: {resp.status}")
+        else:
+            logger.warning(f"请求失败: {method} {url} - 状态码: {resp.status} - {result.message}")
+            logger.warning(f"响应内容: {validator.preview_text()}")
+        return result
+
+    except TimeoutError as e:
+        logger.error(f"发送请求时发生网络错误: {method} {url} - 错误: 请求超时 {e!r}")
+        return SendResult(False, f"网络错误: 请求超时 {e!r}", error='timeout')
+    except (http.client.HTTPException, asyncio.IncompleteReadError, OSError) as e:
+        # OSError 涵盖连接被拒绝/重置、DNS 解析失败与 TLS 错误
+        logger.error(f"发送请求时发生网络错误: {method} {url} - 错误: {e!r}")
+        return SendResult(False, f"网络错误: {e!r}", error='network')
+    except DecodeError as e:
+        logger.error(f"处理响应时出错: {method} {url} - 错误: {e}")
+        return SendResult(False, str(e), error='decode')
+    except Exception as e:
+        logger.error(f"发送请求时发生未知错误: {method} {url} - 错误: {e}", exc_info=True)
+        return SendResult(False, f"未知错误: {e}", error='unknown')
+    finally:
+        timings.total = time.perf_counter() - start
+        get_registry().record_request(task_name, plan.netloc, timings, success)
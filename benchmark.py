@@ -0,0 +1,344 @@
+"""
+基准测试套件。
+
+在本地启动一个可配置延迟与响应大小的 HTTP/HTTPS 替身服务器，测量:
+  - send_request 的吞吐量 (请求/秒) 与 p50/p99 延迟
+  - 多步骤 HAR 下 run_task 的端到端吞吐量
+  - parse_har 在不同大小的合成 HAR 上的耗时与峰值内存
+结果写入 JSON 文件，便于不同版本之间对比。
+
+用法示例:
+    python benchmark.py
+    python benchmark.py --suite send --requests 5000 --concurrency 16 --latency-ms 5
+    python benchmark.py --suite parse --har-sizes 1KB,10MB,500MB --output bench_results.json
+"""
+import argparse
+import concurrent.futures
+import http.server
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import config
+from connection_pool import ConnectionPool, set_pool
+from cookie_jar import CookieJar
+from har_parser import parse_har
+from request_plan import compile_request
+from request_sender import send_request
+from task_runner import run_task
+
+logger = logging.getLogger('CheckinTask')
+
+_SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'B': 1}
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    """替身服务器的请求处理器：按配置的延迟返回固定大小的 JSON 响应。"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = self.server.payload
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'session=bench; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+def _make_payload(size: int) -> bytes:
+    padding = max(0, size - len('{"code":0,"data":""}'))
+    return json.dumps({"code": 0, "data": "x" * padding}).encode('utf-8')
+
+
+def _generate_certificate(directory: str) -> tuple[str, str] | None:
+    """使用 openssl 生成自签名证书，openssl 不可用时返回 None。"""
+    if not shutil.which('openssl'):
+        return None
+    cert_file = os.path.join(directory, 'cert.pem')
+    key_file = os.path.join(directory, 'key.pem')
+    result = subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-keyout', key_file, '-out', cert_file],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        return None
+    return cert_file, key_file
+
+
+def start_stand_in_server(latency: float = 0.0, payload_size: int = 512,
+                          certificate: tuple[str, str] | None = None) -> tuple[http.server.ThreadingHTTPServer, str]:
+    """
+    启动替身服务器。
+    :param certificate: (证书文件, 私钥文件)，提供时以 HTTPS 方式监听。
+    :return: (服务器对象, 基础 URL)
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.payload = _make_payload(payload_size)
+    scheme = 'http'
+    if certificate:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*certificate)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, name='stand-in-server', daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_port}"
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _latency_summary(latencies: list[float], elapsed: float) -> dict:
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 4),
+        "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def bench_send_request(base_url: str, requests: int, concurrency: int) -> dict:
+    """并发调用 send_request，统计吞吐量与延迟分布。"""
+    plan = compile_request('POST', base_url + '/api/checkin', {'Content-Type': 'application/json'}, '{"id": 1}')
+    per_worker = max(1, requests // concurrency)
+    failures = []
+
+    def _worker() -> list[float]:
+        latencies = []
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            result = send_request(plan, CookieJar())
+            latencies.append(time.perf_counter() - start)
+            if not result.success:
+                failures.append(result.message)
+        return latencies
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: _worker(), range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    summary = _latency_summary([value for worker in results for value in worker], elapsed)
+    summary["concurrency"] = concurrency
+    summary["failures"] = len(failures)
+    return summary
+
+
+def _write_synthetic_har(path: str, base_url: str, steps: int, response_size: int, target_size: int) -> int:
+    """
+    生成合成 HAR 文件: 前 steps 个 entry 指向替身服务器，
+    其余 entry 为静态资源 (会被解析器过滤)，直到文件大小达到 target_size。返回实际大小。
+    """
+    filler = "y" * response_size
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"log":{"version":"1.2","creator":{"name":"benchmark"},"entries":[')
+        written = 0
+        index = 0
+        while index < steps or f.tell() < target_size:
+            url = f"{base_url}/api/step{index}" if index < steps else f"{base_url}/static/{index}.png"
+            entry = {
+                "startedDateTime": "2025-01-01T00:00:00Z",
+                "time": 10,
+                "request": {
+                    "method": "POST",
+                    "url": url,
+                    "httpVersion": "HTTP/1.1",
+                    "headers": [
+                        {"name": "Content-Type", "value": "application/json"},
+                        {"name": "User-Agent", "value": "benchmark"},
+                    ],
+                    "postData": {"mimeType": "application/json", "text": json.dumps({"step": index})},
+                },
+                "response": {"status": 200, "content": {"size": len(filler), "text": filler}},
+                "timings": {"send": 0, "wait": 10, "receive": 0},
+            }
+            if written:
+                f.write(',')
+            json.dump(entry, f)
+            written += 1
+            index += 1
+        f.write(']}}')
+        return f.tell()
+
+
+def bench_run_task(base_url: str, directory: str, tasks: int, rounds: int, steps: int) -> dict:
+    """多个任务并发执行多步骤 HAR，统计端到端吞吐量。"""
+    har_path = os.path.join(directory, 'run_task.har')
+    _write_synthetic_har(har_path, base_url, steps, response_size=0, target_size=0)
+    requests_list = parse_har(har_path)
+    task_config = {"name": "benchmark", "count": rounds, "interval_seconds": 0}
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=tasks) as executor:
+        results = list(executor.map(lambda _: run_task(task_config, requests_list), range(tasks)))
+    elapsed = time.perf_counter() - start
+
+    total_requests = tasks * rounds * len(requests_list)
+    return {
+        "tasks": tasks,
+        "rounds": rounds,
+        "steps": len(requests_list),
+        "requests": total_requests,
+        "elapsed_s": round(elapsed, 4),
+        "requests_per_s": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "failed_tasks": sum(1 for r in results if not r['success']),
+    }
+
+
+def _parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for unit, factor in _SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def bench_parse_har(directory: str, sizes: list[int]) -> list[dict]:
+    """在不同大小的合成 HAR 上测量 parse_har 的耗时与峰值内存。"""
+    results = []
+    for target_size in sizes:
+        har_path = os.path.join(directory, f'parse_{target_size}.har')
+        # 响应体占据大部分体积，模拟完整会话导出
+        response_size = min(64 * 1024, max(0, target_size // 20))
+        actual_size = _write_synthetic_har(har_path, 'https://bench.invalid', 5, response_size, target_size)
+
+        start = time.perf_counter()
+        requests_list = parse_har(har_path)
+        elapsed = time.perf_counter() - start
+
+        # 峰值内存单独测量，避免 tracemalloc 的开销影响耗时
+        tracemalloc.start()
+        parse_har(har_path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.remove(har_path)
+        results.append({
+            "file_bytes": actual_size,
+            "requests": len(requests_list or []),
+            "elapsed_s": round(elapsed, 4),
+            "mb_per_s": round(actual_size / 1024 ** 2 / elapsed, 2) if elapsed else 0.0,
+            "peak_memory_bytes": peak,
+        })
+        print(f"  parse_har {actual_size / 1024 ** 2:.2f} MB: {elapsed:.3f}s, 峰值内存 {peak / 1024 ** 2:.2f} MB")
+    return results
+
+
+def _environment() -> dict:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=config.BASE_DIR,
+                                  capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ''
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_revision": revision,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="运行基准测试并输出 JSON 结果")
+    parser.add_argument('--suite', default='send,run_task,parse',
+                        help="要运行的测试项，逗号分隔: send, run_task, parse")
+    parser.add_argument('--requests', type=int, default=2000, help="send 测试的总请求数")
+    parser.add_argument('--concurrency', type=int, default=8, help="send 测试的并发线程数")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="替身服务器每个请求的附加延迟 (毫秒)")
+    parser.add_argument('--payload-bytes', type=int, default=512, help="替身服务器响应体大小 (字节)")
+    parser.add_argument('--tasks', type=int, default=10, help="run_task 测试的并发任务数")
+    parser.add_argument('--rounds', type=int, default=20, help="run_task 测试中每个任务的轮数")
+    parser.add_argument('--steps', type=int, default=3, help="run_task 测试中 HAR 的步骤数")
+    parser.add_argument('--har-sizes', default='1KB,1MB,10MB,100MB',
+                        help="parse 测试的合成 HAR 大小，逗号分隔，例如 1KB,10MB,500MB")
+    parser.add_argument('--output', default=os.path.join(config.BASE_DIR, 'bench_results.json'),
+                        help="结果输出文件")
+    args = parser.parse_args(argv)
+
+    suites = {name.strip() for name in args.suite.split(',') if name.strip()}
+    # 压测期间只保留警告及以上的日志，避免日志输出成为瓶颈
+    logger.setLevel(logging.WARNING)
+    if not logger.handlers:
+        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = {"environment": _environment(), "parameters": vars(args), "results": {}}
+    with tempfile.TemporaryDirectory(prefix='checkin-bench-') as directory:
+        certificate = _generate_certificate(directory)
+        client_context = None
+        if certificate:
+            client_context = ssl.create_default_context(cafile=certificate[0])
+            client_context.check_hostname = False
+        else:
+            print("未找到 openssl，跳过 HTTPS 测试。")
+
+        servers = {'http': start_stand_in_server(args.latency_ms / 1000, args.payload_bytes)}
+        if certificate:
+            servers['https'] = start_stand_in_server(args.latency_ms / 1000, args.payload_bytes, certificate)
+
+        try:
+            for scheme, (_, base_url) in servers.items():
+                if suites & {'send', 'run_task'}:
+                    # 每组测试使用全新的连接池，结果互不影响
+                    set_pool(ConnectionPool(max_per_host=max(args.concurrency, args.tasks),
+                                            timeout=config.REQUEST_TIMEOUT, ssl_context=client_context))
+                if 'send' in suites:
+                    result = bench_send_request(base_url, args.requests, args.concurrency)
+                    report["results"][f"send_request_{scheme}"] = result
+                    print(f"  send_request ({scheme}): {result['requests_per_s']} 请求/秒, "
+                          f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+                if 'run_task' in suites:
+                    result = bench_run_task(base_url, directory, args.tasks, args.rounds, args.steps)
+                    report["results"][f"run_task_{scheme}"] = result
+                    print(f"  run_task ({scheme}): {result['requests_per_s']} 请求/秒")
+        finally:
+            for server, _ in servers.values():
+                server.shutdown()
+                server.server_close()
+
+        if 'parse' in suites:
+            sizes = [_parse_size(size) for size in args.har_sizes.split(',') if size.strip()]
+            report["results"]["parse_har"] = bench_parse_har(directory, sizes)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"基准测试结果已写入: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
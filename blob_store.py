@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import config
+
+logger = logging.getLogger('CheckinTask')
+
+_BLOB_SUFFIX = '.blob'
+# 本进程最多同时保留的映射数，超过时关闭最久未使用的映射
+_MAX_MAPPINGS = 64
+
+# 本进程已映射的 blob: SHA-256 -> 只读 mmap (按最近使用排序)。所有线程共享同一份映射；
+# 不同进程映射同一文件时共享操作系统的页缓存
+_mappings: OrderedDict[str, mmap.mmap] = OrderedDict()
+_mappings_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class BlobRef:
+    """
+    内容寻址存储中的一个请求体，只记录 SHA-256 与长度，可以随请求计划一起缓存或传给其他进程。
+    发送时通过 view() 取得内存映射上的 memoryview，不复制数据。
+    """
+    digest: str
+    size: int
+
+    def __len__(self) -> int:
+        return self.size
+
+    def exists(self) -> bool:
+        try:
+            return os.path.getsize(_blob_path(self.digest)) == self.size
+        except OSError:
+            return False
+
+    def view(self) -> memoryview:
+        """
+        返回请求体的只读 memoryview (首次访问时映射文件)。
+        每次调用返回新的 memoryview，调用方用完后丢弃即可；映射被淘汰时，仍在使用的映射会在最后一个
+        memoryview 释放后才真正关闭。
+        """
+        with _mappings_lock:
+            mapping = _mappings.get(self.digest)
+            if mapping is None:
+                with open(_blob_path(self.digest), 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                _mappings[self.digest] = mapping
+                while len(_mappings) > _MAX_MAPPINGS:
+                    _close_mapping(_mappings.popitem(last=False)[1])
+            else:
+                _mappings.move_to_end(self.digest)
+            view = memoryview(mapping)
+        if len(view) != self.size:
+            raise OSError(f"请求体文件已损坏: {self.digest} (期望 {self.size} 字节，实际 {len(view)} 字节)")
+        return view
+
+
+def _close_mapping(mapping: mmap.mmap) -> None:
+    try:
+        mapping.close()
+    except BufferError:
+        # 仍有 memoryview 在使用 (如正在发送)，不再引用它，最后一个 memoryview 释放时自动关闭
+        pass
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(config.BLOB_DIR, digest + _BLOB_SUFFIX)
+
+
+def put(data: bytes) -> BlobRef:
+    """将数据写入存储 (内容相同的数据只保存一份)，返回其引用。"""
+    digest = hashlib.sha256(data).hexdigest()
+    ref = BlobRef(digest, len(data))
+    if not ref.exists():
+        path = _blob_path(digest)
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(config.BLOB_DIR, exist_ok=True)
+        try:
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+            os.replace(temp_file, path)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    return ref
+
+
+def store_body(body: bytes | None) -> bytes | BlobRef | None:
+    """请求体不小于 BLOB_MIN_BYTES 时写入存储并返回 BlobRef，否则原样返回。"""
+    threshold = config.BLOB_MIN_BYTES
+    if body is None or threshold <= 0 or len(body) < threshold:
+        return body
+    try:
+        return put(body)
+    except OSError as e:
+        logger.warning(f"写入请求体存储失败，请求体保留在内存中: {e}")
+        return body
+
+
+def as_buffer(body: bytes | BlobRef | None) -> bytes | memoryview | None:
+    """取得可以直接写入套接字的请求体。"""
+    return body.view() if isinstance(body, BlobRef) else body
+
+
+def close() -> None:
+    """关闭本进程的所有映射 (正在使用的映射在用完后关闭)，之后访问 blob 时重新映射。"""
+    with _mappings_lock:
+        mappings = list(_mappings.values())
+        _mappings.clear()
+    for mapping in mappings:
+        _close_mapping(mapping)
+
+
+def clear() -> int:
+    """删除存储中的所有文件，返回删除的文件数。正在使用的 blob 在本进程内仍可使用到发送完毕。"""
+    close()
+    if not os.path.isdir(config.BLOB_DIR):
+        return 0
+    removed = sum(1 for name in os.listdir(config.BLOB_DIR) if name.endswith(_BLOB_SUFFIX))
+    shutil.rmtree(config.BLOB_DIR, ignore_errors=True)
+    return removed
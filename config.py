@@ -1,8 +1,9 @@
 import os
+import threading
 
 def _load_env_once():
     """
-    在模块加载时读取一次 .env 文件并返回其内容。
+    读取 .env 文件并返回其内容。由 get_config 在首次需要时调用一次。
     """
     env_config = {}
     env_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -19,8 +20,9 @@ def _load_env_once():
                     env_config[key.strip()] = value
     return env_config
 
-# 在模块加载时执行一次，将结果缓存到 _env_cache 中
-_env_cache = _load_env_once()
+# 首次需要时读取一次 .env，将结果缓存到 _env_cache 中
+_env_cache = None
+_load_lock = threading.RLock()
 
 def get_config(key, default=None):
     """
@@ -33,6 +35,11 @@ def get_config(key, default=None):
         return value
 
     # 2. 尝试从缓存的 .env 配置获取
+    global _env_cache
+    if _env_cache is None:
+        with _load_lock:
+            if _env_cache is None:
+                _env_cache = _load_env_once()
     value = _env_cache.get(key)
     if value is not None:
         return value
@@ -41,28 +48,164 @@ def get_config(key, default=None):
     return default
 
 # --- 对外暴露的配置项 ---
+# 配置项在首次被访问时才计算 (同时读取 .env)，导入本模块本身不做任何 I/O。
 
-# 布尔值配置项
-DEBUG_MODE = get_config('DEBUG_MODE', 'False').lower() in ('true', '1', 't')
-CONSOLE_CONCISE_MODE = get_config('CONSOLE_CONCISE_MODE', 'True').lower() in ('true', '1', 't')
+def _settings() -> dict:
+    """计算所有配置项，返回 {名称: 值}。"""
+    # 布尔值配置项
+    DEBUG_MODE = get_config('DEBUG_MODE', 'False').lower() in ('true', '1', 't')
+    CONSOLE_CONCISE_MODE = get_config('CONSOLE_CONCISE_MODE', 'True').lower() in ('true', '1', 't')
 
-# WxPusher 配置
-WXPUSHER_APP_TOKEN = get_config('WXPUSHER_APP_TOKEN')
-WXPUSHER_UIDS = get_config('WXPUSHER_UIDS')
+    # 日志文件持久化策略: record (每批写入后立即同步到磁盘)、interval (每隔 LOG_FSYNC_INTERVAL_MS 毫秒同步)
+    # 或 shutdown (仅在退出时同步)。ERROR 级别的日志总是立即同步
+    LOG_DURABILITY = get_config('LOG_DURABILITY', 'interval').strip().lower()
+    LOG_FSYNC_INTERVAL_MS = int(get_config('LOG_FSYNC_INTERVAL_MS', '1000'))
+    # 后台写入线程单次合并写入的最大日志条数
+    LOG_BATCH_SIZE = int(get_config('LOG_BATCH_SIZE', '256'))
 
-# 路径配置
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TASKS_FILE = os.path.join(BASE_DIR, 'tasks.json')
-STATUS_FILE = os.path.join(BASE_DIR, 'status.json')
+    # WxPusher 配置
+    WXPUSHER_APP_TOKEN = get_config('WXPUSHER_APP_TOKEN')
+    WXPUSHER_UIDS = get_config('WXPUSHER_UIDS')
+    WXPUSHER_API_URL = get_config('WXPUSHER_API_URL', 'http://wxpusher.zjiecode.com/api/send/message')
+
+    # 通知发送配置: 通知先写入发件箱 (NOTIFY_OUTBOX_DIR)，由后台线程发送
+    # 推送接口的请求超时时间（秒）
+    NOTIFY_TIMEOUT = float(get_config('NOTIFY_TIMEOUT', '10'))
+    # 合并窗口（秒）: 窗口内提交到同一渠道的多条通知合并为一条发送
+    NOTIFY_MERGE_WINDOW = float(get_config('NOTIFY_MERGE_WINDOW', '2'))
+    # 发送失败时的最多尝试次数，以及指数退避的基数与上限（秒）
+    NOTIFY_MAX_ATTEMPTS = int(get_config('NOTIFY_MAX_ATTEMPTS', '5'))
+    NOTIFY_RETRY_BASE_DELAY = float(get_config('NOTIFY_RETRY_BASE_DELAY', '1'))
+    NOTIFY_RETRY_MAX_DELAY = float(get_config('NOTIFY_RETRY_MAX_DELAY', '30'))
+    # 程序退出前等待通知发出的最长时间（秒），超时未发出的通知留在发件箱中下次运行时发送
+    NOTIFY_FLUSH_TIMEOUT = float(get_config('NOTIFY_FLUSH_TIMEOUT', '15'))
+
+    # 网络请求配置
+    # 单次请求的超时时间（秒）
+    REQUEST_TIMEOUT = float(get_config('REQUEST_TIMEOUT', '30'))
+    # 连接池: 每个主机的最大连接数、空闲连接的最长保留时间（秒）
+    POOL_MAX_PER_HOST = int(get_config('POOL_MAX_PER_HOST', '10'))
+    POOL_IDLE_TIMEOUT = float(get_config('POOL_IDLE_TIMEOUT', '60'))
+    # DNS 缓存: 同一主机在 TTL 内只解析一次 (系统解析器不提供记录的 TTL，按 DNS_CACHE_TTL 秒缓存)
+    DNS_CACHE_ENABLED = get_config('DNS_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    DNS_CACHE_TTL = float(get_config('DNS_CACHE_TTL', '60'))
+    # 常驻模式下提前多少秒预热即将运行的任务: 解析 DNS 并建立连接 (含 TLS 握手)，0 表示不预热。
+    # 应小于 POOL_IDLE_TIMEOUT，否则预先建立的连接会在使用前被淘汰
+    PREWARM_SECONDS = float(get_config('PREWARM_SECONDS', '5'))
+    # 预热时是否建立连接；为 False 时只解析 DNS
+    PREWARM_CONNECTIONS = get_config('PREWARM_CONNECTIONS', 'True').lower() in ('true', '1', 't')
+    # 单个响应体最多读取的字节数 (按解压后计算)，超过后停止读取 (默认 1MB)
+    RESPONSE_MAX_BYTES = int(get_config('RESPONSE_MAX_BYTES', str(1024 * 1024)))
+    # 是否请求压缩响应 (gzip/deflate，安装 brotli / zstandard 后还支持 br / zstd) 并自动解压
+    RESPONSE_COMPRESSION = get_config('RESPONSE_COMPRESSION', 'True').lower() in ('true', '1', 't')
+
+    # 按主机限速 (所有任务共享，多进程模式下按进程计): 默认每秒请求数 (0 表示不限速) 与允许的突发请求数
+    RATE_LIMIT_PER_HOST = float(get_config('RATE_LIMIT_PER_HOST', '0'))
+    RATE_LIMIT_BURST = int(get_config('RATE_LIMIT_BURST', '5'))
+    # 单独指定部分主机的限速，格式: "api.example.com=2:5,example.org=10" (主机=每秒请求数[:突发数])
+    RATE_LIMIT_HOSTS = get_config('RATE_LIMIT_HOSTS', '')
+    # 收到 429/503 时按 Retry-After 暂停该主机的最长时间（秒），0 表示忽略 Retry-After
+    RATE_LIMIT_MAX_PAUSE = float(get_config('RATE_LIMIT_MAX_PAUSE', '60'))
+
+    # 重试策略默认值 (可在 tasks.json 中按任务用 retry 字段覆盖):
+    # 最多尝试次数、指数退避的基数与单次等待上限（秒）
+    RETRY_MAX_ATTEMPTS = int(get_config('RETRY_MAX_ATTEMPTS', '3'))
+    RETRY_BASE_DELAY = float(get_config('RETRY_BASE_DELAY', '1'))
+    RETRY_MAX_DELAY = float(get_config('RETRY_MAX_DELAY', '30'))
+    # 全局重试预算: 每个请求为重试积累的令牌数，以及令牌上限
+    RETRY_BUDGET_RATIO = float(get_config('RETRY_BUDGET_RATIO', '0.2'))
+    RETRY_BUDGET_CAPACITY = int(get_config('RETRY_BUDGET_CAPACITY', '20'))
+    # 熔断: 主机连续失败多少次后熔断，以及熔断持续时间（秒）
+    CIRCUIT_FAILURE_THRESHOLD = int(get_config('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_SECONDS = float(get_config('CIRCUIT_RESET_SECONDS', '30'))
+
+    # 执行引擎: thread (线程池，默认)、async (asyncio 协程，适合大量任务)
+    # scheduler (轮次调度器，间隔等待不占用线程) 或 process (多进程分片执行)
+    ENGINE = get_config('ENGINE', 'thread').strip().lower()
+    # 协程模式下同时执行的最大任务数
+    ASYNC_MAX_CONCURRENCY = int(get_config('ASYNC_MAX_CONCURRENCY', '1000'))
+    # 轮次调度模式下的工作线程数
+    SCHEDULER_WORKERS = int(get_config('SCHEDULER_WORKERS', '4'))
+    # 多进程模式下的工作进程数 (默认为 CPU 核心数) 与每个进程内的线程数
+    WORKER_PROCESSES = int(get_config('WORKER_PROCESSES', str(os.cpu_count() or 1)))
+    PROCESS_THREADS = int(get_config('PROCESS_THREADS', '10'))
+    # 单次运行的截止时间（秒，从运行开始计算）: 到期后不再开始新的轮次，未完成的任务记为已取消。0 表示不限制
+    RUN_DEADLINE_SECONDS = float(get_config('RUN_DEADLINE_SECONDS', '0'))
+
+    # 路径配置
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    TASKS_FILE = os.path.join(BASE_DIR, 'tasks.json')
+    # 旧版状态文件，仅在首次创建历史数据库时用于迁移累计签到天数
+    STATUS_FILE = os.path.join(BASE_DIR, 'status.json')
+    # 运行历史数据库 (SQLite): 记录每次运行与每个任务的结果，并维护累计天数、连续成功次数等统计
+    HISTORY_DB = get_config('HISTORY_DB', os.path.join(BASE_DIR, 'history.db'))
+    # 通知发件箱目录: 尚未发出的通知保存在这里，下次运行时继续发送
+    NOTIFY_OUTBOX_DIR = get_config('NOTIFY_OUTBOX_DIR', os.path.join(BASE_DIR, '.outbox'))
+
+    # 请求计划缓存: 解析后的 HAR 请求列表缓存到磁盘，HAR 文件未变化时直接加载
+    PLAN_CACHE_ENABLED = get_config('PLAN_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    PLAN_CACHE_DIR = get_config('PLAN_CACHE_DIR', os.path.join(BASE_DIR, '.plan_cache'))
+    # 请求体存储: 不小于 BLOB_MIN_BYTES 字节的请求体 (如上传的二进制数据) 按内容哈希保存到 BLOB_DIR，
+    # 发送时直接从内存映射写出，多个任务、线程与进程共享同一份数据。设为 0 则全部保留在内存中
+    BLOB_DIR = get_config('BLOB_DIR', os.path.join(BASE_DIR, '.blobs'))
+    BLOB_MIN_BYTES = int(get_config('BLOB_MIN_BYTES', str(64 * 1024)))
+    # 同时解析 HAR 文件的线程数: 任务的 HAR 一解析完就提交执行，不必等待所有 HAR 解析完成
+    PLAN_LOAD_WORKERS = int(get_config('PLAN_LOAD_WORKERS', '4'))
+
+    # 请求指标: 运行结束后写入的 Prometheus 文本文件 (留空则不写入)
+    METRICS_FILE = get_config('METRICS_FILE', os.path.join(BASE_DIR, 'metrics.prom'))
+    # 本地 /metrics 端点的端口 (0 表示不启动)
+    METRICS_PORT = int(get_config('METRICS_PORT', '0'))
+
+    # 常驻模式 (python main.py --daemon): 未配置 schedule 的任务使用的默认 cron 表达式
+    DAEMON_SCHEDULE = get_config('DAEMON_SCHEDULE', '0 8 * * *')
+    # 检查 tasks.json、.env 与 HAR 文件是否变化的间隔（秒）
+    DAEMON_POLL_SECONDS = float(get_config('DAEMON_POLL_SECONDS', '5'))
+    # 本地控制端点端口 (GET /status 查看状态, POST /run 立即运行)，0 表示不启动
+    DAEMON_CONTROL_PORT = int(get_config('DAEMON_CONTROL_PORT', '0'))
+
+    # 通知报告: full 逐行列出所有任务; compact 成功的任务合并为一行计数; auto 任务数超过阈值时使用 compact
+    REPORT_MODE = get_config('REPORT_MODE', 'auto').lower()
+    REPORT_COMPACT_THRESHOLD = int(get_config('REPORT_COMPACT_THRESHOLD', '50'))
+
+    return locals()
+
+
+_loaded = False
+
+def __getattr__(name):
+    """首次访问任一配置项时计算全部配置项并缓存到模块属性中，之后的访问不再经过这里。"""
+    global _loaded
+    if name.startswith('__') or _loaded:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _load_lock:
+        if not _loaded:
+            # 已被外部直接赋值的配置项 (如测试中) 保持不变
+            for key, value in _settings().items():
+                globals().setdefault(key, value)
+            _loaded = True
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+def reload() -> None:
+    """重新读取 .env 并重新计算所有配置项 (覆盖运行期间对配置项的修改)，供常驻模式热加载使用。"""
+    global _env_cache, _loaded
+    with _load_lock:
+        _env_cache = None
+        globals().update(_settings())
+        _loaded = True
 
 # --- 奖励规则配置 ---
 # 定义奖励计算规则，key 为变量名，value 为计算表达式 (字符串)
-# 表达式中可以使用 'days' 代表 successful_days
+# 表达式中可以使用 'days' (累计签到天数)、'streak' (当前连续成功次数)、'longest_streak' (最长连续成功次数)、
+# 'total_runs' (总运行次数)、排在前面的规则名，以及 format_minutes/min/max/abs/round/int 函数
 REWARD_RULES = {
     "reward_days": "days * 3",
     "reward_minutes": "format_minutes(days * 65)"
 }
 
 # HTML报告顶部的汇总显示模板
-# 可以使用 {successful_days} 以及 REWARD_RULES 中定义的变量
+# 可以使用 {successful_days}、{streak}、{longest_streak}、{total_runs} 以及 REWARD_RULES 中定义的变量
 # SUMMARY_TEMPLATE = "累计签到: {successful_days}天 (获得 {reward_days}天, 时长 {reward_minutes})"
\ No newline at end of file
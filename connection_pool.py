@@ -0,0 +1,286 @@
+import concurrent.futures
+import http.client
+import logging
+import socket
+import ssl
+import threading
+import time
+from typing import Iterable
+
+import config
+from dns_cache import get_dns_cache, resolve
+
+logger = logging.getLogger('CheckinTask')
+
+
+def _open_socket(conn: http.client.HTTPConnection) -> dict:
+    """
+    建立 TCP 连接，并分别记录 DNS 解析与 TCP 连接的耗时（秒）。
+    """
+    start = time.perf_counter()
+    addresses = resolve(conn.host, conn.port)
+    resolved = time.perf_counter()
+
+    last_error = None
+    for family, socktype, proto, _, address in addresses:
+        sock = socket.socket(family, socktype, proto)
+        try:
+            if isinstance(conn.timeout, (int, float)):
+                sock.settimeout(conn.timeout)
+            sock.connect(address)
+        except OSError as e:
+            sock.close()
+            last_error = e
+            continue
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.sock = sock
+        return {'dns': resolved - start, 'connect': time.perf_counter() - resolved}
+    raise last_error or OSError(f"无法解析主机: {conn.host}")
+
+
+class _PooledHTTPConnection(http.client.HTTPConnection):
+    """记录建连各阶段耗时的 HTTP 连接。phase_timings 在新建连接后由发送方取走。"""
+    phase_timings = None
+
+    def connect(self):
+        self.phase_timings = _open_socket(self)
+
+
+class _PooledHTTPSConnection(http.client.HTTPSConnection):
+    """
+    支持 TLS 会话复用的 HTTPS 连接。
+    建立连接时会尝试使用连接池中缓存的同一主机的 TLS 会话，从而跳过完整握手。
+    """
+    phase_timings = None
+
+    def __init__(self, host, port=None, *, pool, key, context, timeout=None):
+        super().__init__(host, port, timeout=timeout, context=context)
+        self._pool = pool
+        self._key = key
+
+    def connect(self):
+        # 只建立 TCP 连接，TLS 包装由下面自行完成，以便传入缓存的会话
+        timings = _open_socket(self)
+        tls_start = time.perf_counter()
+        session = self._pool._get_tls_session(self._key)
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=session)
+        timings['tls'] = time.perf_counter() - tls_start
+        self.phase_timings = timings
+        self._pool._on_tls_connected(self._key, self.sock)
+
+
+class ConnectionPool:
+    """
+    线程安全的 HTTP(S) 连接池。
+    按 (scheme, host, port) 分组保存空闲连接，实现 keep-alive 复用、TLS 会话复用、
+    空闲连接淘汰以及每个主机的最大连接数限制。
+    """
+    def __init__(self, max_per_host: int = 10, idle_timeout: float = 60.0, timeout: float | None = None,
+                 ssl_context: ssl.SSLContext | None = None):
+        self.max_per_host = max(1, max_per_host)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._idle = {}          # key -> [(conn, 最后使用时间), ...]，末尾为最近使用
+        self._in_use = {}        # key -> 当前借出的连接数
+        self._tls_sessions = {}  # key -> ssl.SSLSession
+        self._ssl_context = ssl_context or ssl.create_default_context()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "tls_handshakes": 0,
+            "tls_resumed": 0,
+            "prewarmed": 0,
+        }
+
+    def acquire(self, scheme: str, host: str, port: int | None = None) -> tuple[http.client.HTTPConnection, bool]:
+        """
+        借出一个连接。优先复用空闲连接，否则新建；达到上限时阻塞等待。
+        :return: (连接对象, 是否为复用的连接)
+        """
+        key = (scheme, host, port)
+        with self._cond:
+            while True:
+                self._evict_expired(key)
+                idle_list = self._idle.get(key)
+                if idle_list:
+                    conn, _ = idle_list.pop()
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    self._stats["hits"] += 1
+                    return conn, True
+                if self._in_use.get(key, 0) < self.max_per_host:
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    self._stats["misses"] += 1
+                    break
+                self._cond.wait()
+
+        # 在锁外创建连接对象（真正的网络连接在首次发送请求时建立）
+        try:
+            return self._new_connection(key), False
+        except Exception:
+            self._release_slot(key)
+            raise
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool = True) -> None:
+        """
+        归还连接。reusable 为 False 时（如服务器要求关闭、响应未读完、发生错误）直接关闭。
+        """
+        key = conn._pool_key
+        if reusable and conn.sock is not None:
+            if isinstance(conn.sock, ssl.SSLSocket) and conn.sock.session is not None:
+                # TLS 1.3 的会话票据在握手后才到达，归还时再记录一次
+                with self._cond:
+                    self._tls_sessions[key] = conn.sock.session
+            with self._cond:
+                self._idle.setdefault(key, []).append((conn, time.monotonic()))
+                self._in_use[key] -= 1
+                self._cond.notify()
+            return
+
+        conn.close()
+        self._release_slot(key)
+
+    def discard(self, conn: http.client.HTTPConnection) -> None:
+        """关闭并丢弃一个借出的连接。"""
+        self.release(conn, reusable=False)
+
+    def prewarm(self, scheme: str, host: str, port: int | None = None) -> bool:
+        """
+        提前建立一个到该主机的连接 (含 TLS 握手) 并放入空闲列表，之后的请求可以直接复用。
+        :return: 是否新建了连接；已有空闲连接或达到连接数上限时不新建。
+        """
+        key = (scheme, host, port)
+        with self._cond:
+            self._evict_expired(key)
+            if self._idle.get(key) or self._in_use.get(key, 0) >= self.max_per_host:
+                return False
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            conn = self._new_connection(key)
+            conn.connect()
+        except Exception:
+            self._release_slot(key)
+            raise
+        # 建连耗时发生在预热阶段，不计入之后使用该连接的请求
+        conn.phase_timings = None
+        with self._cond:
+            self._stats["prewarmed"] += 1
+        self.release(conn)
+        return True
+
+    def stats(self) -> dict:
+        """返回连接池命中/未命中等统计计数的快照。"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = sum(len(v) for v in self._idle.values())
+            snapshot["in_use"] = sum(self._in_use.values())
+        return snapshot
+
+    def close_all(self) -> None:
+        """关闭所有空闲连接。"""
+        with self._cond:
+            idle, self._idle = self._idle, {}
+        for idle_list in idle.values():
+            for conn, _ in idle_list:
+                conn.close()
+
+    def _new_connection(self, key) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = _PooledHTTPSConnection(host, port, pool=self, key=key,
+                                          context=self._ssl_context, timeout=self.timeout)
+        else:
+            conn = _PooledHTTPConnection(host, port, timeout=self.timeout)
+        conn._pool_key = key
+        return conn
+
+    def _release_slot(self, key) -> None:
+        with self._cond:
+            self._in_use[key] -= 1
+            self._cond.notify()
+
+    def _evict_expired(self, key) -> None:
+        """淘汰超时或已被关闭的空闲连接，调用方需持有锁。"""
+        idle_list = self._idle.get(key)
+        if not idle_list:
+            return
+        now = time.monotonic()
+        alive = []
+        for conn, last_used in idle_list:
+            if conn.sock is None or now - last_used > self.idle_timeout:
+                conn.close()
+                self._stats["evictions"] += 1
+            else:
+                alive.append((conn, last_used))
+        self._idle[key] = alive
+
+    def _get_tls_session(self, key):
+        with self._cond:
+            return self._tls_sessions.get(key)
+
+    def _on_tls_connected(self, key, sock: ssl.SSLSocket) -> None:
+        with self._cond:
+            self._stats["tls_handshakes"] += 1
+            if sock.session_reused:
+                self._stats["tls_resumed"] += 1
+            if sock.session is not None:
+                self._tls_sessions[key] = sock.session
+
+
+# 全局共享的连接池，供所有任务线程使用
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """获取全局共享的连接池（首次调用时创建）。"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = ConnectionPool(
+                    max_per_host=config.POOL_MAX_PER_HOST,
+                    idle_timeout=config.POOL_IDLE_TIMEOUT,
+                    timeout=config.REQUEST_TIMEOUT,
+                )
+    return _default_pool
+
+
+def set_pool(pool: ConnectionPool | None) -> ConnectionPool | None:
+    """
+    替换全局共享的连接池（例如在基准测试中信任自签名证书），返回原来的连接池。
+    传入 None 时，下次使用时按当前配置重新创建。
+    """
+    global _default_pool
+    with _default_pool_lock:
+        previous, _default_pool = _default_pool, pool
+    return previous
+
+
+def prewarm_hosts(targets: Iterable[tuple[str, str, int | None]], connect: bool = True) -> int:
+    """
+    为一组 (scheme, host, port) 并发解析 DNS；connect 为 True 时再为每个目标建立一个连接。
+    失败只记录日志，请求发送时会正常重试。
+    :return: 新建的连接数。
+    """
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        return 0
+    if config.DNS_CACHE_ENABLED:
+        get_dns_cache().prefetch((host for _, host, _ in targets), wait=True)
+    if not connect:
+        return 0
+
+    pool = get_pool()
+    opened = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(targets), 8),
+                                               thread_name_prefix='Prewarm') as executor:
+        future_to_target = {executor.submit(pool.prewarm, *target): target for target in targets}
+        for future in concurrent.futures.as_completed(future_to_target):
+            scheme, host, port = future_to_target[future]
+            try:
+                opened += future.result()
+            except Exception as e:
+                logger.warning(f"预先建立连接失败: {scheme}://{host}{f':{port}' if port else ''} - {e}")
+    return opened
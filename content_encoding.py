@@ -0,0 +1,193 @@
+import zlib
+
+import config
+
+# brotli / zstd 为可选依赖，安装后自动启用
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 单次解压输出的最大字节数，避免一个压缩块瞬间膨胀出大量数据
+_MAX_PIECE_SIZE = 64 * 1024
+# 解压库没有限制输出大小的接口时，每次只喂入这么多字节的压缩数据，单次输出的大小随之受限
+# (zstd 每 4 字节的 RLE 块最多展开为 128KB，即单次最多约 2MB)
+_BOUNDED_INPUT_SIZE = 64
+
+
+class DecodeError(Exception):
+    """响应体解压失败。"""
+
+
+def _supported_encodings() -> tuple[str, ...]:
+    encodings = ['gzip', 'deflate']
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    return tuple(encodings)
+
+
+SUPPORTED_ENCODINGS = _supported_encodings()
+
+
+# 发送请求时使用的 Accept-Encoding 请求头 (替换 HAR 中记录的值)，首次使用时按配置确定
+_accept_encoding = None
+
+
+def accept_encoding() -> str:
+    """返回发送请求时使用的 Accept-Encoding 请求头的值。"""
+    global _accept_encoding
+    if _accept_encoding is None:
+        _accept_encoding = ', '.join(SUPPORTED_ENCODINGS) if config.RESPONSE_COMPRESSION else 'identity'
+    return _accept_encoding
+
+
+def reset_accept_encoding() -> None:
+    """丢弃已确定的 Accept-Encoding，下次使用时按当前的 RESPONSE_COMPRESSION 重新确定。"""
+    global _accept_encoding
+    _accept_encoding = None
+
+
+class _ZlibDecoder:
+    """gzip / deflate 解码器。deflate 同时兼容带 zlib 头和裸 deflate 两种格式。"""
+    def __init__(self, encoding: str):
+        # gzip: 16 + MAX_WBITS；deflate 先按 zlib 格式尝试，首块失败时改用裸 deflate
+        self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS)
+        self._first = encoding == 'deflate'
+
+    def decompress(self, data: bytes):
+        if self._first:
+            self._first = False
+            try:
+                probe = zlib.decompressobj(zlib.MAX_WBITS)
+                probe.decompress(data[:2])
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        while data:
+            piece = self._obj.decompress(data, _MAX_PIECE_SIZE)
+            data = self._obj.unconsumed_tail
+            if piece:
+                yield piece
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliDecoder:
+    """
+    brotli 解码器。brotli >= 1.2 的 process 支持 output_buffer_limit，每次输出不超过 _MAX_PIECE_SIZE；
+    更早的版本与 brotlicffi 没有这个参数，只能按 _BOUNDED_INPUT_SIZE 字节的小段喂入，
+    此时单次输出没有严格上限 (一条复制指令最多展开约 16MB)。
+    """
+    def __init__(self):
+        self._obj = brotli.Decompressor()
+        self._bounded = hasattr(self._obj, 'can_accept_more_data')
+
+    def decompress(self, data: bytes):
+        if not self._bounded:
+            for start in range(0, len(data), _BOUNDED_INPUT_SIZE):
+                piece = self._obj.process(data[start:start + _BOUNDED_INPUT_SIZE])
+                if piece:
+                    yield piece
+            return
+        piece = self._obj.process(data, output_buffer_limit=_MAX_PIECE_SIZE)
+        while True:
+            if piece:
+                yield piece
+            # 输出达到上限时剩余的输入留在解码器内，用空输入继续取出
+            if self._obj.can_accept_more_data():
+                return
+            piece = self._obj.process(b'', output_buffer_limit=_MAX_PIECE_SIZE)
+
+    def flush(self) -> bytes:
+        return b''
+
+
+class _ZstdDecoder:
+    """zstd 解码器。zstandard 的 decompressobj 没有输出上限参数，按 _BOUNDED_INPUT_SIZE 字节的小段喂入。"""
+    def __init__(self):
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes):
+        for start in range(0, len(data), _BOUNDED_INPUT_SIZE):
+            piece = self._obj.decompress(data[start:start + _BOUNDED_INPUT_SIZE])
+            if piece:
+                yield piece
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def _make_decoder(encoding: str):
+    if encoding in ('gzip', 'x-gzip'):
+        return _ZlibDecoder('gzip')
+    if encoding == 'deflate':
+        return _ZlibDecoder('deflate')
+    if encoding == 'br' and brotli is not None:
+        return _BrotliDecoder()
+    if encoding == 'zstd' and zstandard is not None:
+        return _ZstdDecoder()
+    raise DecodeError(f"不支持的内容编码: {encoding}")
+
+
+class BodyDecoder:
+    """
+    按 Content-Encoding 流式解码响应体。
+    原始 (线路上的) 字节数与解码后的字节数分别记录在 wire_bytes 与 decoded_bytes 中。
+    解码是惰性的：sink 返回 True (如校验器读满 RESPONSE_MAX_BYTES) 后不再解压剩余数据，
+    因此解码后的总大小不超过 sink 的上限加上一次解压的输出。
+    """
+    def __init__(self, content_encoding: str | None):
+        encodings = [item.strip().lower() for item in (content_encoding or '').split(',')]
+        # 多重编码按应用顺序的逆序解码
+        self._decoders = [_make_decoder(item) for item in reversed(encodings) if item and item != 'identity']
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def feed(self, chunk: bytes, sink) -> bool:
+        """
+        解码一块原始数据并逐段交给 sink (如 ResponseValidator.feed)。
+        sink 返回 True 时停止解码并返回 True，表示无需继续读取。
+        """
+        self.wire_bytes += len(chunk)
+        return self._emit(self._decode(chunk, 0), sink)
+
+    def finish(self, sink) -> bool:
+        """响应体读完后输出解码器中剩余的数据。"""
+        return self._emit(self._flush(0), sink)
+
+    def _emit(self, pieces, sink) -> bool:
+        try:
+            for piece in pieces:
+                self.decoded_bytes += len(piece)
+                if sink(piece):
+                    return True
+        except DecodeError:
+            raise
+        except Exception as e:
+            raise DecodeError(f"响应体解压失败: {e}") from e
+        return False
+
+    def _decode(self, data: bytes, level: int):
+        if level == len(self._decoders):
+            yield data
+            return
+        for piece in self._decoders[level].decompress(data):
+            yield from self._decode(piece, level + 1)
+
+    def _flush(self, level: int):
+        if level == len(self._decoders):
+            return
+        tail = self._decoders[level].flush()
+        if tail:
+            yield from self._decode(tail, level + 1)
+        yield from self._flush(level + 1)
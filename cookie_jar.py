@@ -0,0 +1,162 @@
+import time
+from dataclasses import dataclass
+
+from request_plan import RequestPlan
+
+
+@dataclass(slots=True)
+class _Cookie:
+    name: str
+    value: str
+    domain: str
+    path: str
+    expires: float | None  # Unix 时间戳，None 表示会话 Cookie
+    secure: bool
+    host_only: bool
+
+
+def _default_path(request_path: str) -> str:
+    """RFC 6265 5.1.4: 未指定 Path 时取请求路径的"目录"部分。"""
+    path = request_path.split('?', 1)[0]
+    if not path.startswith('/') or path.count('/') == 1:
+        return '/'
+    return path[:path.rindex('/')]
+
+
+def _domain_match(host: str, domain: str) -> bool:
+    return host == domain or host.endswith('.' + domain)
+
+
+def _path_match(request_path: str, cookie_path: str) -> bool:
+    if request_path == cookie_path:
+        return True
+    return request_path.startswith(cookie_path) and (
+        cookie_path.endswith('/') or request_path[len(cookie_path)] == '/')
+
+
+class CookieJar:
+    """
+    一个轻量的会话 Cookie 容器。
+    以 (domain, path, name) 为键保存 Cookie，根据响应的 Set-Cookie 原地更新，
+    并在发送请求时只序列化适用于该请求 (域名、路径、协议、有效期) 的 Cookie。
+    """
+    def __init__(self):
+        self._cookies: dict[tuple[str, str, str], _Cookie] = {}
+
+    def update_from_response(self, set_cookie_headers: list[str], plan: RequestPlan) -> None:
+        """根据响应中的 Set-Cookie 头更新 Cookie。"""
+        if not set_cookie_headers:
+            return
+        host = (plan.host or '').lower()
+        now = time.time()
+        for header in set_cookie_headers:
+            cookie = self._parse_set_cookie(header, host, plan.path, now)
+            if cookie is None:
+                continue
+            key = (cookie.domain, cookie.path, cookie.name)
+            if cookie.expires is not None and cookie.expires <= now:
+                # 过期时间已到，表示删除该 Cookie
+                self._cookies.pop(key, None)
+            else:
+                self._cookies[key] = cookie
+
+    def header_for(self, plan: RequestPlan) -> str:
+        """
+        生成发送 plan 时使用的 Cookie 头。
+        HAR 中记录的静态 Cookie 与会话 Cookie 同名时，以会话 Cookie 为准，不会重复出现。
+        """
+        if not self._cookies:
+            return plan.cookie
+
+        host = (plan.host or '').lower()
+        request_path = plan.path.split('?', 1)[0] or '/'
+        secure = plan.scheme == 'https'
+        now = time.time()
+
+        matching = []
+        expired = []
+        for key, cookie in self._cookies.items():
+            if cookie.expires is not None and cookie.expires <= now:
+                expired.append(key)
+                continue
+            if cookie.secure and not secure:
+                continue
+            if cookie.host_only:
+                if host != cookie.domain:
+                    continue
+            elif not _domain_match(host, cookie.domain):
+                continue
+            if not _path_match(request_path, cookie.path):
+                continue
+            matching.append(cookie)
+        for key in expired:
+            del self._cookies[key]
+
+        if not matching:
+            return plan.cookie
+
+        # RFC 6265 5.4: 路径更长的 Cookie 排在前面
+        matching.sort(key=lambda c: len(c.path), reverse=True)
+        session_names = {cookie.name for cookie in matching}
+        parts = [text for name, text in plan.cookie_pairs if name not in session_names]
+        parts.extend(f"{cookie.name}={cookie.value}" for cookie in matching)
+        return "; ".join(parts)
+
+    @staticmethod
+    def _parse_set_cookie(header: str, host: str, request_path: str, now: float) -> _Cookie | None:
+        parts = header.split(';')
+        name, sep, value = parts[0].partition('=')
+        name = name.strip()
+        if not sep or not name:
+            return None
+
+        domain = ''
+        path = ''
+        expires = None
+        max_age = None
+        secure = False
+        for attribute in parts[1:]:
+            attr_name, _, attr_value = attribute.partition('=')
+            attr_name = attr_name.strip().lower()
+            attr_value = attr_value.strip()
+            if attr_name == 'domain':
+                domain = attr_value.lstrip('.').lower()
+            elif attr_name == 'path':
+                path = attr_value if attr_value.startswith('/') else ''
+            elif attr_name == 'max-age':
+                try:
+                    max_age = int(attr_value)
+                except ValueError:
+                    pass
+            elif attr_name == 'expires':
+                # email.utils 导入较慢，只在遇到 Expires 时才导入
+                from email.utils import parsedate_to_datetime
+                try:
+                    expires = parsedate_to_datetime(attr_value).timestamp()
+                except (TypeError, ValueError, IndexError):
+                    pass
+            elif attr_name == 'secure':
+                secure = True
+
+        # Max-Age 优先于 Expires
+        if max_age is not None:
+            expires = now + max_age
+
+        if domain:
+            # 拒绝为无关域名设置的 Cookie
+            if not _domain_match(host, domain):
+                return None
+            host_only = False
+        else:
+            domain = host
+            host_only = True
+
+        return _Cookie(
+            name=name,
+            value=value.strip(),
+            domain=domain,
+            path=path or _default_path(request_path),
+            expires=expires,
+            secure=secure,
+            host_only=host_only,
+        )
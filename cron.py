@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+# 各字段的取值范围: 分 时 日 月 周
+_FIELDS = (
+    ('分钟', 0, 59),
+    ('小时', 0, 23),
+    ('日期', 1, 31),
+    ('月份', 1, 12),
+    ('星期', 0, 7),
+)
+_MONTH_NAMES = {name: i for i, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+_DAY_NAMES = {name: i for i, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+# 查找下一次触发时间时最多向后搜索的年数 (如 "0 0 30 2 *" 永远不会触发)
+_MAX_YEARS = 5
+
+
+def _parse_value(text: str, low: int, high: int, names: dict[str, int] | None) -> int:
+    value = names.get(text.lower()) if names else None
+    if value is None:
+        if not text.isdigit():
+            raise ValueError(f"无法识别的值 '{text}'")
+        value = int(text)
+    if not low <= value <= high:
+        raise ValueError(f"{value} 超出范围 {low}-{high}")
+    return value
+
+
+def _parse_field(text: str, label: str, low: int, high: int, names: dict[str, int] | None = None) -> frozenset[int]:
+    """解析单个字段，支持 *、*/n、a-b、a-b/n、a/n 以及逗号分隔的列表。"""
+    values = set()
+    for part in text.split(','):
+        spec, _, step_text = part.partition('/')
+        try:
+            step = int(step_text) if step_text else 1
+            if step < 1:
+                raise ValueError("步长必须大于 0")
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                first, _, last = spec.partition('-')
+                start, end = _parse_value(first, low, high, names), _parse_value(last, low, high, names)
+                if start > end:
+                    raise ValueError(f"范围 {spec} 起点大于终点")
+            else:
+                start = _parse_value(spec, low, high, names)
+                end = high if step_text else start
+        except ValueError as e:
+            raise ValueError(f"{label}字段 '{text}' 无效: {e}") from None
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    标准 5 字段 cron 表达式 (分 时 日 月 周)，按本地时间计算触发时间。
+    支持 *、*/n、a-b、a-b/n、列表、月份/星期的英文缩写，以及 @daily、@hourly 等别名。
+    与 cron 相同，日期与星期都被限定时，满足其一即可触发。
+    """
+    __slots__ = ('expression', 'minutes', 'hours', 'days', 'months', 'weekdays', '_any_day', '_any_weekday')
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = _ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表达式需要 5 个字段 (分 时 日 月 周): '{expression}'")
+        (minute, hour, day, month, weekday) = fields
+        self.minutes = _parse_field(minute, *_FIELDS[0])
+        self.hours = _parse_field(hour, *_FIELDS[1])
+        self.days = _parse_field(day, *_FIELDS[2])
+        self.months = _parse_field(month, *_FIELDS[3], names=_MONTH_NAMES)
+        # 星期 7 与 0 都表示周日
+        self.weekdays = frozenset(d % 7 for d in _parse_field(weekday, *_FIELDS[4], names=_DAY_NAMES))
+        self._any_day = day.startswith('*')
+        self._any_weekday = weekday.startswith('*')
+
+    def __repr__(self) -> str:
+        return f"CronSchedule({self.expression!r})"
+
+    def _day_matches(self, t: datetime) -> bool:
+        day_ok = t.day in self.days
+        weekday_ok = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """返回严格晚于 after 的下一次触发时间 (精确到分钟)。"""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit_year = t.year + _MAX_YEARS
+        while t.year <= limit_year:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+            elif t.hour not in self.hours:
+                t = (t + timedelta(hours=1)).replace(minute=0)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron 表达式 '{self.expression}' 在 {_MAX_YEARS} 年内不会触发")
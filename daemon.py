@@ -0,0 +1,450 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+import config
+from cron import CronSchedule
+
+logger = logging.getLogger('CheckinTask')
+
+
+class _ScheduledTask:
+    """常驻模式下的一个任务: 任务配置、cron 计划与下一次运行时间。"""
+    __slots__ = ('config', 'name', 'schedule', 'next_run')
+
+    def __init__(self, task_config: dict, schedule: CronSchedule, now: datetime):
+        self.config = task_config
+        self.name = task_config.get('name', '未命名任务')
+        self.schedule = schedule
+        self.next_run = schedule.next_after(now)
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _har_path(task_config: dict) -> str:
+    return os.path.join(config.BASE_DIR, task_config.get('har_file', ''))
+
+
+def _rebuild_notifications() -> None:
+    from notify import reload_notifications
+    reload_notifications()
+
+
+def _rebuild_pool() -> None:
+    from connection_pool import set_pool
+    previous = set_pool(None)
+    if previous is not None:
+        previous.close_all()
+
+
+def _rebuild_dns_cache() -> None:
+    from dns_cache import set_dns_cache
+    set_dns_cache(None)
+
+
+def _rebuild_rate_limiter() -> None:
+    from rate_limiter import set_rate_limiter
+    set_rate_limiter(None)
+
+
+def _rebuild_retry_state() -> None:
+    from retry_policy import reset_shared_state
+    reset_shared_state()
+
+
+def _rebuild_history_store() -> None:
+    from history_store import close_store
+    close_store()
+
+
+def _rebuild_accept_encoding() -> None:
+    from content_encoding import reset_accept_encoding
+    reset_accept_encoding()
+
+
+# 常驻期间一直持有的全局对象: (构造它们所用的配置项, 重新创建的函数)。
+# 重新加载 .env 后其中任一配置项变化时重新创建，其余配置项每次使用时读取，立即生效
+_SHARED_OBJECTS = (
+    (('WXPUSHER_APP_TOKEN', 'WXPUSHER_UIDS', 'WXPUSHER_API_URL', 'NOTIFY_TIMEOUT', 'NOTIFY_MERGE_WINDOW',
+      'NOTIFY_MAX_ATTEMPTS', 'NOTIFY_RETRY_BASE_DELAY', 'NOTIFY_RETRY_MAX_DELAY', 'NOTIFY_OUTBOX_DIR'),
+     _rebuild_notifications),
+    (('POOL_MAX_PER_HOST', 'POOL_IDLE_TIMEOUT', 'REQUEST_TIMEOUT'), _rebuild_pool),
+    (('DNS_CACHE_TTL',), _rebuild_dns_cache),
+    (('RATE_LIMIT_PER_HOST', 'RATE_LIMIT_BURST', 'RATE_LIMIT_HOSTS', 'RATE_LIMIT_MAX_PAUSE'), _rebuild_rate_limiter),
+    (('RETRY_BUDGET_RATIO', 'RETRY_BUDGET_CAPACITY', 'CIRCUIT_FAILURE_THRESHOLD', 'CIRCUIT_RESET_SECONDS'),
+     _rebuild_retry_state),
+    (('HISTORY_DB',), _rebuild_history_store),
+    (('RESPONSE_COMPRESSION',), _rebuild_accept_encoding),
+)
+# 只在启动时读取一次的配置项 (日志系统与本地端点)，修改后需重启常驻进程
+_RESTART_ONLY = ('DEBUG_MODE', 'CONSOLE_CONCISE_MODE', 'LOG_DURABILITY', 'LOG_FSYNC_INTERVAL_MS', 'LOG_BATCH_SIZE',
+                 'METRICS_PORT', 'DAEMON_CONTROL_PORT')
+
+
+class Daemon:
+    """
+    常驻调度器。按每个任务的 cron 表达式 (schedule 字段，未配置时为 DAEMON_SCHEDULE) 定时运行到期的任务，
+    同一时刻到期的任务合并为一次运行 (一份报告)，运行的截止时间为这些任务的下一次运行时间。
+    运行之间进程保持存活，已解析的请求计划与连接池得以复用。
+    每隔 DAEMON_POLL_SECONDS 秒检查 tasks.json、.env 与 HAR 文件的修改时间，变化时自动重新加载。
+    可通过 SIGUSR1 或本地控制端点 (POST /run) 立即运行，GET /status 查看状态。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._signal_run = False
+        self._manual: list[str] | None = []     # 等待立即运行的任务名，None 表示全部任务
+        self._tasks: dict[str, _ScheduledTask] = {}
+        self._task_order: list[str] = []
+        self._mtimes: dict[str, int | None] = {}
+        self._started_at = datetime.now()
+        self._runs = 0
+        self._current_run: dict | None = None
+        self._last_run: dict | None = None
+        self._server = None
+        self._prewarmed_for: datetime | None = None    # 已为哪一次计划运行预热过
+
+    # --- 外部控制 ---
+
+    def trigger(self, names: list[str] | None = None) -> list[str]:
+        """
+        请求立即运行指定任务 (为空时运行全部任务)，返回将要运行的任务名。
+        任务名不存在时抛出 KeyError。
+        """
+        with self._lock:
+            unknown = [name for name in names or () if name not in self._tasks]
+            if unknown:
+                raise KeyError(', '.join(unknown))
+            if not names:
+                self._manual = None
+            elif self._manual is not None:
+                self._manual.extend(name for name in names if name not in self._manual)
+            queued = list(self._task_order) if self._manual is None else list(self._manual)
+        self._wakeup.set()
+        return queued
+
+    def stop(self) -> None:
+        """请求退出，正在进行的运行结束后生效。"""
+        self._stopping = True
+        self._wakeup.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            tasks = [
+                {"name": task.name, "schedule": task.schedule.expression,
+                 "next_run": task.next_run.isoformat(timespec='seconds')}
+                for task in (self._tasks[name] for name in self._task_order)
+            ]
+            return {
+                "state": "running" if self._current_run else "idle",
+                "started_at": self._started_at.isoformat(timespec='seconds'),
+                "runs": self._runs,
+                "current_run": self._current_run,
+                "last_run": self._last_run,
+                "tasks": tasks,
+            }
+
+    # --- 主循环 ---
+
+    def run(self) -> None:
+        self._install_signal_handlers()
+        if config.DAEMON_CONTROL_PORT:
+            self._server = _serve_control(self, config.DAEMON_CONTROL_PORT)
+
+        self._check_files(initial=True)
+        logger.info(f"常驻模式已启动，共 {len(self._tasks)} 个任务。")
+        self._log_schedule()
+
+        last_poll = time.monotonic()
+        while not self._stopping:
+            self._wakeup.clear()
+            if time.monotonic() - last_poll >= config.DAEMON_POLL_SECONDS:
+                self._check_files()
+                last_poll = time.monotonic()
+
+            due = self._take_due(datetime.now())
+            if due:
+                self._run(due)
+                continue
+
+            self._maybe_prewarm()
+            self._wakeup.wait(self._seconds_until_next(config.DAEMON_POLL_SECONDS))
+
+        if self._server is not None:
+            self._server.shutdown()
+        logger.info("常驻模式已退出。")
+
+    def _take_due(self, now: datetime) -> list[dict]:
+        """取出到期或被要求立即运行的任务 (按 tasks.json 中的顺序)，并计算它们的下一次运行时间。"""
+        with self._lock:
+            if self._signal_run:
+                self._signal_run = False
+                self._manual = None
+            manual = set(self._task_order) if self._manual is None else set(self._manual)
+            self._manual = []
+            due = []
+            for name in self._task_order:
+                task = self._tasks[name]
+                if task.next_run <= now or name in manual:
+                    if task.next_run <= now:
+                        task.next_run = task.schedule.next_after(now)
+                    due.append(task.config)
+            return due
+
+    def _seconds_until_next(self, limit: float) -> float:
+        """距离下一个需要处理的时间点 (预热或运行) 的秒数，最多 limit 秒。"""
+        with self._lock:
+            if not self._tasks:
+                return limit
+            next_run = min(task.next_run for task in self._tasks.values())
+            # 只有上一次运行的时间点预热过时，下一次运行仍需提前醒来预热
+            prewarmed = self._prewarmed_for == next_run
+        seconds = (next_run - datetime.now()).total_seconds()
+        if config.PREWARM_SECONDS > 0 and not prewarmed and seconds > config.PREWARM_SECONDS:
+            seconds -= config.PREWARM_SECONDS
+        return max(0.0, min(limit, seconds))
+
+    def _maybe_prewarm(self) -> None:
+        """
+        下一次运行前 PREWARM_SECONDS 秒内，在后台解析即将运行的任务涉及的主机并建立连接，
+        让计划运行的第一个请求不再等待 DNS、TCP 与 TLS 握手。
+        """
+        if config.PREWARM_SECONDS <= 0 or config.ENGINE == 'process':
+            # 多进程模式每次运行都启动新的工作进程，预热的缓存与连接无法带入
+            return
+        with self._lock:
+            if not self._tasks:
+                return
+            next_run = min(task.next_run for task in self._tasks.values())
+            if next_run == self._prewarmed_for:
+                return
+            if (next_run - datetime.now()).total_seconds() > config.PREWARM_SECONDS:
+                return
+            self._prewarmed_for = next_run
+            task_configs = [task.config for task in self._tasks.values() if task.next_run == next_run]
+        threading.Thread(target=self._prewarm, args=(task_configs,), name='Prewarm', daemon=True).start()
+
+    def _prewarm(self, task_configs: list[dict]) -> None:
+        from connection_pool import prewarm_hosts
+        from plan_cache import load_plan
+
+        targets = []
+        for task_config in task_configs:
+            har_file = _har_path(task_config)
+            if os.path.exists(har_file):
+                targets.extend((plan.scheme, plan.host, plan.port) for plan in load_plan(har_file) or ())
+        # 协程模式的连接池属于每次运行新建的事件循环，只能预先解析 DNS
+        connect = config.PREWARM_CONNECTIONS and config.ENGINE != 'async'
+        try:
+            opened = prewarm_hosts(targets, connect=connect)
+        except Exception as e:
+            logger.warning(f"预热失败: {e}")
+            return
+        logger.info(f"已为即将运行的任务预热: {len(set(targets))} 个目标主机，新建 {opened} 个连接。")
+
+    def _run(self, tasks: list[dict]) -> None:
+        from main import run_tasks
+
+        started = datetime.now()
+        names = [t.get('name', '未命名任务') for t in tasks]
+        with self._lock:
+            self._current_run = {"tasks": names, "started_at": started.isoformat(timespec='seconds')}
+            # 本次运行不应拖到这些任务的下一次运行时间之后
+            next_slots = [self._tasks[name].next_run for name in names if name in self._tasks]
+        deadline = min(next_slots).timestamp() if next_slots else None
+        results = []
+        try:
+            results = run_tasks(tasks, deadline)
+        except Exception as e:
+            logger.exception(f"常驻模式运行任务时出错: {e}")
+        finished = datetime.now()
+        with self._lock:
+            self._runs += 1
+            self._current_run = None
+            self._last_run = {
+                "started_at": started.isoformat(timespec='seconds'),
+                "finished_at": finished.isoformat(timespec='seconds'),
+                "duration": round((finished - started).total_seconds(), 3),
+                "success": bool(results) and all(r['success'] for r in results),
+                "failed": [r['name'] for r in results if not r['success']],
+            }
+        self._log_schedule()
+
+    def _log_schedule(self) -> None:
+        with self._lock:
+            upcoming = sorted(self._tasks.values(), key=lambda task: task.next_run)
+        if upcoming:
+            first = upcoming[0]
+            logger.info(f"下一次运行: {first.next_run:%Y-%m-%d %H:%M} (任务 '{first.name}')")
+
+    # --- 热加载 ---
+
+    def _check_files(self, initial: bool = False) -> None:
+        """按修改时间检查 .env、tasks.json 与 HAR 文件，变化时重新加载。"""
+        env_file = os.path.join(config.BASE_DIR, '.env')
+        env_changed = self._changed(env_file)
+        if env_changed and not initial:
+            self._reload_config()
+
+        if self._changed(config.TASKS_FILE) or env_changed:
+            self._load_tasks()
+
+        har_changed = False
+        for task in list(self._tasks.values()):
+            har_file = _har_path(task.config)
+            if self._changed(har_file) and os.path.exists(har_file):
+                if not initial:
+                    logger.info(f"检测到 HAR 文件变化，重新解析: {har_file}")
+                    har_changed = True
+                self._warm_plan(har_file)
+        if har_changed:
+            # 旧请求计划引用的请求体不再需要，释放其内存映射 (仍在使用的请求体会在访问时重新映射)
+            import blob_store
+            blob_store.close()
+
+    def _reload_config(self) -> None:
+        """重新加载 .env；常驻期间一直持有的全局对象 (连接池、通知渠道等) 的配置变化时重新创建。"""
+        keys = [key for group, _ in _SHARED_OBJECTS for key in group] + list(_RESTART_ONLY)
+        before = {key: getattr(config, key) for key in keys}
+        config.reload()
+        changed = {key for key in keys if getattr(config, key) != before[key]}
+        for group, rebuild in _SHARED_OBJECTS:
+            if changed.intersection(group):
+                rebuild()
+        restart = [key for key in _RESTART_ONLY if key in changed]
+        if restart:
+            logger.warning(f"检测到 .env 变化，已重新加载配置；以下配置项需重启后生效: {', '.join(restart)}")
+        else:
+            logger.info("检测到 .env 变化，已重新加载配置。")
+
+    def _changed(self, path: str) -> bool:
+        mtime = _mtime(path)
+        if path in self._mtimes and self._mtimes[path] == mtime:
+            return False
+        self._mtimes[path] = mtime
+        return True
+
+    def _warm_plan(self, har_file: str) -> None:
+        """提前解析 HAR 文件，使下一次运行直接命中进程内缓存。"""
+        from plan_cache import load_plan
+
+        try:
+            load_plan(har_file)
+        except Exception as e:
+            logger.warning(f"预先解析 HAR 文件失败: {har_file} - {e}")
+
+    def _load_tasks(self) -> None:
+        """重新读取 tasks.json。文件不可用时保留当前任务；计划未变化的任务保留原来的下一次运行时间。"""
+        try:
+            with open(config.TASKS_FILE, 'r', encoding='utf-8') as f:
+                task_configs = json.load(f)
+            if not isinstance(task_configs, list):
+                raise ValueError("顶层必须是任务列表")
+        except (OSError, ValueError) as e:
+            logger.error(f"加载任务配置文件失败，继续使用当前任务: {config.TASKS_FILE} - {e}")
+            return
+
+        now = datetime.now()
+        tasks, order = {}, []
+        with self._lock:
+            previous = self._tasks
+        for task_config in task_configs:
+            name = task_config.get('name', '未命名任务')
+            if name in tasks:
+                logger.error(f"任务名重复: '{name}'，只保留第一个。")
+                continue
+            expression = task_config.get('schedule') or config.DAEMON_SCHEDULE
+            old = previous.get(name)
+            if old is not None and old.schedule.expression == expression.strip():
+                old.config = task_config
+                tasks[name] = old
+            else:
+                try:
+                    tasks[name] = _ScheduledTask(task_config, CronSchedule(expression), now)
+                except ValueError as e:
+                    logger.error(f"任务 '{name}' 的 schedule 无效，跳过此任务: {e}")
+                    continue
+            order.append(name)
+
+        with self._lock:
+            self._tasks, self._task_order = tasks, order
+            if self._manual:
+                self._manual = [name for name in self._manual if name in tasks]
+        if previous:
+            logger.info(f"已重新加载任务配置，共 {len(tasks)} 个任务。")
+
+    # --- 信号 ---
+
+    def _install_signal_handlers(self) -> None:
+        def _on_stop(signum, frame):
+            logger.info("收到退出信号，当前运行结束后退出。")
+            self.stop()
+
+        def _on_run(signum, frame):
+            # 信号处理函数中不获取锁，只设置标志，由主循环处理
+            self._signal_run = True
+            self._wakeup.set()
+
+        signal.signal(signal.SIGINT, _on_stop)
+        signal.signal(signal.SIGTERM, _on_stop)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, _on_run)
+
+
+def _serve_control(daemon: Daemon, port: int, host: str = '127.0.0.1'):
+    """在后台线程中启动本地控制端点: GET /status 返回状态，POST /run[?task=名称] 立即运行。"""
+    import http.server
+    from urllib.parse import parse_qs, urlsplit
+
+    class _ControlHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlsplit(self.path).path != '/status':
+                self._reply(404, {"error": "not found"})
+                return
+            self._reply(200, daemon.status())
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != '/run':
+                self._reply(404, {"error": "not found"})
+                return
+            names = parse_qs(url.query).get('task', [])
+            try:
+                queued = daemon.trigger(names)
+            except KeyError as e:
+                self._reply(404, {"error": f"未知任务: {e.args[0]}"})
+                return
+            logger.info(f"收到立即运行请求: {', '.join(queued) or '(无任务)'}")
+            self._reply(202, {"queued": queued})
+
+    server = http.server.ThreadingHTTPServer((host, port), _ControlHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='daemon-control', daemon=True).start()
+    logger.info(f"控制端点已启动: http://{host}:{server.server_port}/status")
+    return server
+
+
+def run_daemon() -> None:
+    """以常驻模式运行，直到收到 SIGINT/SIGTERM。"""
+    Daemon().run()
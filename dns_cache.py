@@ -0,0 +1,170 @@
+import concurrent.futures
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Iterable
+
+import config
+
+logger = logging.getLogger('CheckinTask')
+
+# getaddrinfo 返回的地址: (family, type, proto, canonname, sockaddr)
+AddrInfo = tuple
+# 解析器: 主机名 -> (地址列表, TTL 秒数)；TTL 为 None 时使用缓存的默认 TTL
+Resolver = Callable[[str], tuple[list[AddrInfo], float | None]]
+# 重新解析失败、沿用过期记录时，在这段时间（秒）内不再重试解析
+_STALE_RETRY_SECONDS = 10.0
+# 从未解析成功的主机解析失败后，在这段时间（秒）内直接返回同样的错误，不再重复解析
+_NEGATIVE_TTL_SECONDS = 10.0
+
+
+def system_resolver(host: str) -> tuple[list[AddrInfo], float | None]:
+    """使用系统解析器 (getaddrinfo)。getaddrinfo 不提供记录的 TTL，因此返回 None。"""
+    return socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM), None
+
+
+def _with_port(addresses: list[AddrInfo], port: int) -> list[AddrInfo]:
+    return [(family, socktype, proto, canonname, (sockaddr[0], port) + tuple(sockaddr[2:]))
+            for family, socktype, proto, canonname, sockaddr in addresses]
+
+
+class DnsCache:
+    """
+    线程安全的进程内 DNS 缓存，按主机名缓存，记录过期后重新解析。
+    解析器返回记录的 TTL 时按该 TTL 缓存，否则 (如系统解析器) 使用 default_ttl。
+    同一主机同时被多个线程解析时只解析一次；记录过期后重新解析失败时沿用旧的结果，
+    没有旧结果的主机解析失败后在 _NEGATIVE_TTL_SECONDS 秒内直接返回同样的错误。
+    """
+    def __init__(self, resolver: Resolver | None = None, default_ttl: float = 60.0, max_workers: int = 8):
+        self._resolver = resolver or system_resolver
+        self.default_ttl = default_ttl
+        self._max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[list[AddrInfo], float]] = {}   # 主机 -> (地址列表, 过期时间)
+        self._failures: dict[str, tuple[Exception, float]] = {}       # 主机 -> (解析错误, 过期时间)
+        self._inflight: dict[str, concurrent.futures.Future] = {}
+        self._executor = None
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "errors": 0, "negative_hits": 0}
+
+    def lookup(self, host: str, port: int) -> list[AddrInfo] | None:
+        """只查缓存，不发起解析；没有未过期的记录时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._stats["hits"] += 1
+        return _with_port(entry[0], port)
+
+    def resolve(self, host: str, port: int) -> list[AddrInfo]:
+        """返回主机的地址列表 (getaddrinfo 格式，端口为 port)，缓存未命中或已过期时解析。"""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is not None and entry[1] > time.monotonic():
+                self._stats["hits"] += 1
+                return _with_port(entry[0], port)
+            failure = self._failures.get(host) if entry is None else None
+            if failure is not None and failure[1] > time.monotonic():
+                self._stats["negative_hits"] += 1
+                error = failure[0]
+                raise type(error)(*error.args)
+            future = self._inflight.get(host)
+            owner = future is None
+            if owner:
+                future = self._inflight[host] = concurrent.futures.Future()
+        if not owner:
+            return _with_port(future.result(), port)
+
+        try:
+            addresses, ttl = self._resolver(host)
+            if not addresses:
+                raise OSError(f"无法解析主机: {host}")
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(host, None)
+                self._stats["errors"] += 1
+                if entry is not None:
+                    self._stats["stale"] += 1
+                    self._entries[host] = (entry[0], time.monotonic() + _STALE_RETRY_SECONDS)
+                else:
+                    self._failures[host] = (e, time.monotonic() + _NEGATIVE_TTL_SECONDS)
+            if entry is None:
+                future.set_exception(e)
+                raise
+            logger.warning(f"重新解析 {host} 失败，继续使用过期的记录: {e}")
+            future.set_result(entry[0])
+            return _with_port(entry[0], port)
+
+        expires = time.monotonic() + (self.default_ttl if ttl is None else max(0.0, ttl))
+        with self._lock:
+            self._entries[host] = (addresses, expires)
+            self._failures.pop(host, None)
+            self._inflight.pop(host, None)
+            self._stats["misses"] += 1
+        future.set_result(addresses)
+        return _with_port(addresses, port)
+
+    def prefetch(self, hosts: Iterable[str], wait: bool = False) -> int:
+        """
+        在后台线程中并发解析尚未缓存 (或已过期) 的主机。
+        :param wait: 是否等待全部解析完成。
+        :return: 发起解析的主机数。
+        """
+        with self._lock:
+            now = time.monotonic()
+            pending = [host for host in dict.fromkeys(hosts)
+                       if host and (host not in self._entries or self._entries[host][1] <= now)
+                       and not (host in self._failures and self._failures[host][1] > now)]
+            if pending and self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers,
+                                                                       thread_name_prefix='DnsPrefetch')
+        futures = {self._executor.submit(self.resolve, host, 0): host for host in pending}
+        if wait:
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    logger.warning(f"预解析 {futures[future]} 失败: {future.exception()}")
+        return len(futures)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
+
+    def stats(self) -> dict:
+        """返回命中/未命中等统计计数的快照。"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        return snapshot
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_dns_cache() -> DnsCache:
+    """获取全局共享的 DNS 缓存（首次调用时创建）。"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = DnsCache(default_ttl=config.DNS_CACHE_TTL)
+    return _default_cache
+
+
+def set_dns_cache(cache: DnsCache | None) -> DnsCache | None:
+    """
+    替换全局共享的 DNS 缓存（例如注入本地桩解析器进行测试），返回原来的缓存。
+    传入 None 时，下次使用时按当前配置重新创建。
+    """
+    global _default_cache
+    with _default_cache_lock:
+        previous, _default_cache = _default_cache, cache
+    return previous
+
+
+def resolve(host: str, port: int) -> list[AddrInfo]:
+    """解析主机地址：启用 DNS 缓存时经过缓存，否则直接调用 getaddrinfo。"""
+    if not config.DNS_CACHE_ENABLED:
+        return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    return get_dns_cache().resolve(host, port)
@@ -1,9 +1,24 @@
 import json
 import logging
 import base64
+import re
+from dataclasses import asdict
+
+from request_plan import RequestPlan, compile_request
 
 logger = logging.getLogger('CheckinTask')
 
+# 流式读取 HAR 文件时每次读取的字符数
+_READ_CHUNK_SIZE = 1 << 20
+# 需要忽略的静态资源后缀
+_STATIC_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.css', '.js', '.ico', '.woff', '.ttf')
+
+_WHITESPACE = re.compile(r'\s*')
+# 匹配 JSON 字符串内部（不含结束引号）尽可能长的合法前缀
+_STRING_BODY = re.compile(r'(?:[^"\\]++|\\.)*+', re.S)
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_SCALAR_END = re.compile(r'[,\]}\s]')
+
 def _parse_post_data(post_data_info):
     """辅助函数，用于解析 postData 字段。"""
     mime_type = post_data_info.get('mimeType', '')
@@ -32,61 +47,213 @@ def _parse_post_data(post_data_info):
         
     return text
 
-def parse_har(har_file_path: str) -> list[dict] | None:
+class _JsonStream:
     """
-    解析HAR文件，提取所有有效的HTTP请求条目。
-
-    :param har_file_path: HAR文件的路径。
-    :return: 包含请求信息字典的列表，如果解析失败或无有效请求则返回None。
+    一个极简的增量 JSON 扫描器。
+    只在缓冲区中保留尚未消费的内容（以及正在截取的值），从而可以逐个读取大数组中的元素，
+    并以较低的开销跳过不需要的值（如响应体、timings 等）。
     """
-    try:
-        with open(har_file_path, 'r', encoding='utf-8') as f:
-            har_data = json.load(f)
+    def __init__(self, f, chunk_size: int = _READ_CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._mark = None  # 正在截取的值的起始位置
 
-        requests_list = []
-        entries = har_data.get('log', {}).get('entries', [])
-        
-        for entry in entries:
-            request_info = entry.get('request')
-            if not request_info:
+    def _fill(self) -> None:
+        # 丢弃已消费的内容，只保留正在截取的部分
+        keep_from = self._pos if self._mark is None else self._mark
+        if keep_from:
+            self._buf = self._buf[keep_from:]
+            self._pos -= keep_from
+            if self._mark is not None:
+                self._mark = 0
+        data = self._f.read(self._chunk_size)
+        if not data:
+            raise json.JSONDecodeError("文件意外结束", self._buf, self._pos)
+        self._buf += data
+
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符（不消费）。"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            self._fill()
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"期望 '{char}'", self._buf, self._pos)
+        self._pos += 1
+
+    def _skip_string_body(self) -> None:
+        # 调用时 _pos 位于起始引号之后
+        while True:
+            self._pos = _STRING_BODY.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) and self._buf[self._pos] == '"':
+                self._pos += 1
+                return
+            self._fill()
+
+    def scan_value(self, capture: bool = False) -> str | None:
+        """
+        跳过下一个 JSON 值；capture 为 True 时返回该值的原始文本。
+        """
+        char = self.peek()
+        if capture:
+            self._mark = self._pos
+        if char == '"':
+            self._pos += 1
+            self._skip_string_body()
+        elif char in '{[':
+            depth = 0
+            while True:
+                match = _STRUCTURAL.search(self._buf, self._pos)
+                if not match:
+                    self._pos = len(self._buf)
+                    self._fill()
+                    continue
+                self._pos = match.end()
+                token = match.group()
+                if token == '"':
+                    self._skip_string_body()
+                elif token in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        break
+        else:
+            while True:
+                match = _SCALAR_END.search(self._buf, self._pos)
+                if match:
+                    self._pos = match.start()
+                    break
+                self._pos = len(self._buf)
+                self._fill()
+        if capture:
+            text = self._buf[self._mark:self._pos]
+            self._mark = None
+            return text
+        return None
+
+    def iter_object_keys(self):
+        """逐个产出对象的键，调用方需在下一次迭代前消费对应的值。"""
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise json.JSONDecodeError("期望对象键", self._buf, self._pos)
+            key = json.loads(self.scan_value(capture=True))
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self._pos += 1
                 continue
+            self.expect('}')
+            return
 
-            # 提取核心请求信息
-            method = request_info.get('method')
-            url = request_info.get('url')
-            # 过滤掉以 : 开头的伪头 (如 :method, :path 等，常见于 HTTP/2 HAR)
-            headers = {
-                header['name']: header['value']
-                for header in request_info.get('headers', [])
-                if not header['name'].startswith(':')
-            }
-
-            # 如果缺少方法或URL，则跳过此条目
-            if not method or not url:
+    def iter_array_items(self):
+        """逐个产出数组元素的位置，调用方需在下一次迭代前消费该元素。"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ',':
+                self._pos += 1
                 continue
+            self.expect(']')
+            return
 
-            # 忽略静态资源请求 (可选优化，防止请求图片/CSS等)
-            # 这里简单过滤常见静态资源后缀
-            path = url.split('?')[0].lower()
-            if path.endswith(('.png', '.jpg', '.jpeg', '.gif', '.css', '.js', '.ico', '.woff', '.ttf')):
+
+def _iter_request_infos(f):
+    """
+    从 HAR 文件流中依次产出每个 entry 的 request 对象，其余字段（响应、时序等）被直接跳过。
+    """
+    stream = _JsonStream(f)
+    for key in stream.iter_object_keys():
+        if key != 'log' or stream.peek() != '{':
+            stream.scan_value()
+            continue
+        for log_key in stream.iter_object_keys():
+            if log_key != 'entries' or stream.peek() != '[':
+                stream.scan_value()
                 continue
+            for _ in stream.iter_array_items():
+                if stream.peek() != '{':
+                    stream.scan_value()
+                    continue
+                request_info = None
+                for entry_key in stream.iter_object_keys():
+                    if entry_key == 'request':
+                        request_info = json.loads(stream.scan_value(capture=True))
+                    else:
+                        stream.scan_value()
+                if request_info:
+                    yield request_info
+
 
-            post_data = None
-            if request_info.get('postData'):
-                post_data = _parse_post_data(request_info['postData'])
-            
-            request_details = {
-                'method': method,
-                'url': url,
-                'headers': headers,
-                'post_data': post_data
-            }
-            requests_list.append(request_details)
+def _compile_entry(request_info: dict) -> RequestPlan | None:
+    """将 HAR 中的 request 对象编译为请求计划；无效条目或静态资源返回 None。"""
+    # 提取核心请求信息
+    method = request_info.get('method')
+    url = request_info.get('url')
+
+    # 如果缺少方法或URL，则跳过此条目
+    if not method or not url:
+        return None
+
+    # 忽略静态资源请求 (可选优化，防止请求图片/CSS等)
+    # 这里简单过滤常见静态资源后缀
+    path = url.split('?')[0].lower()
+    if path.endswith(_STATIC_SUFFIXES):
+        return None
+
+    # 过滤掉以 : 开头的伪头 (如 :method, :path 等，常见于 HTTP/2 HAR)
+    headers = {
+        header['name']: header['value']
+        for header in request_info.get('headers', [])
+        if not header['name'].startswith(':')
+    }
+
+    post_data = None
+    if request_info.get('postData'):
+        post_data = _parse_post_data(request_info['postData'])
+    
+    return compile_request(method, url, headers, post_data)
+
+
+def iter_har_requests(har_file_path: str):
+    """
+    流式解析HAR文件，逐个产出有效请求的 RequestPlan。
+    内存占用只取决于单个 entry 的 request 部分，适合数百 MB 的完整会话导出文件。
+    """
+    with open(har_file_path, 'r', encoding='utf-8') as f:
+        for request_info in _iter_request_infos(f):
+            plan = _compile_entry(request_info)
+            if plan:
+                yield plan
+
+
+def parse_har(har_file_path: str) -> list[RequestPlan] | None:
+    """
+    解析HAR文件，提取所有有效的HTTP请求条目并预编译为请求计划。
+
+    :param har_file_path: HAR文件的路径。
+    :return: RequestPlan 列表，如果解析失败或无有效请求则返回None。
+    """
+    try:
+        requests_list = list(iter_har_requests(har_file_path))
 
         if requests_list:
             logger.debug(f"成功从 '{har_file_path}' 解析出 {len(requests_list)} 个请求。")
             # 仅打印第一个请求作为示例，避免日志过长
-            logger.debug(f"第一个请求详情: {json.dumps(requests_list[0], indent=2, ensure_ascii=False, default=lambda o: '<bytes>' if isinstance(o, bytes) else str(o))}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"第一个请求详情: {json.dumps(asdict(requests_list[0]), indent=2, ensure_ascii=False, default=lambda o: '<bytes>' if isinstance(o, bytes) else str(o))}")
             return requests_list
         else:
             logger.error(f"在HAR文件 '{har_file_path}' 中未找到有效的请求条目。")
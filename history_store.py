@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+logger = logging.getLogger('CheckinTask')
+
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    finished_at  TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    duration     REAL NOT NULL,
+    task_count   INTEGER NOT NULL,
+    failed_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS task_results (
+    run_id   INTEGER NOT NULL REFERENCES runs(id),
+    name     TEXT NOT NULL,
+    success  INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    message  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_results_name ON task_results(name, run_id);
+-- 按任务滚动汇总，每次运行增量更新，报表无需扫描历史明细
+CREATE TABLE IF NOT EXISTS task_stats (
+    name            TEXT PRIMARY KEY,
+    runs            INTEGER NOT NULL,
+    successes       INTEGER NOT NULL,
+    total_duration  REAL NOT NULL,
+    current_streak  INTEGER NOT NULL,
+    last_success_at TEXT
+);
+"""
+
+# meta 表中维护的汇总计数及其默认值
+_SUMMARY_DEFAULTS = {
+    "successful_days": 0,
+    "current_streak": 0,
+    "longest_streak": 0,
+    "total_runs": 0,
+    "last_run_status": "",
+    "last_run_time": "",
+}
+# meta 表中记录最近一次计入累计签到天数的日期 (YYYY-MM-DD) 的键
+_LAST_SUCCESS_DATE = "last_success_date"
+
+
+class HistoryStore:
+    """
+    基于 SQLite (WAL 模式) 的运行历史记录。
+    每次运行及其中每个任务的结果都会写入明细表；累计签到天数、连续成功次数、
+    各任务成功率与平均耗时等汇总值在写入时增量维护，读取汇总的开销与历史长度无关。
+    首次打开时会从旧的 status.json 迁移累计数据。
+    """
+    def __init__(self, path: str, legacy_status_file: str | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 已能保证断电后数据库一致，只是可能丢失最后一次提交
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._initialize(legacy_status_file)
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def _initialize(self, legacy_status_file: str | None) -> None:
+        with self._transaction() as cur:
+            row = cur.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if row is not None:
+                return
+            summary = dict(_SUMMARY_DEFAULTS)
+            migrated = _read_legacy_status(legacy_status_file)
+            if migrated:
+                summary.update(migrated)
+                logger.info(f"已从 {legacy_status_file} 迁移历史数据: 累计签到 {summary['successful_days']} 天。")
+            summary["schema_version"] = _SCHEMA_VERSION
+            cur.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                            [(key, json.dumps(value, ensure_ascii=False)) for key, value in summary.items()])
+
+    def summary(self) -> dict:
+        """返回累计签到天数、连续成功次数、总运行次数与最近一次运行的状态。"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM meta").fetchall()
+        values = {key: json.loads(value) for key, value in rows}
+        return {key: values.get(key, default) for key, default in _SUMMARY_DEFAULTS.items()}
+
+    def task_stats(self) -> dict[str, dict]:
+        """返回各任务的历史运行次数、成功率、平均耗时与连续成功次数。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, runs, successes, total_duration, current_streak, last_success_at FROM task_stats"
+            ).fetchall()
+        return {
+            name: {
+                "runs": runs,
+                "success_rate": successes / runs if runs else 0.0,
+                "avg_duration": total_duration / runs if runs else 0.0,
+                "current_streak": streak,
+                "last_success_at": last_success_at,
+            }
+            for name, runs, successes, total_duration, streak, last_success_at in rows
+        }
+
+    def record_run(self, task_results: list[dict], total_duration: float, finished_at: str | None = None) -> dict:
+        """
+        在一个事务中记录一次运行，并增量更新汇总值。
+        所有任务均成功 (且至少有一个任务) 时，若当天 (finished_at 的本地日期) 尚未计入，累计签到天数与
+        连续成功次数各加一；常驻模式下一天内多次运行或手动触发的运行不会重复计数。
+        :return: 更新后的 summary()。
+        """
+        finished_at = finished_at or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        failed = sum(1 for r in task_results if not r['success'])
+        run_succeeded = bool(task_results) and not failed
+        status = "成功" if run_succeeded or not task_results else "失败"
+
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT INTO runs (finished_at, status, duration, task_count, failed_count) VALUES (?, ?, ?, ?, ?)",
+                (finished_at, status, total_duration, len(task_results), failed))
+            run_id = cur.lastrowid
+            cur.executemany(
+                "INSERT INTO task_results (run_id, name, success, duration, message) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, r['name'], int(r['success']), r['duration'], r['message']) for r in task_results])
+            cur.executemany(
+                """
+                INSERT INTO task_stats (name, runs, successes, total_duration, current_streak, last_success_at)
+                VALUES (:name, 1, :success, :duration, :success, CASE WHEN :success THEN :at END)
+                ON CONFLICT(name) DO UPDATE SET
+                    runs = runs + 1,
+                    successes = successes + :success,
+                    total_duration = total_duration + :duration,
+                    current_streak = CASE WHEN :success THEN current_streak + 1 ELSE 0 END,
+                    last_success_at = CASE WHEN :success THEN :at ELSE last_success_at END
+                """,
+                [{"name": r['name'], "success": int(r['success']), "duration": r['duration'], "at": finished_at}
+                 for r in task_results])
+
+            summary = {key: json.loads(value) for key, value in cur.execute("SELECT key, value FROM meta")}
+            if run_succeeded:
+                run_date = finished_at[:10]
+                new_day = summary.get(_LAST_SUCCESS_DATE) != run_date
+                if new_day:
+                    summary["successful_days"] += 1
+                    summary[_LAST_SUCCESS_DATE] = run_date
+                # 当天已计入时只在连续记录被失败打断后重新开始计数
+                if new_day or summary["current_streak"] == 0:
+                    summary["current_streak"] += 1
+                summary["longest_streak"] = max(summary["longest_streak"], summary["current_streak"])
+            elif task_results:
+                summary["current_streak"] = 0
+            summary["total_runs"] += 1
+            summary["last_run_status"] = status
+            summary["last_run_time"] = finished_at
+            cur.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                            [(key, json.dumps(summary[key], ensure_ascii=False))
+                             for key in (*_SUMMARY_DEFAULTS, _LAST_SUCCESS_DATE) if key in summary])
+
+        return {key: summary[key] for key in _SUMMARY_DEFAULTS}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    """在锁保护下执行 BEGIN IMMEDIATE ... COMMIT，异常时回滚。"""
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self) -> sqlite3.Cursor:
+        self._lock.acquire()
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn.cursor()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+
+
+def _read_legacy_status(path: str | None) -> dict | None:
+    """读取旧版 status.json 中的累计数据。"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            status = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"读取旧状态文件失败，跳过迁移: {e}")
+        return None
+    migrated = {
+        "successful_days": int(status.get('successful_days', 0) or 0),
+        "last_run_status": status.get('last_run_status', '') or '',
+        "last_run_time": status.get('last_run_time', '') or '',
+    }
+    # 旧版在每次成功运行时都会累加天数；最近一次运行成功时，它所在的日期已经计入，
+    # 记下该日期以免迁移后当天再次运行时重复计数 (时间无法解析时按今天处理)
+    if migrated["successful_days"] and migrated["last_run_status"] == "成功":
+        try:
+            run_date = time.strftime("%Y-%m-%d", time.strptime(migrated["last_run_time"][:10], "%Y-%m-%d"))
+        except ValueError:
+            run_date = time.strftime("%Y-%m-%d", time.localtime())
+        migrated[_LAST_SUCCESS_DATE] = run_date
+    return migrated
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HistoryStore:
+    """获取全局共享的历史记录 (首次调用时打开数据库)。"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore(config.HISTORY_DB, legacy_status_file=config.STATUS_FILE)
+    return _store
+
+
+def close_store() -> None:
+    """关闭全局共享的历史记录，下次使用时按当前的 HISTORY_DB 重新打开。"""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
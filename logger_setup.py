@@ -2,6 +2,9 @@ import logging
 import sys
 import re
 import os
+import queue
+import threading
+import time
 import config
 
 class ConsoleFilter(logging.Filter):
@@ -14,7 +17,7 @@ class ConsoleFilter(logging.Filter):
         if self.concise_mode:
             # 将多个模式合并为一个，用 | (或) 分隔
             self.allowed_pattern = re.compile(
-                r"^(日志系统初始化完成|--- \[线程结束\]|所有发送任务已完成|\*+|\*\*\* 成功签到|WxPusher)"
+                r"^(日志系统初始化完成|常驻模式|下一次运行|控制端点|--- \[(线程|协程)结束\]|所有发送任务已完成|\*+|\*\*\* 成功签到|WxPusher)"
             )
 
     def filter(self, record):
@@ -33,16 +36,118 @@ class ConsoleFilter(logging.Filter):
         # 其他所有消息在简洁模式下被过滤掉
         return False
 
-class FlushingFileHandler(logging.FileHandler):
+class BatchingFileHandler(logging.Handler):
     """
-    一个自定义的文件处理器，在每次写入日志后强制刷新缓冲区并同步到磁盘。
+    异步批量写入的文件处理器。
+    emit 只把日志记录放入队列，不阻塞调用线程；后台写入线程负责格式化、
+    合并写入，并按持久化策略调用 fsync:
+    - record: 每批写入后立即 fsync (写入线程取到的每条记录都会落盘后才处理下一批)
+    - interval: 距上次 fsync 超过 interval_ms 毫秒时 fsync (之后没有新记录时也会按时 fsync，最多丢失一个间隔内的记录)
+    - shutdown: 仅在关闭时 fsync
+    无论哪种策略，ERROR 及以上级别的记录写入后都会立即 fsync；
+    关闭时 (包括解释器退出时 logging.shutdown 触发的关闭) 会先写完队列中剩余的记录。
     """
+    _STOP = object()
+
+    def __init__(self, filename, mode='a', encoding=None, durability='interval',
+                 interval_ms=1000, batch_size=256):
+        super().__init__()
+        if durability not in ('record', 'interval', 'shutdown'):
+            raise ValueError(f"未知的日志持久化策略: {durability}")
+        self.baseFilename = os.path.abspath(filename)
+        self.durability = durability
+        self.interval = max(0, interval_ms) / 1000
+        self.batch_size = max(1, batch_size)
+        self.stream = open(self.baseFilename, mode, encoding=encoding)
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._writer.start()
+
     def emit(self, record):
-        super().emit(record)
-        self.flush()
-        # 强制将文件写入磁盘
-        if self.stream and hasattr(self.stream, 'fileno'):
+        if self._closed:
+            return
+        self._queue.put_nowait(record)
+
+    def flush(self):
+        """等待队列中已有的记录全部写入文件。"""
+        if not self._closed and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        with self.lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(self._STOP)
+        self._writer.join()
+        super().close()
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False   # 是否有已写入但尚未 fsync 的记录
+        while True:
+            # 等待第一条记录；interval 策略下有未 fsync 的记录时最多等到下一次 fsync 的时间，
+            # 之后即使没有新记录也要 fsync，否则一阵日志之后长时间空闲时这些记录会一直不落盘
+            timeout = None
+            if dirty and self.durability == 'interval':
+                timeout = max(0.0, last_sync + self.interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            batch = []
+            stop = False
+            while item is not None:
+                if item is self._STOP:
+                    stop = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            urgent = self._write_batch(batch)
+            dirty = dirty or bool(batch)
+            now = time.monotonic()
+            if dirty and (urgent or self.durability == 'record'
+                          or (self.durability == 'interval' and now - last_sync >= self.interval)):
+                self._sync()
+                last_sync = now
+                dirty = False
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._sync()
+                self.stream.close()
+                return
+
+    def _write_batch(self, batch) -> bool:
+        """写入一批记录，返回其中是否包含 ERROR 及以上级别的记录。"""
+        if not batch:
+            return False
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record) + '\n')
+            except Exception:
+                self.handleError(record)
+        try:
+            self.stream.write(''.join(lines))
+            self.stream.flush()
+        except Exception:
+            self.handleError(batch[0])
+        return any(record.levelno >= logging.ERROR for record in batch)
+
+    def _sync(self):
+        try:
             os.fsync(self.stream.fileno())
+        except (OSError, ValueError):
+            pass
 
 def setup_logger():
     """
@@ -53,9 +158,10 @@ def setup_logger():
     level = logging.DEBUG if config.DEBUG_MODE else logging.INFO
     logger.setLevel(level)
 
-    # 如果已经有处理器，则清空以重新配置，防止重复记录
-    if logger.hasHandlers():
-        logger.handlers.clear()
+    # 如果已经有处理器，则关闭并清空以重新配置，防止重复记录
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
 
     # 创建一个格式化器
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
@@ -74,8 +180,13 @@ def setup_logger():
     logger.addHandler(stream_handler)
 
     # --- 文件处理器 (不受简洁模式影响) ---
-    # 使用自定义的 FlushingFileHandler 来防止文件损坏
-    file_handler = FlushingFileHandler('task.log', 'w', encoding='utf-8')
+    # 日志由后台线程批量写入，按 config.LOG_DURABILITY 策略同步到磁盘
+    file_handler = BatchingFileHandler(
+        'task.log', 'w', encoding='utf-8',
+        durability=config.LOG_DURABILITY,
+        interval_ms=config.LOG_FSYNC_INTERVAL_MS,
+        batch_size=config.LOG_BATCH_SIZE,
+    )
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
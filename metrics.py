@@ -0,0 +1,237 @@
+import bisect
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger('CheckinTask')
+
+# 直方图的桶上界（秒），与 Prometheus 默认桶相近
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 每个请求记录的耗时阶段
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'body', 'total')
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    """单个请求各阶段的耗时（秒）与收发字节数。复用连接时 dns/connect/tls 为 0。"""
+    dns: float = 0.0
+    connect: float = 0.0
+    tls: float = 0.0
+    ttfb: float = 0.0
+    body: float = 0.0
+    total: float = 0.0
+    bytes_out: int = 0
+    # 线路上收到的字节数 (压缩后)，以及解压后的响应体字节数
+    bytes_in: int = 0
+    bytes_decoded: int = 0
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKETS) + 1)  # 最后一个为 +Inf 桶
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts: list[int], total: float, count: int) -> None:
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估算分位数（与 Prometheus 的 histogram_quantile 相同）。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = _BUCKETS[index - 1] if index > 0 else 0.0
+                if index >= len(_BUCKETS):
+                    return lower
+                upper = _BUCKETS[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return _BUCKETS[-1]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    线程安全的请求指标汇总。
+    各阶段耗时按任务与按主机分别汇总为直方图，请求数、重试数和收发字节数为计数器，
+    可导出为 Prometheus 文本格式。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (阶段, 标签名, 标签值) -> _Histogram，标签名为 'task' 或 'host'
+        self._histograms: dict[tuple[str, str, str], _Histogram] = {}
+        # (指标名, 标签元组) -> 数值
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+
+    def record_request(self, task: str, host: str, timings: RequestTimings, success: bool) -> None:
+        """记录一次请求的各阶段耗时与字节数。"""
+        with self._lock:
+            for phase in PHASES:
+                value = getattr(timings, phase)
+                if phase != 'total' and not value:
+                    # 复用连接时没有建连阶段，连接失败时没有响应阶段，均不计入直方图
+                    continue
+                for label, label_value in (('task', task), ('host', host)):
+                    histogram = self._histograms.get((phase, label, label_value))
+                    if histogram is None:
+                        histogram = self._histograms[(phase, label, label_value)] = _Histogram()
+                    histogram.observe(value)
+            outcome = 'success' if success else 'failure'
+            self._inc('checkin_requests_total', (('host', host), ('task', task), ('outcome', outcome)))
+            self._inc('checkin_bytes_sent_total', (('host', host),), timings.bytes_out)
+            self._inc('checkin_bytes_received_total', (('host', host),), timings.bytes_in)
+            self._inc('checkin_bytes_decoded_total', (('host', host),), timings.bytes_decoded)
+
+    def record_retry(self, task: str, host: str) -> None:
+        with self._lock:
+            self._inc('checkin_retries_total', (('host', host), ('task', task)))
+
+    def record_rate_limit_wait(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self._inc('checkin_rate_limit_wait_seconds_total', (('host', host),), seconds)
+
+    def _inc(self, name: str, labels: tuple, amount: float = 1) -> None:
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        """导出可序列化（可跨进程传递）的快照。"""
+        with self._lock:
+            return {
+                'histograms': {key: (h.counts[:], h.sum, h.count) for key, h in self._histograms.items()},
+                'counters': dict(self._counters),
+            }
+
+    def since(self, baseline: dict) -> 'MetricsRegistry':
+        """返回自 baseline (之前 snapshot() 的结果) 以来新增的指标，用于汇总单次运行。"""
+        current = self.snapshot()
+        delta = MetricsRegistry()
+        for key, (counts, total, count) in current['histograms'].items():
+            before = baseline['histograms'].get(key)
+            if before is not None:
+                counts = [a - b for a, b in zip(counts, before[0])]
+                total -= before[1]
+                count -= before[2]
+            if count:
+                histogram = delta._histograms[key] = _Histogram()
+                histogram.merge(counts, total, count)
+        for key, value in current['counters'].items():
+            value -= baseline['counters'].get(key, 0)
+            if value:
+                delta._counters[key] = value
+        return delta
+
+    def merge(self, snapshot: dict) -> None:
+        """合并其他进程导出的快照。"""
+        with self._lock:
+            for key, (counts, total, count) in snapshot['histograms'].items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = _Histogram()
+                histogram.merge(counts, total, count)
+            for key, value in snapshot['counters'].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def host_summary(self) -> list[dict]:
+        """按主机汇总请求总耗时的请求数、p50 与 p95（秒）。"""
+        with self._lock:
+            rows = [
+                {
+                    "host": label_value,
+                    "count": histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for (phase, label, label_value), histogram in self._histograms.items()
+                if phase == 'total' and label == 'host'
+            ]
+        return sorted(rows, key=lambda row: row["host"])
+
+    def render_prometheus(self) -> str:
+        """渲染为 Prometheus 文本格式。"""
+        lines = [
+            "# HELP checkin_request_phase_seconds Time spent in each phase of an HTTP request.",
+            "# TYPE checkin_request_phase_seconds histogram",
+        ]
+        with self._lock:
+            for (phase, label, label_value), histogram in sorted(self._histograms.items()):
+                base = f'phase="{phase}",{label}="{_escape(label_value)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(_BUCKETS + (float('inf'),), histogram.counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'checkin_request_phase_seconds_bucket{{{base},le="{le}"}} {cumulative}')
+                lines.append(f'checkin_request_phase_seconds_sum{{{base}}} {histogram.sum}')
+                lines.append(f'checkin_request_phase_seconds_count{{{base}}} {histogram.count}')
+
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str) -> None:
+        """原子地写入 Prometheus 文本文件 (可供 node_exporter textfile collector 读取)。"""
+        temp_file = path + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(temp_file, path)
+            logger.info(f"请求指标已写入: {path}")
+        except OSError as e:
+            logger.error(f"写入请求指标文件失败: {e}")
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> 'http.server.ThreadingHTTPServer':
+        """在后台线程中启动本地 /metrics 端点。"""
+        import http.server
+
+        registry = self
+
+        class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        logger.info(f"指标端点已启动: http://{host}:{server.server_port}/metrics")
+        return server
+
+
+# 全局共享的指标汇总
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """获取全局共享的指标汇总。"""
+    return _registry
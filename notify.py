@@ -1,10 +1,17 @@
+import atexit
 import http.client
 import json
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
+from urllib.parse import urlsplit
 
 import config
+from notify_dispatcher import create_dispatcher
+
+if TYPE_CHECKING:
+    from report import Report
 
 # 获取在 main.py 中配置的同一个 logger 实例
 logger = logging.getLogger('CheckinTask')
@@ -14,28 +21,73 @@ class NotifierBase(ABC):
     通知渠道的抽象基类。
     所有具体的通知方式（如 WxPusher, Telegram 等）都应继承此类。
     """
+    # 单条消息内容的最大字符数，None 表示不限制；超出时报告会被切分为多条发送
+    max_content_length: Optional[int] = None
+
+    # 渠道名称，用于发件箱中区分通知所属的渠道
+    name: str = ''
+
     @abstractmethod
-    def send(self, title: str, content: str, content_type: int = 2) -> None:
+    def send(self, title: str, content: str, content_type: int = 2) -> bool:
         """
-        发送通知。
+        发送通知。由后台分发线程调用，失败时会按退避时间重试。
         :param title: 标题
         :param content: 内容
         :param content_type: 内容类型 (1:文字, 2:HTML, 3:Markdown)
+        :return: 是否发送成功
         """
         pass
 
 class WxPusherNotifier(NotifierBase):
     """
-    WxPusher 通知实现。
+    WxPusher 通知实现。连接在多次发送之间复用。
     """
+    name = 'wxpusher'
+    max_content_length = 40000
+
     def __init__(self):
         self.app_token = config.WXPUSHER_APP_TOKEN
         self.uids = config.WXPUSHER_UIDS
-
-    def send(self, title: str, content: str, content_type: int = 2) -> None:
+        url = urlsplit(config.WXPUSHER_API_URL)
+        self._scheme = url.scheme
+        self._netloc = url.netloc
+        self._path = url.path or '/'
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            conn_class = http.client.HTTPSConnection if self._scheme == 'https' else http.client.HTTPConnection
+            self._conn = conn_class(self._netloc, timeout=config.NOTIFY_TIMEOUT)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _post(self, body: bytes) -> tuple[int, str]:
+        """发送请求并读取响应。复用的连接可能已被服务端关闭，此时重新连接一次。"""
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            conn = self._connection()
+            reused = conn.sock is not None
+            try:
+                conn.request("POST", self._path, body, headers)
+                response = conn.getresponse()
+                response_data = response.read().decode('utf-8')
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                self.close()
+            return response.status, response_data
+
+    def send(self, title: str, content: str, content_type: int = 2) -> bool:
         if not self.app_token or not self.uids:
             # 如果未配置，静默跳过（初始化时已检查，这里作为双重保险）
-            return
+            return True
 
         # 将逗号分隔的UID字符串转换为列表
         uid_list = [uid.strip() for uid in self.uids.split(',')]
@@ -50,41 +102,31 @@ class WxPusherNotifier(NotifierBase):
         
         body = json.dumps(payload).encode('utf-8')
 
-        conn = None
         try:
-            conn = http.client.HTTPConnection("wxpusher.zjiecode.com")
-            headers = {'Content-Type': 'application/json'}
-            conn.request("POST", "/api/send/message", body, headers)
-            
-            response = conn.getresponse()
-            response_data = response.read().decode('utf-8')
-            
-            if 200 <= response.status < 300:
+            status, response_data = self._post(body)
+            if 200 <= status < 300:
                 result = json.loads(response_data)
                 if result.get("code") == 1000:
                     logger.info("WxPusher 通知已成功发送。")
-                else:
-                    logger.error(f"WxPusher 通知发送失败: {result.get('msg', '未知错误')}")
+                    return True
+                logger.error(f"WxPusher 通知发送失败: {result.get('msg', '未知错误')}")
             else:
-                logger.error(f"WxPusher API 请求失败，状态码: {response.status}, 响应: {response_data}")
-
-        except (http.client.HTTPException, ConnectionError, TimeoutError) as e:
+                logger.error(f"WxPusher API 请求失败，状态码: {status}, 响应: {response_data}")
+        except (http.client.HTTPException, OSError) as e:
             logger.error(f"连接到 WxPusher API 时发生网络错误: {e}")
         except json.JSONDecodeError:
             logger.error("解析 WxPusher API 响应时出错。")
-        except Exception as e:
-            logger.error(f"发送通知时发生未知错误: {e}")
-        finally:
-            if conn:
-                conn.close()
+        return False
 
 class NotificationManager:
     """
-    通知管理器，负责管理和调用所有已启用的通知渠道。
+    通知管理器，负责管理所有已启用的通知渠道。
+    通知提交给后台分发器发送，调用方不会被慢速或不可达的推送服务阻塞。
     """
     def __init__(self):
         self.notifiers: List[NotifierBase] = []
         self._init_notifiers()
+        self._dispatcher = create_dispatcher({notifier.name: notifier for notifier in self.notifiers})
 
     def _init_notifiers(self):
         # 1. 初始化 WxPusher
@@ -97,6 +139,12 @@ class NotificationManager:
         # 未来可以在这里添加其他通知渠道的初始化逻辑
         # if config.TELEGRAM_BOT_TOKEN: ...
 
+    def start(self) -> None:
+        """启动后台分发线程，并重新发送上次运行遗留在发件箱中的通知。"""
+        if self.notifiers:
+            self._dispatcher.start()
+            atexit.register(self.close)
+
     def send_all(self, title: str, content: str, content_type: int = 2) -> None:
         """
         向所有已启用的渠道发送通知。
@@ -106,16 +154,87 @@ class NotificationManager:
             return
 
         for notifier in self.notifiers:
-            try:
-                notifier.send(title, content, content_type)
-            except Exception as e:
-                logger.error(f"通过 {notifier.__class__.__name__} 发送通知时出错: {e}")
+            self._dispatcher.submit(notifier.name, title, content, content_type)
+
+    def send_report(self, title: str, report: 'Report') -> None:
+        """
+        向所有已启用的渠道发送 HTML 报告，按各渠道的长度上限切分为编号的多条消息。
+        """
+        if not self.notifiers:
+            logger.warning("没有启用的通知渠道，无法发送通知。")
+            return
 
-# 全局单例实例
-_notification_manager = NotificationManager()
+        for notifier in self.notifiers:
+            chunks = report.chunks(notifier.max_content_length)
+            if len(chunks) > 1:
+                logger.info(f"报告超过 {notifier.__class__.__name__} 的长度上限，分 {len(chunks)} 条发送。")
+            for index, chunk in enumerate(chunks, 1):
+                chunk_title = title if len(chunks) == 1 else f"{title} ({index}/{len(chunks)})"
+                self._dispatcher.submit(notifier.name, chunk_title, chunk, content_type=2)
+
+    def flush(self, timeout: float) -> bool:
+        """等待已提交的通知发出，最多等待 timeout 秒。"""
+        return self._dispatcher.flush(timeout)
+
+    def close(self, wait: bool = False) -> None:
+        """
+        进程退出前在 NOTIFY_FLUSH_TIMEOUT 内发出剩余通知 (已调用过 flush 时只等待其剩余的时间)，然后关闭连接。
+        :param wait: 是否等待后台线程发完正在发送的通知后再返回，供新的分发器接管发件箱前调用。
+        """
+        self._dispatcher.close(config.NOTIFY_FLUSH_TIMEOUT)
+        if wait:
+            self._dispatcher.join(2 * config.NOTIFY_TIMEOUT)
+        for notifier in self.notifiers:
+            close = getattr(notifier, 'close', None)
+            if close:
+                close()
+
+# 全局单例实例（首次使用时创建，导入本模块不会读取配置或初始化通知渠道）
+_notification_manager: Optional[NotificationManager] = None
+_manager_lock = threading.Lock()
+
+def _get_manager() -> NotificationManager:
+    global _notification_manager
+    if _notification_manager is None:
+        with _manager_lock:
+            if _notification_manager is None:
+                _notification_manager = NotificationManager()
+    return _notification_manager
+
+def start_notifications() -> None:
+    """启动后台通知分发。"""
+    _get_manager().start()
+
+def reload_notifications() -> None:
+    """
+    按当前配置重新创建通知渠道与分发器，供常驻模式重新加载 .env 后调用。
+    原分发器停止后，其发件箱中尚未发出的通知由新的分发器继续发送。
+    """
+    global _notification_manager
+    with _manager_lock:
+        previous, _notification_manager = _notification_manager, None
+    if previous is None:
+        return
+    atexit.unregister(previous.close)
+    previous.close(wait=True)
+    start_notifications()
 
 def send_notification(title: str, content: str, content_type: int = 2) -> None:
     """
-    统一的对外接口，用于发送通知。
+    统一的对外接口，用于发送通知。通知写入发件箱后立即返回，由后台线程发送。
+    """
+    _get_manager().send_all(title, content, content_type)
+
+
+def send_report(title: str, report: 'Report') -> None:
+    """
+    发送 HTML 报告，超过渠道长度上限时自动切分。
+    """
+    _get_manager().send_report(title, report)
+
+
+def flush_notifications(timeout: float | None = None) -> bool:
+    """
+    等待已提交的通知发出，默认最多等待 NOTIFY_FLUSH_TIMEOUT 秒；未发出的通知留在发件箱中下次发送。
     """
-    _notification_manager.send_all(title, content, content_type)
+    return _get_manager().flush(config.NOTIFY_FLUSH_TIMEOUT if timeout is None else timeout)
@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import config
+from retry_policy import RetryPolicy
+
+if TYPE_CHECKING:
+    from notify import NotifierBase
+
+logger = logging.getLogger('CheckinTask')
+
+# 发件箱中超过该时长仍未发出的通知直接丢弃（秒）
+_OUTBOX_MAX_AGE = 3 * 24 * 3600
+# 合并多条通知时使用的分隔符，按内容类型区分 (1:文字, 2:HTML, 3:Markdown)
+# 可以合并发送的内容类型及合并时使用的分隔符 (1: 文本, 3: Markdown)。
+# HTML (2) 通知是完整的报告文档，拼接后会出现嵌套的 <html>/<body>，因此始终单独发送
+_SEPARATORS = {1: "\n\n----------\n\n", 3: "\n\n---\n\n"}
+
+
+class _Entry:
+    """发件箱中的一条待发送通知。"""
+    __slots__ = ('path', 'channel', 'title', 'content', 'content_type', 'created',
+                 'not_before', 'retry_at', 'attempts')
+
+    def __init__(self, path: str, channel: str, title: str, content: str, content_type: int, created: float,
+                 not_before: float = 0.0):
+        self.path = path
+        self.channel = channel
+        self.title = title
+        self.content = content
+        self.content_type = content_type
+        self.created = created
+        self.not_before = not_before    # 合并窗口结束时间 (monotonic)
+        self.retry_at = 0.0             # 退避结束时间 (monotonic)
+        self.attempts = 0
+
+
+class NotificationDispatcher:
+    """
+    后台通知分发器。
+    通知先写入磁盘发件箱 (每条一个 JSON 文件)，再由后台线程发送，发送成功后删除；
+    进程在发送前退出或多次重试仍失败的通知会保留在发件箱中，下次启动时继续发送。
+    同一渠道在合并窗口内提交的多条通知会合并为一条 (不超过渠道的长度上限)，失败时按指数退避重试。
+    """
+    def __init__(self, notifiers: dict[str, 'NotifierBase'], outbox_dir: str, merge_window: float = 2.0,
+                 retry: RetryPolicy | None = None):
+        self.notifiers = notifiers
+        self.outbox_dir = outbox_dir
+        self.merge_window = merge_window
+        self.retry = retry or RetryPolicy()
+        self._cond = threading.Condition()
+        self._pending: list[_Entry] = []
+        self._in_flight = 0
+        self._abandoned = 0     # 本次运行中放弃重试的通知数
+        self._flushing = False
+        self._flush_deadline = None     # 最近一次 flush 的截止时间 (monotonic)
+        self._stopped = False
+        self._thread = None
+        self._seq = 0
+
+    def start(self) -> None:
+        """加载发件箱中上次未发出的通知并启动后台线程（重复调用无副作用）。"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            os.makedirs(self.outbox_dir, exist_ok=True)
+            self._pending.extend(self._load_outbox())
+            if self._pending:
+                logger.info(f"发件箱中有 {len(self._pending)} 条未发送的通知，将重新发送。")
+            self._thread = threading.Thread(target=self._run, name='NotifyDispatcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, channel: str, title: str, content: str, content_type: int = 2) -> None:
+        """将通知写入发件箱，由后台线程发送。"""
+        self.start()
+        created = time.time()
+        with self._cond:
+            self._seq += 1
+            name = f"{channel}-{time.time_ns()}-{self._seq}.json"
+        path = os.path.join(self.outbox_dir, name)
+        entry = _Entry(path, channel, title, content, content_type, created,
+                       not_before=time.monotonic() + self.merge_window)
+        try:
+            _write_entry(entry)
+        except OSError as e:
+            # 发件箱不可写时仍在内存中发送，只是失去了持久化保证
+            logger.error(f"写入通知发件箱失败: {e}")
+            entry.path = None
+        with self._cond:
+            self._pending.append(entry)
+            self._cond.notify()
+
+    def flush(self, timeout: float) -> bool:
+        """
+        尽快发出所有待发送的通知 (不再等待合并窗口)，最多等待 timeout 秒。
+        :return: 是否已全部发出；超时或放弃重试的通知保留在发件箱中。
+        """
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_deadline = deadline
+            abandoned = self._abandoned
+            self._flushing = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._flushing = False
+            left = len(self._pending) + self._in_flight
+            abandoned = self._abandoned - abandoned
+        if left:
+            logger.warning(f"等待通知发送超时，{left} 条通知保留在发件箱中，下次运行时重新发送。")
+        return not left and not abandoned
+
+    def close(self, timeout: float) -> bool:
+        """
+        flush() 后停止后台线程，供进程退出时调用。
+        之前已调用过 flush() 时只使用其剩余的等待时间，避免退出时再等待一个完整的 timeout。
+        """
+        with self._cond:
+            deadline = self._flush_deadline
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        done = self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        return done
+
+    def join(self, timeout: float) -> None:
+        """close() 之后等待后台线程结束 (正在发送的一批通知发送完毕)，最多等待 timeout 秒。"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _load_outbox(self) -> list[_Entry]:
+        entries = []
+        now = time.time()
+        for name in sorted(os.listdir(self.outbox_dir)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.outbox_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                entry = _Entry(path, data['channel'], data['title'], data['content'],
+                               data.get('content_type', 2), data.get('created', now))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"跳过无法读取的发件箱文件 {name}: {e}")
+                continue
+            if entry.channel not in self.notifiers:
+                continue
+            if now - entry.created > _OUTBOX_MAX_AGE:
+                logger.warning(f"通知 '{entry.title}' 已过期，不再发送。")
+                _remove_entry(entry)
+                continue
+            entries.append(entry)
+        entries.sort(key=lambda e: e.created)
+        return entries
+
+    def _next_batch(self) -> list[_Entry] | None:
+        """
+        在锁内等待并取出下一批可以发送的通知 (同一渠道、同一内容类型，按提交顺序)。
+        返回 None 表示分发器已停止。
+        """
+        while True:
+            if self._stopped:
+                return None
+            now = time.monotonic()
+            wake_at = None
+            for entry in self._pending:
+                ready_at = entry.retry_at if self._flushing else max(entry.retry_at, entry.not_before)
+                if ready_at <= now:
+                    return self._take_batch(entry)
+                wake_at = ready_at if wake_at is None else min(wake_at, ready_at)
+            self._cond.wait(None if wake_at is None else wake_at - now)
+
+    def _take_batch(self, first: _Entry) -> list[_Entry]:
+        """从待发送列表中取出 first 及其后可以与之合并的通知。"""
+        limit = getattr(self.notifiers.get(first.channel), 'max_content_length', None)
+        separator = _SEPARATORS.get(first.content_type)
+        now = time.monotonic()
+        batch, size = [first], len(first.content)
+        for entry in self._pending if separator is not None else ():
+            if entry is first or entry.channel != first.channel or entry.content_type != first.content_type:
+                continue
+            if entry.retry_at > now:
+                continue
+            if limit and size + len(separator) + len(entry.content) > limit:
+                break
+            batch.append(entry)
+            size += len(separator) + len(entry.content)
+        for entry in batch:
+            self._pending.remove(entry)
+        self._in_flight += len(batch)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                sent = self._send_batch(batch)
+            except Exception as e:
+                logger.error(f"发送通知时出错: {e}")
+                sent = False
+            with self._cond:
+                self._in_flight -= len(batch)
+                if sent:
+                    for entry in batch:
+                        _remove_entry(entry)
+                else:
+                    self._reschedule(batch)
+                self._cond.notify_all()
+
+    def _send_batch(self, batch: list[_Entry]) -> bool:
+        first = batch[0]
+        notifier = self.notifiers[first.channel]
+        if len(batch) == 1:
+            return notifier.send(first.title, first.content, first.content_type)
+        logger.info(f"合并 {len(batch)} 条通知后发送。")
+        separator = _SEPARATORS[first.content_type]
+        content = separator.join(entry.content for entry in batch)
+        return notifier.send(f"{first.title} 等{len(batch)}条通知", content, first.content_type)
+
+    def _reschedule(self, batch: list[_Entry]) -> None:
+        """
+        发送失败的通知按退避时间重新排队 (同一批使用相同的重试时间，以便再次合并)，
+        超过最大尝试次数的留在发件箱中等待下次运行。
+        """
+        attempts = max(entry.attempts for entry in batch) + 1
+        retry_at = time.monotonic() + self.retry.backoff(attempts)
+        for entry in batch:
+            entry.attempts = attempts
+            if attempts >= self.retry.max_attempts:
+                logger.error(f"通知 '{entry.title}' 发送 {attempts} 次均失败，保留在发件箱中等待下次运行。")
+                self._abandoned += 1
+                continue
+            entry.retry_at = retry_at
+            self._pending.append(entry)
+        self._pending.sort(key=lambda e: e.created)
+
+
+def _write_entry(entry: _Entry) -> None:
+    """先写临时文件再重命名，避免留下不完整的发件箱文件。"""
+    data = {
+        "channel": entry.channel,
+        "title": entry.title,
+        "content": entry.content,
+        "content_type": entry.content_type,
+        "created": entry.created,
+    }
+    temp_path = entry.path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, entry.path)
+
+
+def _remove_entry(entry: _Entry) -> None:
+    if entry.path is None:
+        return
+    try:
+        os.remove(entry.path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除发件箱文件失败: {e}")
+
+
+def create_dispatcher(notifiers: dict[str, 'NotifierBase']) -> NotificationDispatcher:
+    """按 config 中的配置创建分发器。"""
+    retry = RetryPolicy(
+        max_attempts=config.NOTIFY_MAX_ATTEMPTS,
+        base_delay=config.NOTIFY_RETRY_BASE_DELAY,
+        max_delay=config.NOTIFY_RETRY_MAX_DELAY,
+    )
+    return NotificationDispatcher(notifiers, config.NOTIFY_OUTBOX_DIR, config.NOTIFY_MERGE_WINDOW, retry)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import sys
+import threading
+
+import config
+import blob_store
+from har_parser import parse_har
+from request_plan import RequestPlan
+
+logger = logging.getLogger('CheckinTask')
+
+# 缓存格式版本，请求计划的结构发生变化时需递增，旧缓存会自动失效
+_CACHE_VERSION = 5
+_CACHE_SUFFIX = '.plan'
+_HASH_CHUNK_SIZE = 1 << 20
+
+# 进程内的请求计划缓存: 绝对路径 -> (文件大小, 修改时间, 请求列表)。
+# 同一进程多次加载同一 HAR (多个任务共用、常驻模式的多次运行) 时无需再读磁盘缓存
+_memory: dict[str, tuple[int, int, list[RequestPlan]]] = {}
+_memory_lock = threading.Lock()
+# 每个 HAR 一把加载锁: 多个线程同时加载同一 HAR 时只解析一次，其余线程等待后直接使用结果
+_loading_locks: dict[str, threading.Lock] = {}
+
+
+def _cache_path(har_file_path: str) -> str:
+    """每个 HAR 文件对应一个缓存文件，文件名由其绝对路径的哈希决定。"""
+    key = hashlib.sha1(os.path.abspath(har_file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(config.PLAN_CACHE_DIR, key + _CACHE_SUFFIX)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _blobs_present(requests_list: list[RequestPlan]) -> bool:
+    return all(plan.body.exists() for plan in requests_list if isinstance(plan.body, blob_store.BlobRef))
+
+
+def _read_entry(cache_path: str) -> dict | None:
+    try:
+        with open(cache_path, 'rb') as f:
+            entry = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"读取请求计划缓存失败，将重新解析: {cache_path} - {e}")
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != _CACHE_VERSION:
+        return None
+    return entry
+
+
+def _write_entry(cache_path: str, entry: dict) -> None:
+    """
+    原子地写入缓存文件：先写临时文件，再重命名。临时文件名包含进程号与线程号，
+    多个线程或进程 (常驻模式的预热与运行、多进程模式的工作进程) 同时写入同一缓存时互不干扰。
+    """
+    temp_file = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_path)
+    except OSError as e:
+        logger.warning(f"写入请求计划缓存失败: {cache_path} - {e}")
+        if os.path.exists(temp_file):
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+
+def load_plan(har_file_path: str) -> list[RequestPlan] | None:
+    """
+    加载 HAR 文件对应的请求列表，优先使用进程内缓存，其次是磁盘缓存。
+    缓存以文件大小 + 修改时间快速校验；二者变化时再比对内容哈希，内容未变则只刷新元数据。
+    返回值与 parse_har 相同。
+    """
+    if not config.PLAN_CACHE_ENABLED:
+        return parse_har(har_file_path)
+
+    try:
+        stat = os.stat(har_file_path)
+    except OSError:
+        return parse_har(har_file_path)
+
+    key = os.path.abspath(har_file_path)
+    cached = _memory.get(key)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    with _memory_lock:
+        loading_lock = _loading_locks.setdefault(key, threading.Lock())
+    with loading_lock:
+        cached = _memory.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        requests_list = _load_plan_from_disk(har_file_path, stat)
+        if requests_list:
+            with _memory_lock:
+                _memory[key] = (stat.st_size, stat.st_mtime_ns, requests_list)
+    return requests_list
+
+
+def _load_plan_from_disk(har_file_path: str, stat: os.stat_result) -> list[RequestPlan] | None:
+    cache_path = _cache_path(har_file_path)
+    entry = _read_entry(cache_path)
+    if entry and not _blobs_present(entry['requests']):
+        # 请求体存储被清理过，缓存中的 BlobRef 已失效，需要重新解析
+        logger.debug(f"请求计划缓存引用的请求体已不存在，将重新解析: {har_file_path}")
+        entry = None
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        logger.debug(f"命中请求计划缓存: {har_file_path}")
+        return entry['requests']
+
+    digest = _hash_file(har_file_path)
+    if entry and entry['size'] == stat.st_size and entry['sha256'] == digest:
+        # 文件被 touch 过但内容未变，刷新元数据即可
+        entry['mtime_ns'] = stat.st_mtime_ns
+        _write_entry(cache_path, entry)
+        logger.debug(f"命中请求计划缓存 (内容未变): {har_file_path}")
+        return entry['requests']
+
+    requests_list = parse_har(har_file_path)
+    if requests_list:
+        _write_entry(cache_path, {
+            'version': _CACHE_VERSION,
+            'har_file': os.path.abspath(har_file_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'requests': requests_list,
+        })
+    return requests_list
+
+
+def clear_cache() -> int:
+    """删除所有请求计划缓存及请求体存储，返回删除的文件数。"""
+    with _memory_lock:
+        _memory.clear()
+    removed = blob_store.clear()
+    if not os.path.isdir(config.PLAN_CACHE_DIR):
+        return removed
+    removed += sum(1 for name in os.listdir(config.PLAN_CACHE_DIR) if name.endswith(_CACHE_SUFFIX))
+    shutil.rmtree(config.PLAN_CACHE_DIR, ignore_errors=True)
+    return removed
+
+
+def _task_har_files() -> list[str]:
+    """从 tasks.json 中收集所有任务引用的 HAR 文件路径（去重）。"""
+    try:
+        with open(config.TASKS_FILE, 'r', encoding='utf-8') as f:
+            tasks = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logger.error(f"无法读取任务配置文件 {config.TASKS_FILE}: {e}")
+        return []
+    paths = [os.path.join(config.BASE_DIR, task.get('har_file', '')) for task in tasks if task.get('har_file')]
+    return list(dict.fromkeys(paths))
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    请求计划缓存的命令行工具。
+        python plan_cache.py warm [HAR文件 ...]   预热缓存（默认为 tasks.json 中的所有 HAR）
+        python plan_cache.py clear               清空缓存
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="管理 HAR 请求计划缓存")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    warm_parser = subparsers.add_parser('warm', help="解析 HAR 文件并写入缓存")
+    warm_parser.add_argument('har_files', nargs='*', help="要预热的 HAR 文件，默认使用 tasks.json 中的全部")
+    subparsers.add_parser('clear', help="删除所有缓存文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'clear':
+        removed = clear_cache()
+        logger.info(f"已清空请求计划缓存，共删除 {removed} 个文件。")
+        return 0
+
+    har_files = args.har_files or _task_har_files()
+    failed = 0
+    for har_file in har_files:
+        requests_list = load_plan(har_file)
+        if requests_list:
+            logger.info(f"已缓存: {har_file} ({len(requests_list)} 个请求)")
+        else:
+            failed += 1
+    logger.info(f"预热完成: 成功 {len(har_files) - failed} 个, 失败 {failed} 个。")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
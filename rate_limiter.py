@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+
+import config
+from response_check import SendResult
+
+logger = logging.getLogger('CheckinTask')
+
+
+def _parse_host_limits(text: str) -> dict[str, tuple[float, int]]:
+    """解析 "api.example.com=2:5,example.org=10" 形式的按主机限速配置，值为 (每秒请求数, 突发数)。"""
+    limits = {}
+    for item in (text or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, spec = item.partition('=')
+        rate, _, burst = spec.partition(':')
+        try:
+            limits[host.strip().lower()] = (float(rate), int(burst) if burst else config.RATE_LIMIT_BURST)
+        except ValueError:
+            logger.error(f"无法解析主机限速配置: {item}")
+    return limits
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """解析 Retry-After 响应头 (秒数或 HTTP 日期)，返回需等待的秒数。"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    # email.utils 导入较慢，只在遇到日期格式时才导入
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """单个主机的令牌桶 (以 GCRA 形式实现：记录下一个令牌的理论到达时间)。"""
+    __slots__ = ('interval', 'tolerance', 'tat', 'paused_until')
+
+    def __init__(self, rate: float, burst: int):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = self.interval * (max(1, burst) - 1)
+        self.tat = 0.0
+        self.paused_until = 0.0
+
+
+class HostRateLimiter:
+    """
+    按主机共享的令牌桶限速器。所有任务的轮次、步骤、重试与重定向都经由 reserve() 取得发送时刻，
+    因此多个 HAR 指向同一主机时，合计速率也不会超过该主机的限额；空闲时可以连续突发 burst 个请求。
+    收到 429/503 时可按 Retry-After 暂停该主机的所有请求。
+    """
+    def __init__(self, default_rate: float = 0.0, default_burst: int = 5,
+                 host_limits: dict[str, tuple[float, int]] | None = None, max_pause: float = 60.0):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.host_limits = host_limits or {}
+        self.max_pause = max_pause
+        self._lock = threading.Lock()
+        self._buckets: dict[str, _Bucket] = {}
+
+    def _bucket(self, host: str) -> _Bucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            hostname = host.rsplit(':', 1)[0] if not host.endswith(']') else host
+            rate, burst = self.host_limits.get(host.lower()) or self.host_limits.get(hostname.lower()) or (
+                self.default_rate, self.default_burst)
+            bucket = self._buckets[host] = _Bucket(rate, burst)
+        return bucket
+
+    def reserve(self, host: str, max_wait: float | None = None) -> float | None:
+        """
+        为一次发往 host 的请求预约令牌，返回发送前需要等待的秒数 (0 表示可以立即发送)。
+        预约立即生效，调用方必须在等待后发送请求。
+        :param max_wait: 最多愿意等待的秒数；需要等待更久时不预约，返回 None。
+        """
+        if not self.default_rate and not self.host_limits and not self._buckets:
+            return 0.0
+        with self._lock:
+            bucket = self._bucket(host)
+            if not bucket.interval and not bucket.paused_until:
+                return 0.0
+            now = time.monotonic()
+            allowed_at = max(now, bucket.tat - bucket.tolerance, bucket.paused_until)
+            if max_wait is not None and allowed_at - now > max_wait:
+                return None
+            if bucket.interval:
+                bucket.tat = max(bucket.tat, allowed_at) + bucket.interval
+            return allowed_at - now
+
+    def pause(self, host: str, seconds: float) -> None:
+        """服务器要求稍后再试 (429/503 + Retry-After) 时，暂停该主机的所有请求。"""
+        seconds = min(max(0.0, seconds), self.max_pause)
+        if not seconds:
+            return
+        with self._lock:
+            bucket = self._bucket(host)
+            until = time.monotonic() + seconds
+            if until > bucket.paused_until:
+                bucket.paused_until = until
+                logger.warning(f"主机 {host} 要求限速，暂停请求 {seconds:.1f} 秒。")
+
+
+def deadline_result(host: str) -> SendResult:
+    """限速等待会超过运行截止时间、请求未发出时返回的失败结果。"""
+    logger.warning(f"主机 {host} 的限速等待将超过运行截止时间，不再发送请求。")
+    return SendResult(False, f"主机 {host} 的限速等待将超过运行截止时间", error='deadline')
+
+
+# 全局共享的限速器 (多进程模式下每个进程各自限速)
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """获取全局共享的限速器（首次调用时创建）。"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = HostRateLimiter(
+                    default_rate=config.RATE_LIMIT_PER_HOST,
+                    default_burst=config.RATE_LIMIT_BURST,
+                    host_limits=_parse_host_limits(config.RATE_LIMIT_HOSTS),
+                    max_pause=config.RATE_LIMIT_MAX_PAUSE,
+                )
+    return _limiter
+
+
+def set_rate_limiter(limiter: HostRateLimiter | None) -> HostRateLimiter | None:
+    """替换全局共享的限速器，返回原来的限速器。传入 None 时，下次使用时按当前配置重新创建。"""
+    global _limiter
+    with _limiter_lock:
+        previous, _limiter = _limiter, limiter
+    return previous
@@ -0,0 +1,203 @@
+import logging
+
+from task_runner import format_duration
+
+logger = logging.getLogger('CheckinTask')
+
+# 报告模板在导入时拼好，渲染时只做一次 format，不再逐行拼接整个文档
+_HEAD = (
+    '<html><head><style>'
+    'body{{font-family:-apple-system,BlinkMacSystemFont,"Segoe UI",Roboto,"Helvetica Neue",Arial,sans-serif;font-size:14px;color:#333}}'
+    '.summary{{margin-bottom:15px;padding:10px;background-color:#f8f9fa;border-radius:5px;border-left:5px solid {status_color}}}'
+    '.summary-item{{margin:5px 0}}'
+    'table{{width:100%;border-collapse:collapse;margin-top:10px}}'
+    'th,td{{padding:8px;text-align:left;border-bottom:1px solid #ddd}}'
+    'th{{background-color:#f2f2f2;font-weight:600}}'
+    '.status-icon{{font-size:16px}}'
+    '.success{{color:#28a745}}'
+    '.fail{{color:#dc3545;font-weight:bold}}'
+    '.duration{{color:#666;font-size:12px}}'
+    '.message{{font-size:13px}}'
+    '</style></head><body>'
+    '<div class="summary">'
+    '<div class="summary-item"><strong>运行状态:</strong> <span style="color:{status_color}">{status_text}</span></div>'
+    '<div class="summary-item"><strong>总耗时:</strong> {total_duration}</div>'
+    '<div class="summary-item">{summary_text}</div>'
+    '{part}'
+    '</div>'
+)
+_PART = '<div class="summary-item">第 {index}/{count} 部分</div>'
+_TAIL = '</body></html>'
+
+_TASK_TABLE_OPEN = (
+    '<table><thead><tr>'
+    '<th width="25%">任务</th>'
+    '<th width="15%" style="text-align:center">状态</th>'
+    '<th width="20%">耗时</th>'
+    '<th width="40%">备注</th>'
+    '</tr></thead><tbody>'
+)
+_TASK_ROW = (
+    '<tr><td>{name}</td>'
+    '<td style="text-align:center" class="status-icon">{icon}</td>'
+    '<td class="duration">{duration}{history}</td>'
+    '<td class="{msg_class} message">{message}</td></tr>'
+)
+_HISTORY = '<br>成功率 {rate:.0%} · 平均 {avg}'
+
+_HOST_TABLE_OPEN = (
+    '<table><thead><tr>'
+    '<th width="40%">主机</th>'
+    '<th width="20%">请求数</th>'
+    '<th width="20%">p50</th>'
+    '<th width="20%">p95</th>'
+    '</tr></thead><tbody>'
+)
+_HOST_ROW = (
+    '<tr><td>{host}</td><td>{count}</td>'
+    '<td class="duration">{p50:.0f}ms</td><td class="duration">{p95:.0f}ms</td></tr>'
+)
+_TABLE_CLOSE = '</tbody></table>'
+
+
+class Report:
+    """
+    渲染完成的报告：头部、若干表格 (每个表格是一组行) 与尾部。
+    render() 输出完整文档；chunks() 按长度上限在行边界切分为多份，每份都是完整的 HTML 文档。
+    """
+    def __init__(self, head_fields: dict, tables: list[tuple[str, list[str]]]):
+        self._head_fields = head_fields
+        self._tables = [(opening, rows) for opening, rows in tables if rows]
+
+    def _head(self, index: int = 1, count: int = 1) -> str:
+        part = _PART.format(index=index, count=count) if count > 1 else ''
+        return _HEAD.format(part=part, **self._head_fields)
+
+    def render(self) -> str:
+        """输出完整报告。"""
+        buffer = [self._head()]
+        for opening, rows in self._tables:
+            buffer.append(opening)
+            buffer.extend(rows)
+            buffer.append(_TABLE_CLOSE)
+        buffer.append(_TAIL)
+        return ''.join(buffer)
+
+    def chunks(self, max_length: int | None) -> list[str]:
+        """
+        按 max_length (字符数) 切分报告；未设置上限或整份报告未超限时只返回一份。
+        切分只发生在行之间，单行本身超过上限时单独成为一份。
+        """
+        full = self.render()
+        if not max_length or len(full) <= max_length:
+            return [full]
+
+        # 先按行分组，头部长度按最长的 "第 N/N 部分" 预留
+        reserve = len(self._head(999, 999)) + len(_TAIL)
+        groups = []         # 每份: [(opening, [rows])]
+        current, size = [], reserve
+        for opening, rows in self._tables:
+            table_rows = None
+            for row in rows:
+                extra = len(row) + (0 if table_rows is not None else len(opening) + len(_TABLE_CLOSE))
+                if current and size + extra > max_length:
+                    groups.append(current)
+                    current, size, table_rows = [], reserve, None
+                    extra = len(row) + len(opening) + len(_TABLE_CLOSE)
+                if table_rows is None:
+                    table_rows = []
+                    current.append((opening, table_rows))
+                table_rows.append(row)
+                size += extra
+        if current:
+            groups.append(current)
+
+        count = len(groups)
+        result = []
+        for index, group in enumerate(groups, 1):
+            buffer = [self._head(index, count)]
+            for opening, rows in group:
+                buffer.append(opening)
+                buffer.extend(rows)
+                buffer.append(_TABLE_CLOSE)
+            buffer.append(_TAIL)
+            result.append(''.join(buffer))
+        return result
+
+
+class _MessageFormatter:
+    """按消息文本缓存模板替换结果，相同的消息只替换一次。"""
+    def __init__(self, context: dict):
+        self._context = context
+        self._cache = {}
+
+    def __call__(self, message: str) -> str:
+        if '{' not in message or '}' not in message:
+            return message
+        formatted = self._cache.get(message)
+        if formatted is None:
+            try:
+                formatted = message.format(**self._context)
+            except Exception:
+                # 消息中的 {} 不是合法占位符时保持原样
+                formatted = message
+            self._cache[message] = formatted
+        return formatted
+
+
+def render_report(task_results: list[dict], total_duration: float, summary_text: str, context: dict,
+                  task_stats: dict | None = None, host_rows: list[dict] | None = None,
+                  compact: bool = False) -> Report:
+    """
+    渲染任务报告。
+    :param summary_text: 顶部汇总信息。
+    :param context: 任务消息中 {变量} 的替换值。
+    :param task_stats: 各任务的历史统计，用于显示成功率与平均耗时。
+    :param host_rows: 按主机汇总的请求耗时。
+    :param compact: 紧凑模式，成功的任务合并为一行计数，只逐行列出失败的任务。
+    """
+    task_stats = task_stats or {}
+    fail_count = sum(1 for r in task_results if not r['success'])
+    format_message = _MessageFormatter(context)
+
+    task_rows = []
+    success_count, success_duration = 0, 0.0
+    for res in task_results:
+        if compact and res['success']:
+            success_count += 1
+            success_duration += res['duration']
+            continue
+        stats = task_stats.get(res['name'])
+        history = ''
+        if stats and stats['runs'] > 1:
+            history = _HISTORY.format(rate=stats['success_rate'], avg=format_duration(stats['avg_duration']))
+        task_rows.append(_TASK_ROW.format(
+            name=res['name'],
+            icon="✅" if res['success'] else "❌",
+            duration=format_duration(res['duration']),
+            history=history,
+            msg_class="success" if res['success'] else "fail",
+            message=format_message(res['message']),
+        ))
+    if success_count:
+        task_rows.insert(0, _TASK_ROW.format(
+            name=f"{success_count} 个任务",
+            icon="✅",
+            duration=f"合计 {format_duration(success_duration)}",
+            history=f"<br>平均 {format_duration(success_duration / success_count)}",
+            msg_class="success",
+            message="全部成功",
+        ))
+
+    host_table = [
+        _HOST_ROW.format(host=row['host'], count=row['count'], p50=row['p50'] * 1000, p95=row['p95'] * 1000)
+        for row in host_rows or ()
+    ]
+
+    head_fields = {
+        "status_color": "#28a745" if fail_count == 0 else "#dc3545",
+        "status_text": "全部成功" if fail_count == 0 else f"{fail_count}个任务失败",
+        "total_duration": format_duration(total_duration),
+        "summary_text": summary_text,
+    }
+    return Report(head_fields, [(_TASK_TABLE_OPEN, task_rows), (_HOST_TABLE_OPEN, host_table)])
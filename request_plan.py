@@ -0,0 +1,119 @@
+from dataclasses import dataclass, replace
+from urllib.parse import urlsplit
+
+from blob_store import BlobRef, store_body
+
+# 这些请求头由发送端根据实际请求体及支持的压缩格式重新计算，不沿用 HAR 中记录的值
+_RECOMPUTED_HEADERS = ('content-length', 'transfer-encoding', 'accept-encoding')
+# 没有请求体时仍需显式发送 Content-Length: 0 的方法 (与 http.client 的行为一致)
+_METHODS_EXPECTING_BODY = ('PATCH', 'POST', 'PUT')
+
+
+@dataclass(frozen=True, slots=True)
+class RequestPlan:
+    """
+    预编译的不可变请求计划。
+    URL 已拆分、请求体已编码为 bytes、请求头已整理为有序元组，
+    发送时只需合并 Cookie 并写出字节，多轮次/多线程之间可安全共享。
+    """
+    method: str
+    url: str
+    scheme: str
+    host: str
+    port: int | None
+    netloc: str
+    path: str
+    # 有序请求头 (不含 Cookie)，Content-Length 已按 body 修正
+    headers: tuple[tuple[str, str], ...]
+    # HAR 中记录的静态 Cookie 头，以及拆分后的 (名称, "名称=值") 元组，便于与会话 Cookie 合并
+    cookie: str
+    cookie_pairs: tuple[tuple[str, str], ...]
+    # 较大的请求体保存在请求体存储中，这里只是 BlobRef
+    body: bytes | BlobRef | None
+    # 请求头中已包含 Host 时，http.client 不再自动添加
+    skip_host: bool
+
+    def redirect_to(self, url: str) -> 'RequestPlan':
+        """生成重定向后的 GET 请求计划（不带请求体）。"""
+        parts = urlsplit(url)
+        headers = tuple((name, value) for name, value in self.headers
+                        if name.lower() not in _RECOMPUTED_HEADERS and name.lower() != 'host')
+        return replace(
+            self,
+            method='GET',
+            url=url,
+            scheme=parts.scheme,
+            host=parts.hostname,
+            port=parts.port,
+            netloc=parts.netloc,
+            path=_request_path(parts),
+            headers=headers,
+            body=None,
+            skip_host=False,
+        )
+
+
+def _request_path(parts) -> str:
+    return (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+
+def _split_cookie(cookie: str) -> tuple[tuple[str, str], ...]:
+    pairs = []
+    for item in cookie.split(';'):
+        item = item.strip()
+        if item:
+            pairs.append((item.split('=', 1)[0].strip(), item))
+    return tuple(pairs)
+
+
+def _encode_body(post_data, content_type: str) -> bytes | None:
+    if not post_data:
+        return None
+    # 如果 post_data 是字符串并且 header 表明是 JSON，则编码为 bytes
+    if isinstance(post_data, str) and 'application/json' in content_type:
+        return post_data.encode('utf-8')
+    if isinstance(post_data, bytes):
+        return post_data
+    # 对于其他情况，例如表单数据，这里我们假设它是字符串
+    return str(post_data).encode('utf-8')
+
+
+def compile_request(method: str, url: str, headers: dict, post_data) -> RequestPlan:
+    """
+    将 HAR 中解析出的请求信息编译为 RequestPlan。
+    :param headers: 原始请求头字典。
+    :param post_data: _parse_post_data 的返回值 (str 或 bytes)。
+    """
+    method = method.upper()
+    parts = urlsplit(url)
+    content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), '')
+    body = store_body(_encode_body(post_data, content_type))
+
+    cookie = ''
+    ordered_headers = []
+    for name, value in headers.items():
+        lower_name = name.lower()
+        if lower_name == 'cookie':
+            cookie = value
+        elif lower_name not in _RECOMPUTED_HEADERS:
+            ordered_headers.append((name, value))
+    if body is not None:
+        ordered_headers.append(('Content-Length', str(len(body))))
+    elif method in _METHODS_EXPECTING_BODY:
+        ordered_headers.append(('Content-Length', '0'))
+
+    header_names = {name.lower() for name, _ in ordered_headers}
+    return RequestPlan(
+        method=method,
+        url=url,
+        scheme=parts.scheme,
+        host=parts.hostname,
+        port=parts.port,
+        netloc=parts.netloc,
+        path=_request_path(parts),
+        headers=tuple(ordered_headers),
+        cookie=cookie,
+        cookie_pairs=_split_cookie(cookie),
+        body=body,
+        skip_host='host' in header_names,
+    )
@@ -1,136 +1,197 @@
 import time
 import logging
-import json
 import http.client
-from urllib.parse import urlparse
+
+import config
+from connection_pool import get_pool
+from cookie_jar import CookieJar
+from metrics import RequestTimings, get_registry
+from rate_limiter import deadline_result, get_rate_limiter, parse_retry_after
+from content_encoding import BodyDecoder, DecodeError, accept_encoding
+from blob_store import as_buffer
+from request_plan import RequestPlan
+from response_check import DEFAULT_CHECK, SendResult, SuccessCheck, ResponseValidator
 
 logger = logging.getLogger('CheckinTask')
 
-def _merge_cookies(existing_cookies: str, new_set_cookie_headers: list[str]) -> str:
+# 复用的 keep-alive 连接可能已被服务器关闭，此时在新连接上重发一次
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+# 流式读取响应体时每次读取的字节数
+_READ_CHUNK_SIZE = 16 * 1024
+
+def _write_request(conn: http.client.HTTPConnection, plan: RequestPlan, cookie: str) -> None:
+    """按预编译的请求计划写出请求行、请求头和请求体。"""
+    conn.putrequest(plan.method, plan.path, skip_host=plan.skip_host, skip_accept_encoding=True)
+    conn.putheader('Accept-Encoding', accept_encoding())
+    for name, value in plan.headers:
+        conn.putheader(name, value)
+    if cookie:
+        conn.putheader('Cookie', cookie)
+    # 大请求体是内存映射上的 memoryview，http.client 直接写出而不复制
+    conn.endheaders(as_buffer(plan.body))
+
+def _request_size(plan: RequestPlan, cookie: str) -> int:
+    """估算请求在线路上的字节数（请求行 + 请求头 + 请求体）。"""
+    size = len(plan.method) + len(plan.path) + 12 + len(accept_encoding()) + 19
+    size += sum(len(name) + len(value) + 4 for name, value in plan.headers)
+    if cookie:
+        size += len(cookie) + 10
+    return size + 2 + (len(plan.body) if plan.body else 0)
+
+def _request_on_pool(pool, plan: RequestPlan, cookie: str, timings: RequestTimings):
     """
-    合并 Cookie 字符串。
-    :param existing_cookies: 现有的 Cookie 字符串 (key=value; key2=value2)
-    :param new_set_cookie_headers: 响应头中的 Set-Cookie 列表
-    :return: 合并后的 Cookie 字符串
+    从连接池借出连接并发送请求，返回 (响应对象, 连接对象)。
+    建连 (DNS/TCP/TLS) 与首字节等待的耗时记录到 timings 中。
     """
-    cookies = {}
-    
-    # 解析现有的 Cookie
-    if existing_cookies:
-        for item in existing_cookies.split(';'):
-            if '=' in item:
-                key, value = item.strip().split('=', 1)
-                cookies[key] = value
-    
-    # 解析 Set-Cookie 并覆盖/添加
-    for header in new_set_cookie_headers:
-        # Set-Cookie 格式通常是: key=value; Path=/; HttpOnly
-        # 我们只需要第一部分 key=value
-        parts = header.split(';')
-        if parts and '=' in parts[0]:
-            key, value = parts[0].strip().split('=', 1)
-            cookies[key] = value
-            
-    # 重新组合
-    return "; ".join([f"{k}={v}" for k, v in cookies.items()])
-
-def send_request(request_details: dict, session_cookies: str = "") -> tuple[bool, str, str]:
+    while True:
+        conn, reused = pool.acquire(plan.scheme, plan.host, plan.port)
+        try:
+            _write_request(conn, plan, cookie)
+            written = time.perf_counter()
+            resp = conn.getresponse()
+            timings.ttfb = time.perf_counter() - written
+            # 新建的连接会在 phase_timings 中留下建连各阶段耗时，取走后清空
+            connect_timings, conn.phase_timings = conn.phase_timings, None
+            if connect_timings:
+                timings.dns = connect_timings.get('dns', 0.0)
+                timings.connect = connect_timings.get('connect', 0.0)
+                timings.tls = connect_timings.get('tls', 0.0)
+            return resp, conn
+        except _STALE_CONNECTION_ERRORS:
+            pool.discard(conn)
+            if not reused:
+                raise
+            logger.debug(f"复用的连接已失效，使用新连接重试: {plan.netloc}")
+        except BaseException:
+            pool.discard(conn)
+            raise
+
+def _read_body(resp: http.client.HTTPResponse, decoder: BodyDecoder, validator: ResponseValidator) -> bool:
+    """
+    分块读取响应体，解压后交给校验器，结论确定或超过大小上限时提前停止。
+    :return: 响应体是否已完整读取（未完整读取的连接不能复用）。
     """
-    根据提供的请求详情发送HTTP请求，支持 Cookie 保持和简单的重定向。
+    while True:
+        chunk = resp.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            decoder.finish(validator.feed)
+            return True
+        if decoder.feed(chunk, validator.feed):
+            return resp.isclosed()
 
-    :param request_details: 包含'method', 'url', 'headers', 'post_data'的字典。
-    :param session_cookies: 上一次请求返回的 Cookie 字符串，用于维持会话。
-    :return: (bool, str, str) 元组。
-             (是否成功, 消息/响应内容, 新的Cookie字符串)
+def send_request(plan: RequestPlan, cookie_jar: CookieJar | None = None, task_name: str = '',
+                 check: SuccessCheck = DEFAULT_CHECK, max_wait: float | None = None) -> SendResult:
     """
-    method = request_details['method'].upper()
-    url = request_details['url']
-    headers = request_details['headers'].copy() # 复制一份以免修改原字典
-    post_data = request_details['post_data']
-
-    # 如果有会话 Cookie，合并到请求头中
-    if session_cookies:
-        current_cookie = headers.get('Cookie', '')
-        if current_cookie:
-            # 如果请求头里本来就有 Cookie，则追加
-            headers['Cookie'] = current_cookie + "; " + session_cookies
-        else:
-            headers['Cookie'] = session_cookies
-
-    parsed_url = urlparse(url)
-    host = parsed_url.netloc
-    path = parsed_url.path + ('?' + parsed_url.query if parsed_url.query else '')
-    
-    # 确定连接类型 (HTTP vs HTTPS)
-    connection_class = http.client.HTTPSConnection if parsed_url.scheme == 'https' else http.client.HTTPConnection
-    
-    body = None
-    if post_data:
-        # 如果 post_data 是字符串并且 header 表明是 JSON，则编码为 bytes
-        if isinstance(post_data, str) and 'application/json' in headers.get('Content-Type', ''):
-            body = post_data.encode('utf-8')
-        elif isinstance(post_data, bytes):
-            body = post_data
-        else:
-            # 对于其他情况，例如表单数据，需要更复杂的处理，这里我们假设它是字符串
-            body = str(post_data).encode('utf-8')
+    根据预编译的请求计划发送HTTP请求，支持 Cookie 保持和简单的重定向。
+    每个请求的各阶段耗时与收发字节数都会记录到全局指标中。
+    响应体按块流式读取，最多读取 config.RESPONSE_MAX_BYTES 字节，并按 check 增量判定是否成功。
+
+    :param plan: 由 parse_har 生成的 RequestPlan。
+    :param cookie_jar: 会话 Cookie 容器，响应中的 Set-Cookie 会原地更新到其中。
+    :param task_name: 所属任务名称，用于按任务汇总指标。
+    :param check: 成功判定条件，默认只要求 2xx 状态码。
+    :param max_wait: 限速等待的上限（秒，通常为距运行截止时间的剩余时间）；需要等待更久时不发送，
+                     返回 error 为 'deadline' 的失败结果。
+    :return: SendResult，包含是否成功、消息、状态码与失败类别 (供重试策略区分)。
+    """
+    method = plan.method
+    url = plan.url
+
+    if cookie_jar is None:
+        cookie_jar = CookieJar()
+    # 合并 HAR 中记录的静态 Cookie 与适用于本次请求的会话 Cookie
+    cookie = cookie_jar.header_for(plan)
 
+    # 按主机限速：等待轮到本请求的发送时刻
+    limiter = get_rate_limiter()
+    wait = limiter.reserve(plan.netloc, max_wait)
+    if wait is None:
+        return deadline_result(plan.netloc)
+    if wait > 0:
+        get_registry().record_rate_limit_wait(plan.netloc, wait)
+        time.sleep(wait)
+
+    pool = get_pool()
     conn = None
+    reusable = False
+    success = False
+    timings = RequestTimings(bytes_out=_request_size(plan, cookie))
+    start = time.perf_counter()
     try:
         logger.debug(f"准备发送请求: {method} {url}")
-        # logger.debug(f"请求头: {json.dumps(headers, indent=2)}") # 调试时可开启，注意脱敏
+        # logger.debug(f"请求头: {json.dumps(dict(plan.headers), indent=2)}") # 调试时可开启，注意脱敏
         
-        conn = connection_class(host)
-        conn.request(method, path, body=body, headers=headers)
-        resp = conn.getresponse()
+        resp, conn = _request_on_pool(pool, plan, cookie, timings)
 
         logger.debug(f"收到响应: 状态码 {resp.status}")
         
         # 处理 Set-Cookie
         # http.client 的 getheader 只返回最后一个同名头，getheaders 返回所有
         set_cookie_headers = [v for k, v in resp.getheaders() if k.lower() == 'set-cookie']
-        new_cookies = _merge_cookies(session_cookies, set_cookie_headers)
+        cookie_jar.update_from_response(set_cookie_headers, plan)
 
-        response_body = resp.read()
+        body_start = time.perf_counter()
+        validator = check.validator(resp.status, config.RESPONSE_MAX_BYTES)
+        decoder = BodyDecoder(resp.getheader('Content-Encoding'))
+        try:
+            complete = _read_body(resp, decoder, validator)
+        finally:
+            timings.body = time.perf_counter() - body_start
+            timings.bytes_decoded = decoder.decoded_bytes
+        timings.bytes_in = decoder.wire_bytes + sum(len(k) + len(v) + 4 for k, v in resp.getheaders())
+        # 响应已完整读取，且服务器未要求关闭时，连接可归还连接池复用
+        reusable = complete and not resp.will_close
         
         # 处理重定向 (301, 302, 303, 307, 308)
         if resp.status in (301, 302, 303, 307, 308):
             redirect_url = resp.getheader('Location')
             if redirect_url:
                 logger.info(f"检测到重定向 ({resp.status}) -> {redirect_url}")
-                # 递归调用，传递更新后的 Cookie
+                # 递归调用，沿用同一个 Cookie 容器
                 # 注意：这里简单处理，如果是相对路径需要拼接，这里假设是完整URL或简单路径
                 if not redirect_url.startswith('http'):
                     # 简单拼接
-                    redirect_url = f"{parsed_url.scheme}://{parsed_url.netloc}{redirect_url}"
+                    redirect_url = f"{plan.scheme}://{plan.netloc}{redirect_url}"
                 
-                new_details = request_details.copy()
-                new_details['url'] = redirect_url
-                new_details['method'] = 'GET' # 大多数重定向转为 GET
-                new_details['post_data'] = None # 重定向通常不带 Body
+                # 大多数重定向转为 GET，且通常不带 Body
+                new_plan = plan.redirect_to(redirect_url)
+
+                # 先归还当前连接，避免在主机连接数达到上限时自我阻塞
+                pool.release(conn, reusable)
+                conn = None
+                success = True
                 
-                return send_request(new_details, new_cookies)
+                return send_request(new_plan, cookie_jar, task_name, check)
+
+        if resp.status in (429, 503):
+            retry_after = parse_retry_after(resp.getheader('Retry-After'))
+            if retry_after is not None:
+                limiter.pause(plan.netloc, retry_after)
 
-        if 200 <= resp.status < 300:
+        result = validator.result()
+        success = result.success
+        if success:
             logger.info(f"请求成功: {method} {url} - 状态码: {resp.status}")
-            try:
-                response_json = json.loads(response_body)
-                # logger.debug(f"响应内容 (JSON): \n{json.dumps(response_json, indent=2, ensure_ascii=False)}")
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                pass
-                # logger.debug(f"响应内容 (原始): {response_body.decode('utf-8', errors='ignore')}")
-            return True, "OK", new_cookies
         else:
-            logger.warning(f"请求失败: {method} {url} - 状态码: {resp.status}")
-            logger.warning(f"响应内容: {response_body.decode('utf-8', errors='ignore')}")
-            return False, f"状态码: {resp.status}", new_cookies
+            logger.warning(f"请求失败: {method} {url} - 状态码: {resp.status} - {result.message}")
+            logger.warning(f"响应内容: {validator.preview_text()}")
+        return result
 
-    except (http.client.HTTPException, ConnectionError, TimeoutError) as e:
+    except TimeoutError as e:
+        logger.error(f"发送请求时发生网络错误: {method} {url} - 错误: 请求超时 {e}")
+        return SendResult(False, f"网络错误: 请求超时 {e}", error='timeout')
+    except (http.client.HTTPException, OSError) as e:
+        # OSError 涵盖连接被拒绝/重置、DNS 解析失败与 TLS 错误
         logger.error(f"发送请求时发生网络错误: {method} {url} - 错误: {e}")
-        return False, f"网络错误: {e}", session_cookies
+        return SendResult(False, f"网络错误: {e}", error='network')
+    except DecodeError as e:
+        logger.error(f"处理响应时出错: {method} {url} - 错误: {e}")
+        return SendResult(False, str(e), error='decode')
     except Exception as e:
         logger.error(f"发送请求时发生未知错误: {method} {url} - 错误: {e}", exc_info=True)
-        return False, f"未知错误: {e}", session_cookies
+        return SendResult(False, f"未知错误: {e}", error='unknown')
     finally:
         if conn:
-            conn.close()
+            pool.release(conn, reusable)
+        timings.total = time.perf_counter() - start
+        get_registry().record_request(task_name, plan.netloc, timings, success)
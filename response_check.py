@@ -0,0 +1,207 @@
+import json
+import re
+from typing import NamedTuple
+
+# 状态码范围写法，如 "2xx"
+_STATUS_CLASS = re.compile(r'^([1-5])xx$', re.I)
+# 请求失败时日志中最多记录的响应体字节数
+_PREVIEW_BYTES = 2048
+
+
+class SendResult(NamedTuple):
+    """
+    一次请求 (含其重定向) 的结果。
+    error 为失败类别: timeout / network / status / check / decode / circuit / deadline / unknown，成功时为空。
+    """
+    success: bool
+    message: str
+    status: int | None = None
+    error: str = ''
+
+
+def _parse_statuses(value) -> tuple[tuple[int, int], ...]:
+    """将 200 / "2xx" / [200, 201] 等写法解析为闭区间元组。"""
+    items = value if isinstance(value, list) else [value]
+    ranges = []
+    for item in items:
+        if isinstance(item, int):
+            ranges.append((item, item))
+            continue
+        match = _STATUS_CLASS.match(str(item).strip())
+        if match:
+            base = int(match.group(1)) * 100
+            ranges.append((base, base + 99))
+        elif str(item).strip().isdigit():
+            ranges.append((int(item), int(item)))
+        else:
+            raise ValueError(f"无法识别的状态码条件: {item!r}")
+    return tuple(ranges)
+
+
+def _split_path(path: str) -> tuple[str | int, ...]:
+    """将 "data.list.0.status" 拆分为键/下标序列。"""
+    return tuple(int(part) if part.isdigit() else part for part in path.split('.'))
+
+
+def _lookup(document, path: tuple[str | int, ...]):
+    """按路径取值，路径不存在时抛出 LookupError。"""
+    value = document
+    for part in path:
+        if isinstance(part, int) and isinstance(value, list):
+            value = value[part]
+        elif isinstance(value, dict):
+            value = value[str(part)]
+        else:
+            raise KeyError(part)
+    return value
+
+
+class SuccessCheck:
+    """
+    由任务配置中 success_check 编译而成的成功判定条件，不可变，可在线程/协程间共享。
+    未配置时等价于 {"status": "2xx"}，与原先只看状态码的行为一致。
+
+    配置示例:
+        "success_check": {
+            "status": [200, 201],             # 允许的状态码，也可写 "2xx"
+            "json": {"code": 0, "data.ok": true},  # JSON 字段 (点号分隔路径) 需等于给定值
+            "contains": "签到成功",            # 响应体需包含的文本 (字符串或列表)
+            "steps": [2]                       # 只对这些步骤生效 (从 1 开始)，默认全部步骤
+        }
+    """
+    __slots__ = ('statuses', 'json_fields', 'needles', 'steps')
+
+    def __init__(self, spec: dict | None = None):
+        spec = spec or {}
+        if not isinstance(spec, dict):
+            raise ValueError("success_check 必须是对象")
+        unknown = set(spec) - {'status', 'json', 'contains', 'steps'}
+        if unknown:
+            raise ValueError(f"success_check 中存在未知字段: {', '.join(sorted(unknown))}")
+
+        self.statuses = _parse_statuses(spec.get('status', '2xx'))
+
+        json_fields = spec.get('json') or {}
+        if not isinstance(json_fields, dict):
+            raise ValueError("success_check.json 必须是对象")
+        self.json_fields = tuple((path, _split_path(path), expected) for path, expected in json_fields.items())
+
+        contains = spec.get('contains') or []
+        if isinstance(contains, str):
+            contains = [contains]
+        if not isinstance(contains, list) or not all(isinstance(text, str) for text in contains):
+            raise ValueError("success_check.contains 必须是字符串或字符串列表")
+        self.needles = tuple(text.encode('utf-8') for text in contains if text)
+
+        steps = spec.get('steps')
+        if steps is not None and (not isinstance(steps, list) or not all(
+                isinstance(step, int) and not isinstance(step, bool) and step >= 1 for step in steps)):
+            raise ValueError("success_check.steps 必须是步骤序号 (从 1 开始的整数) 的列表")
+        self.steps = frozenset(steps) if steps else None
+
+    @classmethod
+    def from_task(cls, task_config: dict) -> 'SuccessCheck':
+        return cls(task_config.get('success_check'))
+
+    def applies_to(self, step_num: int) -> bool:
+        """该条件是否作用于第 step_num 个步骤 (从 1 开始)。"""
+        return self.steps is None or step_num in self.steps
+
+    def status_ok(self, status: int) -> bool:
+        return any(low <= status <= high for low, high in self.statuses)
+
+    def validator(self, status: int, max_bytes: int) -> 'ResponseValidator':
+        """为一个响应创建增量校验器。"""
+        return ResponseValidator(self, status, max_bytes)
+
+
+# 未配置 success_check 时使用的默认条件
+DEFAULT_CHECK = SuccessCheck()
+
+
+class ResponseValidator:
+    """
+    对单个响应体做增量校验。响应体按块喂入 feed()，一旦结论已确定（或超过大小上限）
+    即返回 True 提示调用方停止读取，整个过程最多只在内存中保留 max_bytes 字节。
+    """
+    __slots__ = ('check', 'status', 'max_bytes', 'received', 'truncated', 'preview',
+                 '_pending', '_tail', '_body')
+
+    def __init__(self, check: SuccessCheck, status: int, max_bytes: int):
+        self.check = check
+        self.status = status
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.truncated = False
+        self.preview = b''
+        self._pending = list(check.needles)
+        self._tail = b''
+        # 只有需要校验 JSON 字段时才缓存完整响应体
+        self._body = [] if check.json_fields else None
+
+    def feed(self, chunk: bytes) -> bool:
+        """喂入一块响应体，返回 True 表示结论已确定、无需继续读取。"""
+        self.received += len(chunk)
+        if len(self.preview) < _PREVIEW_BYTES:
+            self.preview += chunk[:_PREVIEW_BYTES - len(self.preview)]
+
+        if not self.check.status_ok(self.status):
+            # 状态码已判定失败，只需读取用于日志的片段
+            return len(self.preview) >= _PREVIEW_BYTES
+
+        if self._pending:
+            window = self._tail + chunk
+            self._pending = [needle for needle in self._pending if needle not in window]
+            longest = max((len(needle) for needle in self._pending), default=1)
+            self._tail = window[-(longest - 1):] if longest > 1 else b''
+
+        if self._body is not None:
+            self._body.append(chunk)
+        elif not self._pending and self.check.needles:
+            # 只有文本条件且已全部满足，提前结束
+            return True
+
+        if self.received >= self.max_bytes:
+            self.truncated = True
+            return True
+        return False
+
+    def result(self) -> SendResult:
+        """
+        返回最终判定。应在响应体读完或 feed() 返回 True 后调用。
+        """
+        if not self.check.status_ok(self.status):
+            return SendResult(False, f"状态码: {self.status}", self.status, 'status')
+        reason = self._check_body()
+        if reason:
+            return SendResult(False, reason, self.status, 'check')
+        return SendResult(True, "OK", self.status)
+
+    def _check_body(self) -> str:
+        """校验响应体，返回失败原因；全部满足时返回空字符串。"""
+        if self._pending:
+            missing = self._pending[0].decode('utf-8', errors='replace')
+            suffix = f" (仅读取了前 {self.received} 字节)" if self.truncated else ""
+            return f"响应中未包含 '{missing}'{suffix}"
+        if self._body is not None:
+            if self.truncated:
+                return f"响应体超过 {self.max_bytes} 字节上限，无法校验 JSON 字段"
+            try:
+                document = json.loads(b''.join(self._body))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return "响应不是合法的 JSON"
+            for path, parts, expected in self.check.json_fields:
+                try:
+                    actual = _lookup(document, parts)
+                except (LookupError, TypeError):
+                    return f"响应 JSON 中缺少字段 '{path}'"
+                if actual != expected:
+                    return f"响应 JSON 字段 '{path}' 为 {actual!r}，期望 {expected!r}"
+        return ""
+
+    def preview_text(self) -> str:
+        """用于日志的响应体片段。"""
+        text = self.preview.decode('utf-8', errors='ignore')
+        if self.received > len(self.preview):
+            text += f"...(共读取 {self.received} 字节，已截断)"
+        return text
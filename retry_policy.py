@@ -0,0 +1,201 @@
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import config
+from response_check import SendResult
+
+logger = logging.getLogger('CheckinTask')
+
+# 默认会重试的状态码: 请求超时、过早请求、限流以及服务端临时故障
+_DEFAULT_RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+# 视为网络层故障的失败类别，会重试并计入熔断
+_TRANSIENT_ERRORS = ('timeout', 'network')
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    """
+    单个任务的重试策略，由任务配置中的 retry 字段编译而成，未配置的项取 config 中的默认值。
+
+    配置示例:
+        "retry": {
+            "max_attempts": 5,          # 最多尝试次数 (含首次)
+            "base_delay": 0.5,          # 退避基数（秒），第 n 次重试最多等待 base_delay * 2^(n-1)
+            "max_delay": 10,            # 单次等待上限（秒）
+            "retry_statuses": [429, 503],  # 会重试的状态码
+            "retry_check_failures": false  # success_check 判定失败时是否重试
+        }
+    """
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    retry_statuses: frozenset = frozenset(_DEFAULT_RETRY_STATUSES)
+    retry_check_failures: bool = False
+
+    @classmethod
+    def from_task(cls, task_config: dict) -> 'RetryPolicy':
+        spec = task_config.get('retry') or {}
+        if not isinstance(spec, dict):
+            raise ValueError("retry 必须是对象")
+        unknown = set(spec) - {'max_attempts', 'base_delay', 'max_delay', 'retry_statuses', 'retry_check_failures'}
+        if unknown:
+            raise ValueError(f"retry 中存在未知字段: {', '.join(sorted(unknown))}")
+        retry_check_failures = spec.get('retry_check_failures', False)
+        if not isinstance(retry_check_failures, bool):
+            raise ValueError(f"retry 配置无效: retry_check_failures 必须是 true 或 false: {retry_check_failures!r}")
+        try:
+            policy = cls(
+                max_attempts=int(spec.get('max_attempts', config.RETRY_MAX_ATTEMPTS)),
+                base_delay=float(spec.get('base_delay', config.RETRY_BASE_DELAY)),
+                max_delay=float(spec.get('max_delay', config.RETRY_MAX_DELAY)),
+                retry_statuses=frozenset(int(s) for s in spec.get('retry_statuses', _DEFAULT_RETRY_STATUSES)),
+                retry_check_failures=retry_check_failures,
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"retry 配置无效: {e}") from None
+        if policy.max_attempts < 1 or policy.base_delay < 0 or policy.max_delay < 0:
+            raise ValueError("retry 中的次数必须大于 0，等待时间不能为负数")
+        return policy
+
+    def is_retryable(self, result: SendResult) -> bool:
+        """判断失败是否值得重试。4xx 等确定性失败重试也不会成功，直接放弃。"""
+        if result.error in _TRANSIENT_ERRORS:
+            return True
+        if result.error == 'status':
+            return result.status in self.retry_statuses
+        if result.error == 'check':
+            return self.retry_check_failures
+        return False
+
+    def backoff(self, retry_num: int) -> float:
+        """第 retry_num 次重试 (从 1 开始) 前的等待时间：指数退避 + 全抖动。"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (retry_num - 1)))
+        return random.uniform(0, ceiling)
+
+
+class RetryBudget:
+    """
+    所有任务共享的重试预算。每个新请求存入 ratio 个令牌，每次重试取走一个，令牌数不超过 capacity。
+    上游大面积故障时，重试总量因此被限制在请求量的固定比例 (加上初始的 capacity 次) 以内，
+    不会让所有工作线程同时成倍放大对故障主机的压力。
+    """
+    def __init__(self, ratio: float = 0.2, capacity: int = 20):
+        self.ratio = max(0.0, ratio)
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.capacity)
+
+    def withdraw(self) -> bool:
+        """尝试为一次重试取走令牌，预算耗尽时返回 False。"""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    按主机的熔断器。连续 failure_threshold 次网络故障或可重试状态码 (5xx/429 等) 后进入打开状态，
+    reset_timeout 秒内对该主机的请求直接失败；之后放行一个探测请求 (半开)，成功则关闭，失败则重新打开。
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = {}     # host -> 连续失败次数
+        self._opened_at = {}    # host -> 打开时间 (monotonic)
+        self._probing = set()   # 半开状态下已放行探测请求的主机
+
+    def allow(self, host: str) -> bool:
+        """是否允许向该主机发送请求。"""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.reset_timeout or host in self._probing:
+                return False
+            self._probing.add(host)
+            return True
+
+    def record(self, host: str, result: SendResult, policy: RetryPolicy) -> None:
+        """根据请求结果更新主机状态。业务判定失败与 4xx 说明主机可用，不计入熔断。"""
+        unhealthy = result.error in _TRANSIENT_ERRORS or (
+            result.error == 'status' and result.status in policy.retry_statuses)
+        with self._lock:
+            self._probing.discard(host)
+            if result.error == 'deadline':
+                # 请求因运行截止时间未发出，不能说明主机状态
+                return
+            if not unhealthy:
+                self._failures.pop(host, None)
+                if self._opened_at.pop(host, None) is not None:
+                    logger.info(f"主机 {host} 已恢复，熔断关闭。")
+                return
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold:
+                if host not in self._opened_at:
+                    logger.warning(f"主机 {host} 连续失败 {failures} 次，熔断 {self.reset_timeout:g} 秒。")
+                self._opened_at[host] = time.monotonic()
+
+
+# 调用方未传入策略时使用的默认值。任务的策略总是由 RetryPolicy.from_task 按 config 编译，
+# 这里不读取配置，以免导入本模块时就加载配置
+DEFAULT_POLICY = RetryPolicy()
+
+# 全局共享的重试预算与熔断器，供所有任务线程/协程使用（首次调用时创建）
+_budget = None
+_breaker = None
+_shared_lock = threading.Lock()
+
+
+def get_retry_budget() -> RetryBudget:
+    global _budget
+    if _budget is None:
+        with _shared_lock:
+            if _budget is None:
+                _budget = RetryBudget(config.RETRY_BUDGET_RATIO, config.RETRY_BUDGET_CAPACITY)
+    return _budget
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        with _shared_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS)
+    return _breaker
+
+
+def reset_shared_state() -> None:
+    """丢弃全局共享的重试预算与熔断器 (包括各主机的熔断状态)，下次使用时按当前配置重新创建。"""
+    global _budget, _breaker
+    with _shared_lock:
+        _budget = _breaker = None
+
+
+def circuit_open_result(host: str) -> SendResult:
+    """熔断打开时直接返回的失败结果。"""
+    return SendResult(False, f"主机 {host} 熔断中，暂停请求", error='circuit')
+
+
+def next_retry_delay(policy: RetryPolicy, attempt: int, result: SendResult) -> float | None:
+    """
+    综合失败类别、剩余次数与全局重试预算，决定是否重试。
+    :param attempt: 刚结束的尝试序号 (从 0 开始)。
+    :return: 重试前需等待的秒数；不应重试时返回 None。
+    """
+    if attempt + 1 >= policy.max_attempts or not policy.is_retryable(result):
+        return None
+    if not get_retry_budget().withdraw():
+        logger.warning("重试预算已耗尽，放弃重试。")
+        return None
+    return policy.backoff(attempt + 1)
@@ -0,0 +1,97 @@
+import ast
+import logging
+
+logger = logging.getLogger('CheckinTask')
+
+# 表达式中允许的语法节点: 常量、变量、算术/比较/逻辑运算、条件表达式与白名单函数调用
+_ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Load,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.UnaryOp, ast.UAdd, ast.USub, ast.Not,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.IfExp, ast.Call,
+)
+
+
+def format_minutes_to_str(minutes: int) -> str:
+    """将分钟数格式化为 'X小时Y分钟' 或 'Y分钟'。"""
+    if minutes < 60:
+        return f"{minutes}分钟"
+    hours, mins = divmod(minutes, 60)
+    if mins == 0:
+        return f"{hours}小时"
+    return f"{hours}小时{mins}分钟"
+
+
+# 规则中可以调用的函数
+FUNCTIONS = {
+    "format_minutes": format_minutes_to_str,
+    "min": min,
+    "max": max,
+    "abs": abs,
+    "round": round,
+    "int": int,
+}
+# 规则中可以使用的统计变量，由 RewardRules.evaluate 提供
+VARIABLES = ('days', 'streak', 'longest_streak', 'total_runs')
+
+
+def _validate(tree: ast.Expression, known_names: set[str]) -> None:
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"不允许的语法: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in known_names:
+            raise ValueError(f"未知变量: {node.id}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise ValueError("只能调用 " + ", ".join(FUNCTIONS))
+            if node.keywords:
+                raise ValueError("函数调用不支持关键字参数")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str, bool)):
+            raise ValueError(f"不支持的常量: {node.value!r}")
+
+
+class RewardRules:
+    """
+    预编译的奖励规则。
+    每条规则在创建时解析为 AST 并按白名单校验 (只允许算术、比较、条件表达式与少数函数)，
+    然后编译为代码对象；之后每次计算只需执行已编译的代码。规则可以引用排在它前面的规则结果。
+    同一组统计值的计算结果会被缓存，一次运行中多次调用不会重复计算。
+    """
+    def __init__(self, rules: dict[str, str]):
+        self._compiled = []
+        known_names = set(VARIABLES) | set(FUNCTIONS)
+        for key, expression in rules.items():
+            try:
+                tree = ast.parse(str(expression), mode='eval')
+                _validate(tree, known_names)
+                code = compile(tree, f'<reward:{key}>', 'eval')
+            except (SyntaxError, ValueError) as e:
+                logger.error(f"奖励规则 '{key}' 无效: {e}")
+                code = None
+            self._compiled.append((key, code))
+            known_names.add(key)
+        self._cache_key = None
+        self._cache_value = None
+
+    def evaluate(self, days: int, streak: int = 0, longest_streak: int = 0, total_runs: int = 0) -> dict:
+        """按统计值计算所有奖励，返回 {规则名: 结果}。计算失败的规则结果为 0。"""
+        cache_key = (days, streak, longest_streak, total_runs)
+        if cache_key == self._cache_key:
+            return dict(self._cache_value)
+
+        context = dict(FUNCTIONS, days=days, streak=streak, longest_streak=longest_streak, total_runs=total_runs)
+        rewards = {}
+        for key, code in self._compiled:
+            value = 0
+            if code is not None:
+                try:
+                    value = eval(code, {"__builtins__": {}}, context)
+                except Exception as e:
+                    logger.error(f"计算奖励规则 '{key}' 失败: {e}")
+            rewards[key] = value
+            context[key] = value
+
+        self._cache_key, self._cache_value = cache_key, rewards
+        return dict(rewards)
@@ -0,0 +1,179 @@
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from request_plan import RequestPlan
+from response_check import SuccessCheck
+from retry_policy import RetryPolicy
+from task_runner import (run_round, build_task_result, build_cancelled_result, task_concurrency,
+                         deadline_passed, time_left, DEADLINE_DETAIL)
+
+logger = logging.getLogger('CheckinTask')
+
+
+class _TaskState:
+    """调度器中单个任务的运行状态。"""
+    __slots__ = ('name', 'requests_list', 'count', 'interval', 'success_msg', 'fail_msg',
+                 'success_check', 'retry_policy', 'concurrency', 'next_round', 'in_flight', 'scheduled',
+                 'last_start', 'completed', 'timed_out', 'failure', 'cancel', 'start_time', 'future')
+
+    def __init__(self, task_config: dict, requests_list: list[RequestPlan]):
+        self.name = task_config.get('name', '未命名任务')
+        self.requests_list = requests_list
+        self.count = task_config.get('count', 1)
+        self.interval = task_config.get('interval_seconds', 0)
+        self.success_msg = task_config.get('success_msg', '任务完成')
+        self.fail_msg = task_config.get('fail_msg', '任务失败')
+        self.success_check = SuccessCheck.from_task(task_config)
+        self.retry_policy = RetryPolicy.from_task(task_config)
+        self.concurrency = task_concurrency(task_config)
+        self.next_round = 0         # 下一个要开始的轮次
+        self.in_flight = 0          # 正在执行的轮次数
+        self.scheduled = False      # 堆中是否已有该任务待开始的轮次
+        self.last_start = 0.0
+        self.completed = 0          # 成功完成的轮数
+        self.timed_out = False      # 是否因到达运行截止时间而停止开始新的轮次
+        self.failure = None         # 第一个失败轮次的说明 (或异常)
+        self.cancel = threading.Event()
+        self.start_time = time.time()
+        self.future = concurrent.futures.Future()
+
+
+class RoundScheduler:
+    """
+    基于最小堆的轮次调度器。
+    每个任务被拆分为以"轮"为单位的工作项：一轮执行完毕后，由调度线程在
+    interval_seconds 到期时再把下一轮交给工作线程池。等待间隔期间不占用任何工作线程，
+    因此少量工作线程即可服务任意数量的任务。
+    同一任务的轮次默认按顺序执行；配置了 concurrency 时最多同时进行 concurrency 轮，
+    相邻两轮的开始时间至少间隔 interval_seconds，任意一轮失败后不再开始新的轮次。
+    设置了运行截止时间时，到期后不再开始新的轮次，等待中的任务在截止时间到达时立即结束。
+    """
+    def __init__(self, max_workers: int = 4):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                                               thread_name_prefix='round-worker')
+        self._heap = []  # (到期时间, 序号, _TaskState)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._timer_thread = threading.Thread(target=self._timer_loop, name='round-scheduler', daemon=True)
+        self._timer_thread.start()
+
+    def submit(self, task_config: dict, requests_list: list[RequestPlan]) -> concurrent.futures.Future:
+        """
+        提交一个任务，立即安排其第一轮执行。
+        :return: 任务结束时以结果字典完成的 Future (格式与 run_task 相同)。
+        """
+        state = _TaskState(task_config, requests_list)
+        logger.info(f"--- [线程开始] 任务: {state.name} ---")
+        if state.count <= 0:
+            state.future.set_result(build_task_result(state.name, True, state.success_msg, state.start_time))
+            return state.future
+        self._schedule(state, time.monotonic())
+        return state.future
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止调度线程并关闭工作线程池。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if wait:
+            self._timer_thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def _schedule(self, state: _TaskState, due: float) -> None:
+        remaining = time_left()
+        if remaining is not None:
+            due = min(due, time.monotonic() + max(0.0, remaining))
+        with self._cond:
+            state.scheduled = True
+            heapq.heappush(self._heap, (due, next(self._seq), state))
+            self._cond.notify()
+
+    def _timer_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    if self._heap:
+                        delay = self._heap[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                _, _, state = heapq.heappop(self._heap)
+            self._executor.submit(self._run_next_round, state)
+
+    def _run_next_round(self, state: _TaskState) -> None:
+        with self._cond:
+            state.scheduled = False
+            if state.failure is not None or state.timed_out or state.next_round >= state.count:
+                return
+            # 已到达运行截止时间：不再开始新的轮次，没有进行中的轮次时任务立即结束
+            expired = deadline_passed()
+            if expired:
+                state.timed_out = True
+                finished = state.in_flight == 0
+            else:
+                round_idx = state.next_round
+                state.next_round += 1
+                state.in_flight += 1
+                state.last_start = time.monotonic()
+                # 并发窗口未满时立即安排下一轮，与本轮同时进行
+                if state.in_flight < state.concurrency and state.next_round < state.count:
+                    self._schedule(state, state.last_start + max(0, state.interval))
+        if expired:
+            if finished:
+                self._complete(state)
+            return
+
+        try:
+            success, detail = run_round(state.name, state.requests_list, round_idx, state.count,
+                                        state.success_check, state.retry_policy, state.cancel)
+        except Exception as exc:
+            success, detail = False, exc
+        self._finish_round(state, round_idx, success, detail)
+
+    def _finish_round(self, state: _TaskState, round_idx: int, success: bool, detail) -> None:
+        with self._cond:
+            state.in_flight -= 1
+            if success:
+                state.completed += 1
+            elif detail == DEADLINE_DETAIL:
+                state.timed_out = True
+            elif state.failure is None:
+                # 某轮失败，中止该任务剩余的轮次
+                if state.concurrency > 1 and not isinstance(detail, Exception):
+                    detail = f"第 {round_idx + 1} 轮{detail}"
+                state.failure = detail
+                state.cancel.set()
+            stopped = state.failure is not None or state.timed_out
+            finished = state.in_flight == 0 and (stopped or state.next_round >= state.count)
+            if not finished and not stopped and not state.scheduled and state.next_round < state.count:
+                if state.concurrency > 1:
+                    due = max(time.monotonic(), state.last_start + max(0, state.interval))
+                else:
+                    if state.interval > 0:
+                        logger.info(f"任务 '{state.name}': 等待 {state.interval} 秒...")
+                    due = time.monotonic() + max(0, state.interval)
+                self._schedule(state, due)
+
+        if finished:
+            self._complete(state)
+
+    def _complete(self, state: _TaskState) -> None:
+        if isinstance(state.failure, Exception):
+            state.future.set_exception(state.failure)
+        elif state.failure is not None:
+            state.future.set_result(build_task_result(
+                state.name, False, f"{state.fail_msg}: {state.failure}", state.start_time))
+        elif state.timed_out:
+            state.future.set_result(build_cancelled_result(state.name, state.completed, state.count, state.start_time))
+        else:
+            state.future.set_result(build_task_result(
+                state.name, True, state.success_msg, state.start_time))
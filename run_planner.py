@@ -0,0 +1,63 @@
+import logging
+import math
+
+from task_runner import format_duration, task_concurrency, task_priority
+
+logger = logging.getLogger('CheckinTask')
+
+# 没有历史记录时，估算每一轮 (所有步骤) 的耗时（秒）
+_DEFAULT_ROUND_SECONDS = 1.0
+
+
+def estimate_duration(task: dict, stats: dict | None = None) -> float:
+    """
+    估算任务的运行耗时（秒）。
+    计划内的等待时间为 (count - 1) × interval_seconds (并发执行多轮时按窗口数计算)；
+    有历史记录时取历史平均耗时与计划等待时间中较大者，否则在等待时间上加上每轮的默认耗时。
+    :param stats: 该任务的历史统计 (HistoryStore.task_stats() 中的一项)。
+    """
+    count = task.get('count', 1)
+    interval = task.get('interval_seconds', 0)
+    if not isinstance(count, int) or count <= 0:
+        return 0.0
+    try:
+        concurrency = task_concurrency(task)
+    except ValueError:
+        concurrency = 1
+    planned_wait = (count - 1) * max(0, interval) if isinstance(interval, (int, float)) else 0
+    if stats and stats.get("runs"):
+        return max(stats["avg_duration"], planned_wait)
+    if concurrency > 1:
+        return planned_wait + math.ceil(count / concurrency) * _DEFAULT_ROUND_SECONDS
+    return planned_wait + count * _DEFAULT_ROUND_SECONDS
+
+
+def _priority(task: dict) -> int:
+    try:
+        return task_priority(task)
+    except ValueError:
+        # 配置错误的任务在加载 HAR 前就会被报告为失败，这里按默认优先级排列即可
+        return 0
+
+
+def plan_run(tasks: list[dict], task_stats: dict[str, dict], deadline_seconds: float | None = None) -> list[dict]:
+    """
+    安排本次运行中任务的开始顺序：priority 大的先开始，同一优先级内预计耗时最长的先开始，
+    使耗时最长的任务 (决定整次运行总耗时的关键路径) 尽早开始。
+    :param task_stats: 各任务的历史统计，见 HistoryStore.task_stats()。
+    :param deadline_seconds: 本次运行的时限（秒），预计无法在时限内完成的任务会提前给出警告。
+    :return: 排序后的新任务列表。
+    """
+    estimates = [estimate_duration(task, task_stats.get(task.get('name', '未命名任务'))) for task in tasks]
+    order = sorted(range(len(tasks)), key=lambda i: (-_priority(tasks[i]), -estimates[i]))
+    planned = [tasks[i] for i in order]
+
+    if planned:
+        longest = max(estimates)
+        logger.info(f"任务执行顺序已按优先级与预计耗时排列，预计最长任务耗时 {format_duration(longest)}。")
+    if deadline_seconds:
+        for i in order:
+            if estimates[i] > deadline_seconds:
+                logger.warning(f"任务 '{tasks[i].get('name', '未命名任务')}' 预计耗时 {format_duration(estimates[i])}，"
+                               f"超过本次运行时限 {format_duration(deadline_seconds)}，可能会被取消。")
+    return planned
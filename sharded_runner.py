@@ -0,0 +1,147 @@
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+
+from metrics import get_registry
+from task_runner import run_task, load_task_requests, set_run_deadline
+
+logger = logging.getLogger('CheckinTask')
+
+# 主进程检查工作进程存活状态的间隔（秒）
+_RESULT_POLL_INTERVAL = 1.0
+
+
+def _worker_thread(task_queue, result_queue) -> None:
+    """
+    工作线程：不断从共享队列中领取任务并执行，直到收到结束标记 None。
+    所有进程共享同一个任务队列，空闲的线程会立即领取剩余任务（工作窃取），
+    因此一个耗时很长的任务不会导致其他进程闲置。
+    """
+    while True:
+        item = task_queue.get()
+        if item is None:
+            return
+        index, task = item
+        task_name = task.get('name', '未命名任务')
+        try:
+            requests_list, failure = load_task_requests(task)
+            result = failure or run_task(task, requests_list)
+        except Exception as exc:
+            logger.error(f"任务 '{task_name}' 在执行期间产生异常: {exc}", exc_info=True)
+            result = {
+                "name": task_name,
+                "success": False,
+                "duration": 0,
+                "message": f"执行异常: {str(exc)}"
+            }
+        result_queue.put((index, result))
+
+
+def _worker_main(task_queue, result_queue, log_queue, threads: int, log_level: int,
+                 deadline: float | None = None) -> None:
+    """工作进程入口：日志转发到主进程，沿用主进程的运行截止时间，并启动若干工作线程。"""
+    worker_logger = logging.getLogger('CheckinTask')
+    worker_logger.handlers.clear()
+    worker_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    worker_logger.setLevel(log_level)
+    worker_logger.propagate = False
+    set_run_deadline(deadline)
+
+    workers = [threading.Thread(target=_worker_thread, args=(task_queue, result_queue), daemon=True)
+               for _ in range(max(1, threads))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # 以 None 为编号回传本进程的请求指标快照，由主进程合并
+    result_queue.put((None, get_registry().snapshot()))
+
+
+def run_sharded(tasks: list[dict], processes: int, threads_per_process: int,
+                deadline: float | None = None) -> list[dict]:
+    """
+    将任务分发到多个工作进程执行，每个进程内再使用线程并发，最终汇总为一个结果列表。
+    HAR 解析、TLS 与响应处理等 CPU 密集的工作因此可以利用多个 CPU 核心。
+
+    :param tasks: 任务配置列表。
+    :param processes: 工作进程数。
+    :param threads_per_process: 每个工作进程内的线程数。
+    :param deadline: 运行截止时间 (time.time() 时间戳)，None 表示不限制。
+    :return: 与线程池模式相同格式的任务结果列表（按完成顺序）。
+    """
+    processes = max(1, min(processes, len(tasks)))
+    threads_per_process = max(1, threads_per_process)
+    # 统一使用 spawn，保证在 Windows / Linux 下行为一致，且不会继承父进程中的线程与锁
+    ctx = multiprocessing.get_context('spawn')
+    task_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    log_queue = ctx.Queue()
+
+    for index, task in enumerate(tasks):
+        task_queue.put((index, task))
+    for _ in range(processes * threads_per_process):
+        task_queue.put(None)
+
+    # 子进程的日志记录经由队列回到主进程，统一由主进程的处理器输出
+    listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    listener.start()
+
+    workers = [
+        ctx.Process(target=_worker_main,
+                    args=(task_queue, result_queue, log_queue, threads_per_process, logger.getEffectiveLevel(),
+                          deadline),
+                    name=f"task-shard-{i + 1}", daemon=True)
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"已启动 {processes} 个工作进程 (每个进程 {threads_per_process} 个线程)。")
+
+    results = {}
+    snapshots = 0
+
+    def _collect(index, result):
+        nonlocal snapshots
+        if index is None:
+            get_registry().merge(result)
+            snapshots += 1
+        else:
+            results[index] = result
+
+    try:
+        # 等待所有任务结果以及每个工作进程的指标快照
+        while len(results) < len(tasks) or snapshots < processes:
+            try:
+                _collect(*result_queue.get(timeout=_RESULT_POLL_INTERVAL))
+                continue
+            except queue.Empty:
+                pass
+            if not any(worker.is_alive() for worker in workers):
+                # 所有工作进程都已退出：取走队列中剩余的结果后结束等待
+                while True:
+                    try:
+                        _collect(*result_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                break
+    finally:
+        for worker in workers:
+            worker.join(timeout=_RESULT_POLL_INTERVAL)
+            if worker.is_alive():
+                worker.terminate()
+        listener.stop()
+
+    task_results = list(results.values())
+    for index, task in enumerate(tasks):
+        if index not in results:
+            task_name = task.get('name', '未命名任务')
+            logger.error(f"任务 '{task_name}' 未返回结果，工作进程可能已异常退出。")
+            task_results.append({
+                "name": task_name,
+                "success": False,
+                "duration": 0,
+                "message": "执行异常: 工作进程异常退出"
+            })
+    return task_results
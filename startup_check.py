@@ -0,0 +1,129 @@
+"""
+启动耗时检查。
+
+在全新的子进程中反复导入指定模块 (默认 main)，测量冷启动导入耗时的中位数，
+并检查导入是否有副作用 (读取 .env、创建文件、启动线程、创建日志处理器或通知渠道)。
+耗时超过预算或存在副作用时以非零状态码退出，可放在 CI 或定时任务的部署脚本中。
+
+用法示例:
+    python startup_check.py
+    python startup_check.py --budget-ms 120 --runs 9 --top 15
+    python startup_check.py --module task_runner
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 导入耗时中位数的默认预算（毫秒），tests/test_startup.py 使用同一预算
+DEFAULT_BUDGET_MS = 150.0
+
+# 在子进程中执行: 计时导入目标模块，然后收集副作用
+_PROBE = r"""
+import json, logging, os, sys, threading, time
+base_dir = sys.argv[1]
+before = set(os.listdir(base_dir))
+start = time.perf_counter()
+__import__(sys.argv[2])
+elapsed = time.perf_counter() - start
+config = sys.modules.get('config')
+notify = sys.modules.get('notify')
+print(json.dumps({
+    "elapsed_ms": elapsed * 1000,
+    "env_loaded": getattr(config, '_env_cache', None) is not None,
+    "config_loaded": bool(getattr(config, '_loaded', False)),
+    "threads": sorted(t.name for t in threading.enumerate() if t is not threading.main_thread()),
+    "new_files": sorted(set(os.listdir(base_dir)) - before - {'__pycache__'}),
+    "log_handlers": len(logging.getLogger('CheckinTask').handlers),
+    "notifier_created": getattr(notify, '_notification_manager', None) is not None,
+}))
+"""
+
+
+def _run_probe(module: str, importtime: bool = False) -> tuple[dict, str]:
+    """在子进程中导入一次模块，返回 (测量结果, -X importtime 输出)。"""
+    flags = ['-X', 'importtime'] if importtime else []
+    proc = subprocess.run(
+        [sys.executable, *flags, '-c', _PROBE, BASE_DIR, module],
+        cwd=BASE_DIR, capture_output=True, text=True, check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def measure(module: str, runs: int) -> tuple[float, list[float], dict]:
+    """
+    在 runs 个全新的子进程中分别导入模块 (先预热一次字节码缓存)。
+    :return: (导入耗时中位数, 每次的耗时, 最后一次的测量结果)，耗时单位为毫秒。
+    """
+    _run_probe(module)
+    timings = []
+    for _ in range(max(1, runs)):
+        result, _ = _run_probe(module)
+        timings.append(result["elapsed_ms"])
+    return statistics.median(timings), timings, result
+
+
+def _slowest_imports(importtime_output: str, top: int) -> list[tuple[int, str]]:
+    """解析 -X importtime 的输出，返回自身耗时最长的模块 [(微秒, 模块名)]。"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def side_effects(result: dict) -> list[str]:
+    """根据一次测量结果列出导入时的副作用，没有副作用时返回空列表。"""
+    problems = []
+    if result["env_loaded"] or result["config_loaded"]:
+        problems.append("导入时读取了配置 (.env)")
+    if result["threads"]:
+        problems.append(f"导入时启动了线程: {', '.join(result['threads'])}")
+    if result["new_files"]:
+        problems.append(f"导入时创建了文件: {', '.join(result['new_files'])}")
+    if result["log_handlers"]:
+        problems.append("导入时初始化了日志系统")
+    if result["notifier_created"]:
+        problems.append("导入时创建了通知渠道")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="检查模块冷启动导入耗时与导入副作用")
+    parser.add_argument('--module', default='main', help="要检查的模块")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help="导入耗时中位数的预算（毫秒）")
+    parser.add_argument('--runs', type=int, default=7, help="测量次数（每次都是新的子进程）")
+    parser.add_argument('--top', type=int, default=10, help="列出自身耗时最长的模块数")
+    args = parser.parse_args(argv)
+
+    median, timings, result = measure(args.module, args.runs)
+    # -X importtime 本身会拖慢导入，只用于单独一次的耗时分解
+    _, importtime_output = _run_probe(args.module, importtime=True)
+
+    print(f"导入 {args.module}: 中位数 {median:.1f}ms (最快 {min(timings):.1f}ms, 最慢 {max(timings):.1f}ms, "
+          f"{len(timings)} 次)，预算 {args.budget_ms:.0f}ms")
+    print("自身耗时最长的模块:")
+    for self_us, name in _slowest_imports(importtime_output, args.top):
+        print(f"  {self_us / 1000:7.2f}ms  {name}")
+
+    failed = False
+    for problem in side_effects(result):
+        print(f"副作用: {problem}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"超出预算: {median:.1f}ms > {args.budget_ms:.0f}ms")
+        failed = True
+    print("检查未通过。" if failed else "检查通过。")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
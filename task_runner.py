@@ -0,0 +1,394 @@
+import os
+import time
+import logging
+import threading
+import concurrent.futures
+from typing import Iterator
+
+import config
+
+from cookie_jar import CookieJar
+from dns_cache import get_dns_cache
+from metrics import get_registry
+from plan_cache import load_plan
+from request_plan import RequestPlan
+from request_sender import send_request
+from response_check import DEFAULT_CHECK, SuccessCheck
+from retry_policy import (DEFAULT_POLICY, RetryPolicy, circuit_open_result, get_circuit_breaker,
+                          get_retry_budget, next_retry_delay)
+
+logger = logging.getLogger('CheckinTask')
+
+# 本次运行的截止时间 (time.time() 时间戳)，None 表示不限制。到达后尚未开始的任务直接取消，
+# 进行中的任务在下一轮 (或下一步骤) 开始前停止。使用墙钟时间，可以原样传给子进程
+_run_deadline: float | None = None
+# 因到达截止时间而中止一轮时，run_round 返回的说明
+DEADLINE_DETAIL = "已超过运行截止时间"
+
+
+def set_run_deadline(deadline: float | None) -> None:
+    """设置 (或以 None 清除) 本次运行的截止时间。"""
+    global _run_deadline
+    _run_deadline = deadline
+
+
+def get_run_deadline() -> float | None:
+    return _run_deadline
+
+
+def time_left() -> float | None:
+    """距运行截止时间的剩余秒数 (已过期时为负数)；未设置截止时间时返回 None。"""
+    return None if _run_deadline is None else _run_deadline - time.time()
+
+
+def deadline_passed() -> bool:
+    remaining = time_left()
+    return remaining is not None and remaining <= 0
+
+
+def _sleep_within_deadline(seconds: float) -> None:
+    """等待 seconds 秒，但不会等到运行截止时间之后。"""
+    remaining = time_left()
+    if remaining is not None:
+        seconds = min(seconds, remaining)
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def format_duration(seconds: float) -> str:
+    """将秒数格式化为 'X分Y秒' 或 'Y.YY秒'。"""
+    if seconds >= 60:
+        minutes, sec = divmod(int(seconds), 60)
+        return f"{minutes}分{sec}秒"
+    else:
+        return f"{seconds:.2f}秒"
+
+
+def _send_request_with_retry(task_name: str, plan: RequestPlan, current_count: int, total_count: int, cookie_jar: CookieJar,
+                             check: SuccessCheck = DEFAULT_CHECK, policy: RetryPolicy = DEFAULT_POLICY) -> tuple[bool, str]:
+    """
+    发送单个请求，按重试策略重试。cookie_jar 会被原地更新。
+    只重试网络错误与可重试的状态码，重试前按指数退避加抖动等待；
+    主机处于熔断状态或全局重试预算耗尽时立即失败。
+    返回 (True, "OK") 表示成功，(False, 错误信息) 表示失败。
+    """
+    breaker = get_circuit_breaker()
+    get_retry_budget().deposit()
+
+    attempt = 0
+    while True:
+        if not breaker.allow(plan.netloc):
+            result = circuit_open_result(plan.netloc)
+            logger.warning(f"任务 '{task_name}' 第 {current_count}/{total_count} 次发送跳过: {result.message}")
+            return False, result.message
+        if attempt:
+            get_registry().record_retry(task_name, plan.netloc)
+        result = send_request(plan, cookie_jar, task_name, check, time_left())
+        breaker.record(plan.netloc, result, policy)
+        if result.success:
+            return True, "OK"
+        if result.error == 'deadline':
+            return False, DEADLINE_DETAIL
+
+        logger.warning(f"任务 '{task_name}' 第 {current_count}/{total_count} 次发送失败 (尝试 {attempt + 1}/{policy.max_attempts}): {result.message}")
+        delay = next_retry_delay(policy, attempt, result)
+        if delay is None:
+            break
+        time.sleep(delay)
+        attempt += 1
+
+    logger.error(f"任务 '{task_name}' 第 {current_count}/{total_count} 次发送失败，共尝试 {attempt + 1} 次。最后错误: {result.message}")
+    return False, result.message
+
+def run_round(task_name: str, requests_list: list[RequestPlan], round_idx: int, count: int,
+              success_check: SuccessCheck = DEFAULT_CHECK, retry_policy: RetryPolicy = DEFAULT_POLICY,
+              cancel: threading.Event | None = None) -> tuple[bool, str]:
+    """
+    执行任务的一轮：按顺序发送 HAR 中的所有步骤，并在步骤间保持 Cookie。
+    :param round_idx: 当前轮次的下标 (从 0 开始)。
+    :param success_check: 任务配置的成功判定条件，只作用于其 steps 指定的步骤。
+    :param retry_policy: 任务配置的重试策略。
+    :param cancel: 并发执行多轮时，其他轮次失败后会被设置，本轮在下一步骤开始前停止。
+    :return: (是否成功, 失败时的步骤说明)
+    """
+    logger.info(f"任务 '{task_name}': 正在进行第 {round_idx + 1}/{count} 轮执行。")
+    
+    # 每一轮任务开始前，清空 Session Cookie，确保每轮都是新的会话
+    # (除非业务逻辑要求跨轮次保持，通常签到任务每轮是独立的)
+    cookie_jar = CookieJar()
+    
+    # 步骤级循环 (HAR 中的多个请求，如 登录 -> 签到)
+    steps_total = len(requests_list)
+    for step_idx, plan in enumerate(requests_list):
+        step_num = step_idx + 1
+        if cancel is not None and cancel.is_set():
+            return False, "已取消"
+        if deadline_passed():
+            return False, DEADLINE_DETAIL
+        
+        # 如果是多步骤任务，日志显示步骤信息
+        if steps_total > 1:
+            logger.info(f"  -> 步骤 {step_num}/{steps_total}: {plan.method} {plan.url}")
+
+        # Cookie 容器在步骤间共享，供下一步骤使用
+        success, msg = _send_request_with_retry(
+            task_name,
+            plan,
+            f"{round_idx+1}-{step_num}", # 复合计数器用于日志
+            f"{count}-{steps_total}",
+            cookie_jar,
+            success_check if success_check.applies_to(step_num) else DEFAULT_CHECK,
+            retry_policy
+        )
+
+        if msg == DEADLINE_DETAIL:
+            return False, DEADLINE_DETAIL  # 限速等待会超过截止时间，按取消处理
+        if not success:
+            return False, f"步骤 {step_num} 失败 - {msg}"  # 某个步骤失败，中止当前这一轮任务
+
+    return True, ""
+
+def build_task_result(task_name: str, success: bool, message: str, task_start_time: float) -> dict:
+    """记录任务结束日志，并生成统一格式的任务结果字典。"""
+    duration = time.time() - task_start_time
+    logger.info(f"--- [线程结束] 任务: {task_name} 执行完毕, 耗时: {format_duration(duration)} ---")
+    
+    return {
+        "name": task_name,
+        "success": success,
+        "duration": duration,
+        "message": message
+    }
+
+def deadline_cancel_message(task_name: str, completed: int, count: int) -> str:
+    """记录任务因到达运行截止时间而被取消，返回结果中的说明。"""
+    logger.warning(f"任务 '{task_name}' 已到达运行截止时间，完成 {completed}/{count} 轮后取消。")
+    return f"已取消: 超过运行截止时间 (完成 {completed}/{count} 轮)"
+
+def build_cancelled_result(task_name: str, completed: int, count: int, task_start_time: float) -> dict:
+    """生成因到达运行截止时间而被取消的任务结果。"""
+    return build_task_result(task_name, False, deadline_cancel_message(task_name, completed, count), task_start_time)
+
+def task_concurrency(task_config: dict) -> int:
+    """读取任务的 concurrency 配置：同时进行的轮次数，默认为 1 (逐轮执行)。"""
+    concurrency = task_config.get('concurrency', 1)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise ValueError(f"concurrency 必须是正整数: {concurrency!r}")
+    return concurrency
+
+def task_priority(task_config: dict) -> int:
+    """读取任务的 priority 配置：数值越大越先开始，默认为 0。"""
+    priority = task_config.get('priority', 0)
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        raise ValueError(f"priority 必须是整数: {priority!r}")
+    return priority
+
+def _run_rounds_concurrently(task_name: str, requests_list: list[RequestPlan], count: int, interval: float,
+                             concurrency: int, success_check: SuccessCheck,
+                             retry_policy: RetryPolicy) -> tuple[bool, str, int]:
+    """
+    以最多 concurrency 轮同时进行的窗口执行各轮，每轮使用独立的 Cookie 会话。
+    interval 为相邻两轮开始时间的最小间隔。任意一轮失败后不再开始新的轮次，
+    进行中的轮次在当前步骤结束后停止；到达运行截止时间后同样不再开始新的轮次。
+    :return: (是否成功, 第一个失败轮次的说明, 成功完成的轮数)
+    """
+    cancel = threading.Event()
+    failure = None
+    completed = 0
+
+    def _check(done):
+        nonlocal failure, completed
+        for future in done:
+            try:
+                success, detail = future.result()
+            except Exception:
+                cancel.set()
+                raise
+            if success:
+                completed += 1
+            elif detail != DEADLINE_DETAIL and failure is None:
+                failure = f"第 {future_to_round[future] + 1} 轮{detail}"
+                cancel.set()
+
+    future_to_round = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(concurrency, count),
+                                               thread_name_prefix='TaskRound') as executor:
+        pending = set()
+        next_start = time.monotonic()
+        for i in range(count):
+            # 窗口已满或间隔未到时等待，期间已有轮次失败则不再开始新的轮次
+            while failure is None and not deadline_passed():
+                delay = next_start - time.monotonic()
+                if len(pending) < concurrency and delay <= 0:
+                    break
+                if not pending:
+                    _sleep_within_deadline(delay)
+                    continue
+                # 有截止时间时最多等到截止时间，以便及时停止开始新的轮次
+                remaining = time_left()
+                timeout = remaining if len(pending) >= concurrency else delay
+                if remaining is not None and timeout is not None:
+                    timeout = max(0.0, min(timeout, remaining))
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=timeout,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                _check(done)
+            if failure is not None or deadline_passed():
+                break
+            future = executor.submit(run_round, task_name, requests_list, i, count,
+                                     success_check, retry_policy, cancel)
+            future_to_round[future] = i
+            pending.add(future)
+            next_start = time.monotonic() + interval
+        done, _ = concurrent.futures.wait(pending)
+        _check(done)
+    return failure is None, failure or "", completed
+
+def run_task(task_config: dict, requests_list: list[RequestPlan]) -> dict:
+    """
+    执行单个任务的核心逻辑，此函数将在单独的线程中运行。
+    支持多步骤请求（从 HAR 解析出的请求列表），并在步骤间保持 Cookie。
+    """
+    task_name = task_config.get('name', '未命名任务')
+    count = task_config.get('count', 1)
+    interval = task_config.get('interval_seconds', 0)
+    success_msg = task_config.get('success_msg', '任务完成')
+    fail_msg = task_config.get('fail_msg', '任务失败')
+    success_check = SuccessCheck.from_task(task_config)
+    retry_policy = RetryPolicy.from_task(task_config)
+    concurrency = task_concurrency(task_config)
+
+    task_start_time = time.time()
+    logger.info(f"--- [线程开始] 任务: {task_name} ---")
+
+    final_success = True
+    final_message = success_msg
+
+    if concurrency > 1 and count > 1:
+        success, detail, completed = _run_rounds_concurrently(task_name, requests_list, count, interval, concurrency,
+                                                              success_check, retry_policy)
+        if not success:
+            final_success, final_message = False, f"{fail_msg}: {detail}"
+        elif completed < count:
+            return build_cancelled_result(task_name, completed, count, task_start_time)
+        return build_task_result(task_name, final_success, final_message, task_start_time)
+    
+    # 任务级循环 (例如签到 3 次)
+    for i in range(count):
+        if deadline_passed():
+            return build_cancelled_result(task_name, i, count, task_start_time)
+        success, detail = run_round(task_name, requests_list, i, count, success_check, retry_policy)
+        if detail == DEADLINE_DETAIL:
+            return build_cancelled_result(task_name, i, count, task_start_time)
+        if not success:
+            final_success = False
+            final_message = f"{fail_msg}: {detail}"
+            break # 如果某轮失败，中止整个任务配置的剩余轮次
+
+        if i < count - 1 and interval > 0:
+            logger.info(f"任务 '{task_name}': 等待 {interval} 秒...")
+            _sleep_within_deadline(interval)
+    
+    return build_task_result(task_name, final_success, final_message, task_start_time)
+
+def _check_task(task: dict) -> tuple[str | None, dict | None]:
+    """
+    检查任务的 HAR 文件与配置。
+    :return: (HAR 文件路径, None)；失败时返回 (None, 失败结果字典)。
+    """
+    task_name = task.get('name', '未命名任务')
+    har_file = os.path.join(config.BASE_DIR, task.get('har_file', ''))
+    
+    if not har_file or not os.path.exists(har_file):
+        logger.error(f"任务 '{task_name}' 的HAR文件未找到或未配置: {har_file}，跳过此任务。")
+        return None, {
+            "name": task_name,
+            "success": False,
+            "duration": 0,
+            "message": f"HAR文件未找到: {har_file}"
+        }
+
+    try:
+        SuccessCheck.from_task(task)
+        RetryPolicy.from_task(task)
+        task_concurrency(task)
+        task_priority(task)
+    except ValueError as e:
+        logger.error(f"任务 '{task_name}' 的配置错误: {e}，跳过此任务。")
+        return None, {
+            "name": task_name,
+            "success": False,
+            "duration": 0,
+            "message": f"任务配置错误: {e}"
+        }
+    return har_file, None
+
+def _plan_result(task: dict, requests_list: list[RequestPlan] | None) -> tuple[list[RequestPlan] | None, dict | None]:
+    if not requests_list:
+        task_name = task.get('name', '未命名任务')
+        logger.error(f"无法为任务 '{task_name}' 解析HAR文件，跳过此任务。")
+        return None, {
+            "name": task_name,
+            "success": False,
+            "duration": 0,
+            "message": "HAR文件解析失败"
+        }
+    return requests_list, None
+
+def load_task_requests(task: dict) -> tuple[list[RequestPlan] | None, dict | None]:
+    """
+    为任务解析其HAR文件。
+    :return: (请求列表, None)；失败时返回 (None, 失败结果字典)。
+    """
+    har_file, failure = _check_task(task)
+    if failure:
+        return None, failure
+    return _plan_result(task, load_plan(har_file))
+
+def iter_task_requests(tasks: list[dict], max_workers: int | None = None
+                       ) -> Iterator[tuple[dict, list[RequestPlan] | None, dict | None]]:
+    """
+    在后台线程中并发解析所有任务的 HAR 文件，逐个产出 (任务, 请求列表, 失败结果)。
+    每个任务的 HAR 一解析完成就产出，调用方可以在其余 HAR 仍在解析时就开始执行已就绪的任务，
+    一个解析缓慢的 HAR 不会拖住其后的任务。HAR 按 tasks 中的顺序提交解析，
+    同时有多个任务就绪时先产出排在前面的，以遵循 run_planner 安排的开始顺序。
+    多个任务引用同一 HAR 时只解析一次，共享同一份不可变的请求列表；配置有误的任务最先产出。
+    """
+    pending: list[dict] = []                 # 等待 HAR 的任务 (按 tasks 中的顺序)
+    by_har: dict[str, list[int]] = {}        # HAR 路径 -> 引用它的任务在 pending 中的下标
+    for task in tasks:
+        har_file, failure = _check_task(task)
+        if failure:
+            yield task, None, failure
+        else:
+            by_har.setdefault(os.path.abspath(har_file), []).append(len(pending))
+            pending.append(task)
+    if not by_har:
+        return
+
+    ready: dict[int, tuple[list[RequestPlan] | None, dict | None]] = {}
+    workers = max(1, min(len(by_har), max_workers or config.PLAN_LOAD_WORKERS))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='PlanLoader') as executor:
+        future_to_har = {executor.submit(load_plan, har_file): har_file for har_file in by_har}
+        loading = set(future_to_har)
+        while loading or ready:
+            if ready:
+                # 已有就绪的任务时不等待，只收集此期间解析完成的 HAR
+                done = {future for future in loading if future.done()}
+                loading -= done
+            else:
+                done, loading = concurrent.futures.wait(loading, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                har_file = future_to_har[future]
+                try:
+                    requests_list = future.result()
+                except Exception as e:
+                    logger.error(f"解析HAR文件时出错: {har_file} - {e}", exc_info=config.DEBUG_MODE)
+                    requests_list = None
+                if requests_list and config.DNS_CACHE_ENABLED:
+                    # 在后台预解析该 HAR 涉及的所有主机，后续步骤建连时无需再等待 DNS
+                    get_dns_cache().prefetch(plan.host for plan in requests_list)
+                for index in by_har[har_file]:
+                    ready[index] = _plan_result(pending[index], requests_list)
+            index = min(ready)
+            yield pending[index], *ready.pop(index)
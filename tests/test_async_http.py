@@ -0,0 +1,58 @@
+import asyncio
+
+from async_http import get_async_pool, send_request_async
+from request_plan import compile_request
+
+_OK = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: keep-alive\r\n\r\nok"
+
+
+async def _serve(behaviours: list[list[str]]):
+    """
+    启动本地替身服务器。behaviours[i] 为第 i 个连接上依次处理各请求的方式:
+    ok 正常响应; drop 读到请求后不响应直接关闭; partial 发送响应头与部分响应体后关闭。
+    :return: (服务器, 端口, 收到的请求数列表)
+    """
+    received = []
+    connections = iter(behaviours)
+
+    async def handle(reader, writer):
+        for behaviour in next(connections, []):
+            head = await reader.readuntil(b"\r\n\r\n")
+            received.append(head.split(b" ", 2)[1].decode())
+            if behaviour == "ok":
+                writer.write(_OK)
+                await writer.drain()
+            elif behaviour == "partial":
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\npartial")
+                await writer.drain()
+                break
+            else:
+                break
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1], received
+
+
+async def _send_twice(behaviours):
+    server, port, received = await _serve(behaviours)
+    async with server:
+        first = await send_request_async(compile_request('POST', f"http://127.0.0.1:{port}/checkin", {}, "a=1"))
+        second = await send_request_async(compile_request('POST', f"http://127.0.0.1:{port}/checkin", {}, "a=1"))
+        await get_async_pool().close_all()
+    return first, second, received
+
+
+def test_stale_keepalive_connection_is_retried_on_a_new_connection():
+    first, second, received = asyncio.run(_send_twice([["ok", "drop"], ["ok"]]))
+    assert first.success and second.success
+    # 第二个请求在失效的连接上没有得到任何响应，在新连接上重发了一次
+    assert received == ["/checkin"] * 3
+
+
+def test_connection_lost_mid_body_is_not_resent():
+    first, second, received = asyncio.run(_send_twice([["ok", "partial"], ["ok"]]))
+    assert first.success
+    assert not second.success and second.error == 'network'
+    # 服务器已经开始响应第二个请求，不能在新连接上静默重发
+    assert received == ["/checkin"] * 2
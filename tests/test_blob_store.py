@@ -0,0 +1,39 @@
+import config
+import blob_store
+
+
+def test_mappings_are_bounded_and_evicted_in_lru_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'BLOB_DIR', str(tmp_path), raising=False)
+    monkeypatch.setattr(blob_store, '_MAX_MAPPINGS', 3)
+    blob_store.close()
+    refs = [blob_store.put(bytes([i]) * 100) for i in range(5)]
+
+    for ref in refs[:3]:
+        assert bytes(ref.view()) == bytes([refs.index(ref)]) * 100
+    first = blob_store._mappings[refs[0].digest]
+    refs[0].view()          # 最近使用过，不会被淘汰
+    refs[3].view()
+    refs[4].view()
+
+    assert list(blob_store._mappings) == [refs[0].digest, refs[3].digest, refs[4].digest]
+    assert blob_store._mappings[refs[0].digest] is first
+    blob_store.close()
+    assert not blob_store._mappings
+    assert first.closed
+
+
+def test_mapping_in_use_is_closed_after_its_last_view(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'BLOB_DIR', str(tmp_path), raising=False)
+    blob_store.close()
+    ref = blob_store.put(b'payload' * 100)
+    view = ref.view()
+    mapping = blob_store._mappings[ref.digest]
+
+    blob_store.close()
+    # 正在发送的 memoryview 不受影响
+    assert bytes(view[:7]) == b'payload'
+    assert not mapping.closed
+    # 之后访问会重新映射
+    assert bytes(ref.view()) == b'payload' * 100
+    assert blob_store._mappings[ref.digest] is not mapping
+    blob_store.close()
@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import connection_pool
+from connection_pool import ConnectionPool
+from request_plan import compile_request
+from request_sender import send_request
+
+_OK = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: keep-alive\r\n\r\nok"
+
+
+class _KeepAliveServer:
+    """
+    本地替身服务器。behaviours[i] 为第 i 个连接上依次处理各请求的方式:
+    ok 正常响应; drop 读到请求后不响应直接关闭。
+    """
+    def __init__(self, behaviours: list[list[str]]):
+        self.received = []
+        self.connections = 0
+        self._behaviours = iter(behaviours)
+        self._sock = socket.create_server(('127.0.0.1', 0))
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn, next(self._behaviours, [])), daemon=True).start()
+
+    def _handle(self, conn, behaviours):
+        with conn:
+            reader = conn.makefile('rb')
+            for behaviour in behaviours:
+                request_line = reader.readline()
+                if not request_line:
+                    return
+                while reader.readline() not in (b"\r\n", b""):
+                    pass
+                self.received.append(request_line.split(b" ")[1].decode())
+                if behaviour != "ok":
+                    return
+                conn.sendall(_OK)
+            # 处理完预定的请求后等待客户端关闭
+            reader.read()
+
+    def close(self):
+        self._sock.close()
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool(max_per_host=2, idle_timeout=60, timeout=5)
+    previous = connection_pool.set_pool(pool)
+    yield pool
+    connection_pool.set_pool(previous)
+    pool.close_all()
+
+
+def _get(port: int, path: str = "/checkin"):
+    return send_request(compile_request('GET', f"http://127.0.0.1:{port}{path}", {}, None))
+
+
+def test_keepalive_connection_is_reused(pool):
+    server = _KeepAliveServer([["ok", "ok", "ok"]])
+    try:
+        results = [_get(server.port, f"/step{i}") for i in range(3)]
+    finally:
+        server.close()
+    assert all(result.success for result in results)
+    assert server.received == ["/step0", "/step1", "/step2"]
+    assert server.connections == 1
+    stats = pool.stats()
+    assert (stats["misses"], stats["hits"], stats["idle"], stats["in_use"]) == (1, 2, 1, 0)
+
+
+def test_stale_keepalive_connection_is_retried_once_on_a_new_connection(pool):
+    # 第一个连接处理完一个请求后，在第二个请求到达时直接关闭
+    server = _KeepAliveServer([["ok", "drop"], ["ok"]])
+    try:
+        first, second = _get(server.port), _get(server.port)
+    finally:
+        server.close()
+    assert first.success and second.success
+    assert server.received == ["/checkin"] * 3
+    assert server.connections == 2
+
+
+def test_new_connection_failure_is_not_retried(pool):
+    server = _KeepAliveServer([["drop"], ["ok"]])
+    try:
+        result = _get(server.port)
+    finally:
+        server.close()
+    assert not result.success and result.error == 'network'
+    assert server.received == ["/checkin"]
+    assert pool.stats()["in_use"] == 0
+
+
+def test_idle_connections_expire():
+    pool = ConnectionPool(idle_timeout=0.05)
+    conn, reused = pool.acquire('http', 'example.test', 80)
+    conn.sock = socket.socket()     # 模拟已建立的连接
+    pool.release(conn)
+
+    again, reused = pool.acquire('http', 'example.test', 80)
+    assert again is conn and reused
+    pool.release(again)
+
+    time.sleep(0.1)
+    fresh, reused = pool.acquire('http', 'example.test', 80)
+    assert fresh is not conn and not reused
+    assert conn.sock is None and pool.stats()["evictions"] == 1
+    pool.discard(fresh)
+
+
+def test_acquire_blocks_at_the_per_host_limit():
+    pool = ConnectionPool(max_per_host=1)
+    first, _ = pool.acquire('http', 'example.test', 80)
+    acquired = threading.Event()
+
+    def borrow():
+        conn, _ = pool.acquire('http', 'example.test', 80)
+        acquired.set()
+        pool.discard(conn)
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    assert not acquired.wait(0.1)
+    pool.discard(first)
+    assert acquired.wait(2)
+    thread.join()
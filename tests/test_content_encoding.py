@@ -0,0 +1,85 @@
+import gzip
+import types
+
+import content_encoding
+from content_encoding import BodyDecoder, _MAX_PIECE_SIZE
+
+# 替身解压器的膨胀倍数: 每个输入字节展开为这么多字节
+_RATIO = 10_000
+
+
+class _Collector:
+    def __init__(self, limit: int | None = None):
+        self.pieces = []
+        self.limit = limit
+
+    def __call__(self, piece: bytes) -> bool:
+        self.pieces.append(len(piece))
+        return self.limit is not None and sum(self.pieces) >= self.limit
+
+
+class _OldBrotliDecompressor:
+    """brotli < 1.2 / brotlicffi: process 没有输出上限参数。"""
+    def process(self, data):
+        return b'x' * (len(data) * _RATIO)
+
+
+class _BoundedBrotliDecompressor:
+    """brotli >= 1.2: 输出达到 output_buffer_limit 时剩余部分留在解码器内。"""
+    def __init__(self):
+        self._pending = 0
+
+    def process(self, data, output_buffer_limit=None):
+        self._pending += len(data) * _RATIO
+        size = self._pending if output_buffer_limit is None else min(self._pending, output_buffer_limit)
+        self._pending -= size
+        return b'x' * size
+
+    def can_accept_more_data(self):
+        return self._pending == 0
+
+
+def _fake_zstandard():
+    class _Obj:
+        def decompress(self, data):
+            return b'x' * (len(data) * _RATIO)
+
+    class _Decompressor:
+        def decompressobj(self):
+            return _Obj()
+
+    return types.SimpleNamespace(ZstdDecompressor=_Decompressor)
+
+
+def test_gzip_output_is_bounded_per_piece():
+    bomb = gzip.compress(b'\0' * (20 * 1024 * 1024))
+    sink = _Collector()
+    BodyDecoder('gzip').feed(bomb, sink)
+    assert max(sink.pieces) <= _MAX_PIECE_SIZE
+    assert sum(sink.pieces) == 20 * 1024 * 1024
+
+
+def test_brotli_uses_output_buffer_limit_when_available(monkeypatch):
+    monkeypatch.setattr(content_encoding, 'brotli', types.SimpleNamespace(Decompressor=_BoundedBrotliDecompressor))
+    sink = _Collector()
+    decoder = BodyDecoder('br')
+    decoder.feed(b'a' * 1000, sink)
+    assert max(sink.pieces) <= _MAX_PIECE_SIZE
+    assert decoder.decoded_bytes == 1000 * _RATIO
+
+
+def test_old_brotli_is_fed_in_small_slices(monkeypatch):
+    monkeypatch.setattr(content_encoding, 'brotli', types.SimpleNamespace(Decompressor=_OldBrotliDecompressor))
+    sink = _Collector()
+    BodyDecoder('br').feed(b'a' * 1000, sink)
+    assert max(sink.pieces) <= content_encoding._BOUNDED_INPUT_SIZE * _RATIO
+    assert sum(sink.pieces) == 1000 * _RATIO
+
+
+def test_zstd_stops_decoding_once_sink_is_full(monkeypatch):
+    monkeypatch.setattr(content_encoding, 'zstandard', _fake_zstandard())
+    sink = _Collector(limit=1024 * 1024)
+    decoder = BodyDecoder('zstd')
+    assert decoder.feed(b'a' * 100_000, sink) is True
+    # 一整块输入展开后约 1GB，但 sink 读满后不再继续解压
+    assert decoder.decoded_bytes < 1024 * 1024 + content_encoding._BOUNDED_INPUT_SIZE * _RATIO
@@ -0,0 +1,72 @@
+import time
+from email.utils import formatdate
+
+from cookie_jar import CookieJar
+from request_plan import compile_request
+
+
+def _plan(url: str, cookie: str = ''):
+    return compile_request('GET', url, {'Cookie': cookie} if cookie else {}, None)
+
+
+def test_host_only_and_domain_cookies():
+    jar = CookieJar()
+    jar.update_from_response(['sid=1', 'shared=2; Domain=.example.test', 'evil=3; Domain=other.test'],
+                             _plan('https://www.example.test/login'))
+
+    assert jar.header_for(_plan('https://www.example.test/')) == 'sid=1; shared=2'
+    # 未指定 Domain 的 Cookie 只发送给设置它的主机
+    assert jar.header_for(_plan('https://api.example.test/')) == 'shared=2'
+    assert jar.header_for(_plan('https://example.test/')) == 'shared=2'
+    assert jar.header_for(_plan('https://notexample.test/')) == ''
+
+
+def test_path_matching_and_longest_path_first():
+    jar = CookieJar()
+    jar.update_from_response(['root=r; Path=/', 'api=a; Path=/api', 'dflt=d'],
+                             _plan('https://example.test/api/v1/login'))
+
+    assert jar.header_for(_plan('https://example.test/api/v1/checkin')) == 'dflt=d; api=a; root=r'
+    assert jar.header_for(_plan('https://example.test/api')) == 'api=a; root=r'
+    # /apix 不在 /api 路径下
+    assert jar.header_for(_plan('https://example.test/apix')) == 'root=r'
+
+
+def test_secure_cookie_is_not_sent_over_http():
+    jar = CookieJar()
+    jar.update_from_response(['token=t; Secure', 'plain=p'], _plan('https://example.test/'))
+    assert jar.header_for(_plan('http://example.test/')) == 'plain=p'
+    assert jar.header_for(_plan('https://example.test/')) == 'token=t; plain=p'
+
+
+def test_expiry_and_deletion():
+    jar = CookieJar()
+    plan = _plan('https://example.test/')
+    jar.update_from_response(['short=1; Max-Age=60', 'long=2; Expires=' + formatdate(time.time() + 3600, usegmt=True),
+                              'gone=3'], plan)
+    jar.update_from_response(['gone=; Max-Age=0'], plan)
+    assert jar.header_for(plan) == 'short=1; long=2'
+
+    jar.update_from_response(['short=1; Max-Age=-1'], plan)
+    assert jar.header_for(plan) == 'long=2'
+    # Max-Age 优先于 Expires
+    jar.update_from_response(['long=2; Max-Age=60; Expires=Thu, 01 Jan 1970 00:00:00 GMT'], plan)
+    assert jar.header_for(plan) == 'long=2'
+
+
+def test_session_cookie_replaces_static_har_cookie_of_the_same_name():
+    plan = _plan('https://example.test/checkin', cookie='sid=old; theme=dark')
+    jar = CookieJar()
+    assert jar.header_for(plan) == 'sid=old; theme=dark'
+
+    jar.update_from_response(['sid=new'], _plan('https://example.test/login'))
+    assert jar.header_for(plan) == 'theme=dark; sid=new'
+    # 同一 Cookie 再次设置时覆盖而不是重复
+    jar.update_from_response(['sid=newer'], _plan('https://example.test/login'))
+    assert jar.header_for(plan) == 'theme=dark; sid=newer'
+
+
+def test_malformed_set_cookie_is_ignored():
+    jar = CookieJar()
+    jar.update_from_response(['novalue', '=x', 'ok=1'], _plan('https://example.test/'))
+    assert jar.header_for(_plan('https://example.test/')) == 'ok=1'
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from cron import CronSchedule
+
+
+def _next(expression: str, after: str) -> str:
+    return CronSchedule(expression).next_after(datetime.fromisoformat(after)).isoformat(sep=' ', timespec='minutes')
+
+
+def _series(expression: str, after: str, n: int) -> list[str]:
+    schedule, t, result = CronSchedule(expression), datetime.fromisoformat(after), []
+    for _ in range(n):
+        t = schedule.next_after(t)
+        result.append(t.strftime('%d %H:%M'))
+    return result
+
+
+def test_next_after_is_strictly_later_and_minute_aligned():
+    assert _next('* * * * *', '2024-05-01 08:00:00') == '2024-05-01 08:01'
+    assert _next('* * * * *', '2024-05-01 08:00:59.9') == '2024-05-01 08:01'
+    assert _next('0 8 * * *', '2024-05-01 08:00') == '2024-05-02 08:00'
+    assert _next('0 8 * * *', '2024-05-01 07:59:30') == '2024-05-01 08:00'
+
+
+def test_ranges_steps_and_lists():
+    assert _series('*/20 9-10 * * *', '2024-05-01 00:00', 7) == [
+        '01 09:00', '01 09:20', '01 09:40', '01 10:00', '01 10:20', '01 10:40', '02 09:00']
+    assert _series('5,35 1-5/2 * * *', '2024-05-01 00:00', 7) == [
+        '01 01:05', '01 01:35', '01 03:05', '01 03:35', '01 05:05', '01 05:35', '02 01:05']
+    # a/n 表示从 a 开始到上限，每 n 个取一个
+    assert _series('50/5 0 * * *', '2024-05-01 00:00', 3) == ['01 00:50', '01 00:55', '02 00:50']
+
+
+def test_names_and_sunday_as_seven():
+    # 2024-05-01 是周三
+    assert _next('0 9 * * mon-fri', '2024-05-03 10:00') == '2024-05-06 09:00'
+    assert _next('0 9 * * 7', '2024-05-01 00:00') == '2024-05-05 09:00'
+    assert _next('0 9 * * sun', '2024-05-01 00:00') == '2024-05-05 09:00'
+    assert _next('0 0 1 jun,dec *', '2024-05-01 00:00') == '2024-06-01 00:00'
+
+
+def test_day_of_month_and_day_of_week_are_ored_when_both_restricted():
+    # 每月 15 日或每个周一
+    assert _series('0 0 15 * 1', '2024-05-01 00:00', 4) == ['06 00:00', '13 00:00', '15 00:00', '20 00:00']
+    # 只限定其中一个时只按该字段匹配
+    assert _series('0 0 15 * *', '2024-05-01 00:00', 1) == ['15 00:00']
+    assert _series('0 0 * * 1', '2024-05-01 00:00', 2) == ['06 00:00', '13 00:00']
+    # 以 * 开头的步长仍视为不限定，与星期取交集: 5 月的奇数日中的周一
+    assert _series('0 0 */2 * 1', '2024-05-01 00:00', 2) == ['13 00:00', '27 00:00']
+
+
+def test_month_and_year_rollover():
+    assert _next('30 23 31 * *', '2024-04-15 00:00') == '2024-05-31 23:30'
+    assert _next('0 0 1 * *', '2024-12-31 23:59') == '2025-01-01 00:00'
+    assert _next('0 0 29 2 *', '2024-03-01 00:00') == '2028-02-29 00:00'
+    assert _next('@yearly', '2024-06-01 00:00') == '2025-01-01 00:00'
+    assert _next('@hourly', '2024-12-31 23:30') == '2025-01-01 00:00'
+
+
+def test_schedule_that_never_fires_is_reported():
+    with pytest.raises(ValueError, match="不会触发"):
+        CronSchedule('0 0 30 2 *').next_after(datetime(2024, 1, 1))
+
+
+@pytest.mark.parametrize("expression", ['* * * *', '60 * * * *', '* 24 * * *', '0 0 0 * *', '* * * 13 *',
+                                        '* * * * 8', '*/0 * * * *', '5-1 * * * *', 'x * * * *', '* * * foo *'])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
@@ -0,0 +1,165 @@
+import atexit
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import dns_cache
+import notify
+from cron import CronSchedule
+from daemon import Daemon, _ScheduledTask
+from dns_cache import DnsCache
+
+
+@pytest.fixture
+def prewarm_config(monkeypatch):
+    monkeypatch.setattr(config, 'PREWARM_SECONDS', 5.0, raising=False)
+    monkeypatch.setattr(config, 'ENGINE', 'thread', raising=False)
+
+
+def _daemon_with(slots: dict[str, float]) -> Daemon:
+    """创建一个常驻调度器，各任务的下一次运行时间为现在起 slots[name] 秒后。"""
+    daemon = Daemon()
+    now = datetime.now()
+    for name, seconds in slots.items():
+        task = _ScheduledTask({"name": name, "har_file": f"{name}.har"}, CronSchedule('* * * * *'), now)
+        task.next_run = now + timedelta(seconds=seconds)
+        daemon._tasks[name] = task
+        daemon._task_order.append(name)
+    return daemon
+
+
+def _record_prewarms(daemon: Daemon) -> list[list[str]]:
+    calls = []
+    done = threading.Event()
+
+    def prewarm(task_configs):
+        calls.append([task_config["name"] for task_config in task_configs])
+        done.set()
+
+    daemon._prewarm = prewarm
+    daemon.prewarm_done = done
+    return calls
+
+
+def test_wakes_up_early_for_each_slot_that_has_not_been_prewarmed(prewarm_config):
+    daemon = _daemon_with({"a": 60})
+    assert daemon._seconds_until_next(1000) == pytest.approx(55, abs=0.5)
+
+    daemon._prewarmed_for = daemon._tasks["a"].next_run
+    assert daemon._seconds_until_next(1000) == pytest.approx(60, abs=0.5)
+
+    # 上一个时间点运行后任务被安排到下一个时间点，仍需提前醒来预热
+    daemon._tasks["a"].next_run = datetime.now() + timedelta(seconds=120)
+    assert daemon._seconds_until_next(1000) == pytest.approx(115, abs=0.5)
+    assert daemon._seconds_until_next(30) == 30
+
+
+def test_prewarm_starts_within_the_window_once_per_slot(prewarm_config):
+    daemon = _daemon_with({"soon": 60, "later": 600})
+    calls = _record_prewarms(daemon)
+
+    daemon._maybe_prewarm()
+    assert calls == []
+
+    daemon._tasks["soon"].next_run = datetime.now() + timedelta(seconds=3)
+    daemon._maybe_prewarm()
+    assert daemon.prewarm_done.wait(2)
+    daemon._maybe_prewarm()
+    assert calls == [["soon"]]
+
+    # 进入下一个时间点的预热窗口时再次预热
+    daemon.prewarm_done.clear()
+    daemon._tasks["soon"].next_run = datetime.now() + timedelta(seconds=4)
+    daemon._maybe_prewarm()
+    assert daemon.prewarm_done.wait(2)
+    assert calls == [["soon"], ["soon"]]
+
+
+def test_process_engine_skips_prewarm(prewarm_config, monkeypatch):
+    monkeypatch.setattr(config, 'ENGINE', 'process', raising=False)
+    daemon = _daemon_with({"a": 2})
+    calls = _record_prewarms(daemon)
+    daemon._maybe_prewarm()
+    assert calls == [] and daemon._prewarmed_for is None
+    assert daemon._seconds_until_next(1000) == pytest.approx(2, abs=0.5)
+
+
+def test_prewarm_resolves_har_hosts_through_the_dns_cache(prewarm_config, tmp_path, monkeypatch):
+    har = tmp_path / "a.har"
+    har.write_text(json.dumps({"log": {"entries": [
+        {"request": {"method": "GET", "url": "https://api.example.test/checkin", "headers": []}},
+        {"request": {"method": "GET", "url": "https://static.example.test/x", "headers": []}},
+    ]}}))
+    monkeypatch.setattr(config, 'PLAN_CACHE_ENABLED', False, raising=False)
+    monkeypatch.setattr(config, 'DNS_CACHE_ENABLED', True, raising=False)
+    monkeypatch.setattr(config, 'PREWARM_CONNECTIONS', False, raising=False)
+
+    resolved = []
+
+    def resolver(host):
+        resolved.append(host)
+        return [(2, 1, 6, '', ('10.0.0.1', 0))], 60
+
+    cache = DnsCache(resolver)
+    previous = dns_cache.set_dns_cache(cache)
+    try:
+        Daemon()._prewarm([{"name": "a", "har_file": str(har)}])
+    finally:
+        dns_cache.set_dns_cache(previous)
+    assert sorted(resolved) == ["api.example.test", "static.example.test"]
+    assert cache.lookup("api.example.test", 443) is not None
+
+
+@pytest.fixture
+def reloadable_env(monkeypatch, tmp_path):
+    """让 config.reload() 读取测试用的环境变量，结束后恢复配置与通知单例。"""
+    from test_notify import _StubPushService
+
+    stub = _StubPushService()
+    for key, value in {"WXPUSHER_APP_TOKEN": "old-token", "WXPUSHER_UIDS": "uid1", "WXPUSHER_API_URL": stub.url,
+                       "NOTIFY_OUTBOX_DIR": str(tmp_path / "outbox"), "NOTIFY_MERGE_WINDOW": "0",
+                       "NOTIFY_TIMEOUT": "5", "HISTORY_DB": str(tmp_path / "history.db")}.items():
+        monkeypatch.setenv(key, value)
+    config.reload()
+    monkeypatch.setattr(notify, '_notification_manager', None)
+    yield stub
+    manager = notify._notification_manager
+    if manager is not None:
+        atexit.unregister(manager.close)
+        manager.close(wait=True)
+    monkeypatch.undo()
+    config.reload()
+    stub.close()
+
+
+def test_config_reload_rebuilds_notifier_with_new_token(reloadable_env, monkeypatch):
+    notify.start_notifications()
+    notify.send_notification("before", "<p>1</p>")
+    assert notify.flush_notifications(5)
+
+    monkeypatch.setenv("WXPUSHER_APP_TOKEN", "new-token")
+    Daemon()._reload_config()
+    notify.send_notification("after", "<p>2</p>")
+    assert notify.flush_notifications(5)
+
+    tokens = {message["summary"]: message["appToken"] for message in reloadable_env.messages}
+    assert tokens == {"before": "old-token", "after": "new-token"}
+
+
+def test_config_reload_only_rebuilds_objects_whose_settings_changed(reloadable_env, monkeypatch):
+    import connection_pool
+    import rate_limiter
+
+    monkeypatch.setattr(connection_pool, '_default_pool', None)
+    monkeypatch.setattr(rate_limiter, '_limiter', None)
+    pool = connection_pool.get_pool()
+    limiter = rate_limiter.get_rate_limiter()
+    monkeypatch.setenv("RATE_LIMIT_PER_HOST", "7")
+    Daemon()._reload_config()
+
+    assert connection_pool.get_pool() is pool
+    assert rate_limiter.get_rate_limiter() is not limiter
+    assert rate_limiter.get_rate_limiter().default_rate == 7
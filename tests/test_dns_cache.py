@@ -0,0 +1,96 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import dns_cache
+from dns_cache import DnsCache
+
+_ADDRESS = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 0))
+
+
+class _StubResolver:
+    """记录解析次数的桩解析器；failing 中的主机解析失败。"""
+    def __init__(self, ttl=None, delay=0.0):
+        self.ttl = ttl
+        self.delay = delay
+        self.failing = set()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, host):
+        with self._lock:
+            self.calls.append(host)
+        time.sleep(self.delay)
+        if host in self.failing:
+            raise socket.gaierror(socket.EAI_NONAME, f"stub: unknown host {host}")
+        return [_ADDRESS], self.ttl
+
+
+def test_entries_expire_after_their_ttl():
+    resolver = _StubResolver(ttl=0.2)
+    cache = DnsCache(resolver, default_ttl=60)
+    assert cache.resolve('a.test', 443)[0][4] == ('10.0.0.1', 443)
+    assert cache.lookup('a.test', 80)[0][4] == ('10.0.0.1', 80)
+    cache.resolve('a.test', 443)
+    assert resolver.calls == ['a.test']
+
+    time.sleep(0.25)
+    assert cache.lookup('a.test', 443) is None
+    cache.resolve('a.test', 443)
+    assert resolver.calls == ['a.test', 'a.test']
+    assert cache.stats()["misses"] == 2
+
+
+def test_default_ttl_is_used_when_resolver_gives_none():
+    resolver = _StubResolver(ttl=None)
+    cache = DnsCache(resolver, default_ttl=0.1)
+    cache.resolve('a.test', 443)
+    time.sleep(0.15)
+    cache.resolve('a.test', 443)
+    assert len(resolver.calls) == 2
+
+
+def test_failed_lookup_is_negatively_cached(monkeypatch):
+    monkeypatch.setattr(dns_cache, '_NEGATIVE_TTL_SECONDS', 0.2)
+    resolver = _StubResolver()
+    resolver.failing.add('dead.test')
+    cache = DnsCache(resolver)
+
+    for _ in range(3):
+        with pytest.raises(socket.gaierror):
+            cache.resolve('dead.test', 443)
+    assert resolver.calls == ['dead.test']
+    assert cache.stats()["negative_hits"] == 2
+    # 预解析同样跳过仍在负缓存期内的主机
+    assert cache.prefetch(['dead.test'], wait=True) == 0
+
+    time.sleep(0.25)
+    resolver.failing.clear()
+    assert cache.resolve('dead.test', 443)
+    assert resolver.calls == ['dead.test', 'dead.test']
+
+
+def test_stale_entry_is_served_when_re_resolution_fails():
+    resolver = _StubResolver(ttl=0.05)
+    cache = DnsCache(resolver)
+    cache.resolve('a.test', 443)
+    time.sleep(0.1)
+    resolver.failing.add('a.test')
+    assert cache.resolve('a.test', 443)[0][4] == ('10.0.0.1', 443)
+    # 沿用的旧记录在 _STALE_RETRY_SECONDS 内不会再触发解析
+    cache.resolve('a.test', 443)
+    assert resolver.calls == ['a.test', 'a.test']
+    assert cache.stats()["stale"] == 1
+
+
+def test_concurrent_lookups_of_one_host_resolve_once():
+    resolver = _StubResolver(delay=0.1)
+    cache = DnsCache(resolver)
+    threads = [threading.Thread(target=cache.resolve, args=('a.test', 443)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert resolver.calls == ['a.test']
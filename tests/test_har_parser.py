@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+
+from har_parser import _iter_request_infos, _JsonStream, parse_har
+
+_TRICKY_STRINGS = [
+    'plain',
+    'quote " inside',
+    'backslash \\ and \\" escaped quote',
+    'braces { [ ] } in text',
+    'trailing backslash \\',
+    'unicode 签到   \U0001f600',
+    '',
+]
+
+
+def _har() -> dict:
+    entries = []
+    for i, text in enumerate(_TRICKY_STRINGS):
+        entries.append({
+            "startedDateTime": "2024-01-01T00:00:00Z",
+            "request": {
+                "method": "POST",
+                "url": f"https://example.test/api/{i}?q={i}",
+                "headers": [{"name": "X-Note", "value": text}],
+                "postData": {"mimeType": "application/json", "text": json.dumps({"text": text, "n": [i, -1.5e3]})},
+            },
+            "response": {"status": 200, "content": {"text": text * 3, "size": 123}},
+            "timings": {"wait": 1.25, "receive": 0},
+        })
+    entries.append({"request": {"method": "GET", "url": "https://example.test/logo.png", "headers": []}})
+    return {"log": {"version": "1.2", "creator": {"name": "t"}, "entries": entries, "pages": []}}
+
+
+class _Trickle(io.StringIO):
+    """每次 read 最多返回 size 个字符，用于覆盖所有可能的分块边界。"""
+    def __init__(self, text: str, size: int):
+        super().__init__(text)
+        self._size = size
+
+    def read(self, size=-1):
+        return super().read(self._size)
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_request_infos_match_json_load_at_every_chunk_boundary(chunk, indent):
+    har = _har()
+    text = json.dumps(har, indent=indent, ensure_ascii=indent is None)
+    expected = [entry["request"] for entry in har["log"]["entries"]]
+    assert list(_iter_request_infos(_Trickle(text, chunk))) == expected
+
+
+@pytest.mark.parametrize("value", ['"a\\"b\\\\"', '{"k": ["}", "\\\\", {"x": "]"}]}', '-12.5e-3', 'true', 'null'])
+def test_scan_value_captures_exact_raw_text(value):
+    stream = _JsonStream(_Trickle(f'[{value} , 1]', 1), chunk_size=1)
+    stream.expect('[')
+    assert stream.scan_value(capture=True) == value
+    stream.expect(',')
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    text = json.dumps(_har())
+    path = tmp_path / "cut.har"
+    path.write_text(text[:len(text) // 2], encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_request_infos(_Trickle(text[:len(text) // 2], 5)))
+    assert parse_har(str(path)) is None
+
+
+def test_parse_har_skips_static_resources_and_pseudo_headers(tmp_path):
+    har = _har()
+    har["log"]["entries"][0]["request"]["headers"].append({"name": ":authority", "value": "example.test"})
+    path = tmp_path / "a.har"
+    path.write_text(json.dumps(har), encoding='utf-8')
+    plans = parse_har(str(path))
+    assert [plan.path for plan in plans] == [f"/api/{i}?q={i}" for i in range(len(_TRICKY_STRINGS))]
+    assert plans[0].headers[0] == ("X-Note", "plain")
+    assert all(not name.startswith(':') for plan in plans for name, _ in plan.headers)
@@ -0,0 +1,86 @@
+import json
+import time
+
+from history_store import HistoryStore
+
+_OK = [{"name": "t", "success": True, "duration": 1.0, "message": "任务完成"}]
+_FAILED = [{"name": "t", "success": False, "duration": 1.0, "message": "任务失败"}]
+
+
+def test_successful_day_is_counted_once_per_date(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    try:
+        store.record_run(_OK, 1.0, "2026-01-01 08:00:00")
+        summary = store.record_run(_OK, 1.0, "2026-01-01 12:00:00")
+        assert (summary["successful_days"], summary["current_streak"], summary["total_runs"]) == (1, 1, 2)
+
+        summary = store.record_run(_OK, 1.0, "2026-01-02 08:00:00")
+        assert (summary["successful_days"], summary["current_streak"], summary["longest_streak"]) == (2, 2, 2)
+    finally:
+        store.close()
+
+
+def test_failure_resets_streak_and_same_day_success_restarts_it(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    try:
+        store.record_run(_OK, 1.0, "2026-01-01 08:00:00")
+        summary = store.record_run(_FAILED, 1.0, "2026-01-01 09:00:00")
+        assert (summary["successful_days"], summary["current_streak"]) == (1, 0)
+
+        summary = store.record_run(_OK, 1.0, "2026-01-01 10:00:00")
+        assert (summary["successful_days"], summary["current_streak"]) == (1, 1)
+        summary = store.record_run(_OK, 1.0, "2026-01-01 11:00:00")
+        assert (summary["successful_days"], summary["current_streak"]) == (1, 1)
+    finally:
+        store.close()
+
+
+def test_counted_date_survives_reopen(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    store.record_run(_OK, 1.0, "2026-01-01 08:00:00")
+    store.close()
+
+    store = HistoryStore(path)
+    try:
+        summary = store.record_run(_OK, 1.0, "2026-01-01 20:00:00")
+        assert summary["successful_days"] == 1
+        assert set(store.summary()) == set(summary)
+    finally:
+        store.close()
+
+
+def _write_legacy(tmp_path, **status):
+    path = tmp_path / "status.json"
+    path.write_text(json.dumps(status, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_migrated_success_day_is_not_counted_again(tmp_path):
+    legacy = _write_legacy(tmp_path, successful_days=5, last_run_status="成功", last_run_time="2026-01-01 08:00:00")
+    store = HistoryStore(str(tmp_path / "history.db"), legacy)
+    try:
+        assert store.summary()["successful_days"] == 5
+        assert store.record_run(_OK, 1.0, "2026-01-01 20:00:00")["successful_days"] == 5
+        assert store.record_run(_OK, 1.0, "2026-01-02 08:00:00")["successful_days"] == 6
+    finally:
+        store.close()
+
+
+def test_migrated_failed_run_does_not_block_the_same_day(tmp_path):
+    legacy = _write_legacy(tmp_path, successful_days=5, last_run_status="失败", last_run_time="2026-01-01 08:00:00")
+    store = HistoryStore(str(tmp_path / "history.db"), legacy)
+    try:
+        assert store.record_run(_OK, 1.0, "2026-01-01 20:00:00")["successful_days"] == 6
+    finally:
+        store.close()
+
+
+def test_migrated_success_without_time_counts_as_today(tmp_path):
+    legacy = _write_legacy(tmp_path, successful_days=5, last_run_status="成功")
+    store = HistoryStore(str(tmp_path / "history.db"), legacy)
+    try:
+        today = time.strftime("%Y-%m-%d", time.localtime())
+        assert store.record_run(_OK, 1.0, f"{today} 23:59:00")["successful_days"] == 5
+    finally:
+        store.close()
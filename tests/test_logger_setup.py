@@ -0,0 +1,63 @@
+import logging
+import time
+
+from logger_setup import BatchingFileHandler
+
+
+class _CountingHandler(BatchingFileHandler):
+    def __init__(self, *args, **kwargs):
+        self.syncs = 0
+        super().__init__(*args, **kwargs)
+
+    def _sync(self):
+        self.syncs += 1
+        super()._sync()
+
+
+def _record(message: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord('CheckinTask', level, __file__, 0, message, None, None)
+
+
+def _wait_for(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_interval_durability_syncs_after_burst_followed_by_idle(tmp_path):
+    handler = _CountingHandler(str(tmp_path / 'task.log'), durability='interval', interval_ms=200)
+    try:
+        # 第一条记录会立即 fsync (距上次 fsync 已超过 interval)，先等它完成
+        time.sleep(0.25)
+        handler.emit(_record('first'))
+        handler.flush()
+        assert _wait_for(lambda: handler.syncs == 1)
+
+        # 紧接着的一阵记录不到 interval，之后不再有新记录
+        handler.emit(_record('second'))
+        handler.emit(_record('third'))
+        handler.flush()
+        assert _wait_for(lambda: handler.syncs == 2, timeout=1.0)
+
+        # 没有新的记录时不再 fsync
+        time.sleep(0.5)
+        assert handler.syncs == 2
+    finally:
+        handler.close()
+    assert (tmp_path / 'task.log').read_text().splitlines() == ['first', 'second', 'third']
+
+
+def test_shutdown_durability_only_syncs_on_close(tmp_path):
+    handler = _CountingHandler(str(tmp_path / 'task.log'), durability='shutdown', interval_ms=50)
+    handler.emit(_record('a'))
+    handler.flush()
+    time.sleep(0.2)
+    assert handler.syncs == 0
+    handler.emit(_record('boom', logging.ERROR))
+    handler.flush()
+    assert _wait_for(lambda: handler.syncs == 1)
+    handler.close()
+    assert handler.syncs == 2
@@ -0,0 +1,86 @@
+import pytest
+
+from metrics import MetricsRegistry, RequestTimings
+
+
+def test_since_reports_only_requests_after_the_baseline():
+    registry = MetricsRegistry()
+    registry.record_request("a", "old.example", RequestTimings(total=2.0, bytes_out=10), True)
+    registry.record_request("a", "both.example", RequestTimings(total=2.0), True)
+    baseline = registry.snapshot()
+
+    registry.record_request("a", "both.example", RequestTimings(total=0.02, bytes_out=5), True)
+    registry.record_retry("a", "both.example")
+    run = registry.since(baseline)
+
+    rows = run.host_summary()
+    assert [row["host"] for row in rows] == ["both.example"]
+    assert rows[0]["count"] == 1 and rows[0]["p95"] <= 0.025
+    text = run.render_prometheus()
+    assert 'checkin_retries_total{host="both.example",task="a"} 1' in text
+    assert 'checkin_bytes_sent_total{host="both.example"} 5' in text
+    assert "old.example" not in text
+    # 全局汇总保持累计
+    assert {row["host"]: row["count"] for row in registry.host_summary()} == {"both.example": 2, "old.example": 1}
+
+
+def test_quantile_interpolates_within_buckets():
+    registry = MetricsRegistry()
+    # 10 个请求落在 (0.05, 0.1] 桶，10 个落在 (0.25, 0.5] 桶
+    for total in [0.08] * 10 + [0.3] * 10:
+        registry.record_request("t", "h", RequestTimings(total=total), True)
+    row = registry.host_summary()[0]
+    assert row["count"] == 20
+    assert row["p50"] == pytest.approx(0.1)
+    assert row["p95"] == pytest.approx(0.25 + 0.25 * 9 / 10)
+
+
+def test_quantile_of_overflow_bucket_is_its_lower_bound():
+    registry = MetricsRegistry()
+    registry.record_request("t", "h", RequestTimings(total=120.0), True)
+    assert registry.host_summary()[0]["p95"] == 60.0
+    assert MetricsRegistry().host_summary() == []
+
+
+def test_prometheus_rendering():
+    registry = MetricsRegistry()
+    registry.record_request('任务"1"', "h", RequestTimings(dns=0.002, connect=0.003, total=0.02,
+                                                       bytes_out=100, bytes_in=50, bytes_decoded=80), True)
+    registry.record_request('任务"1"', "h", RequestTimings(total=0.7), False)
+    registry.record_rate_limit_wait("h", 0.5)
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines[:2] == ["# HELP checkin_request_phase_seconds Time spent in each phase of an HTTP request.",
+                         "# TYPE checkin_request_phase_seconds histogram"]
+    # 直方图的桶是累计的，标签值中的引号被转义
+    base = 'phase="total",task="任务\\"1\\""'
+    assert f'checkin_request_phase_seconds_bucket{{{base},le="0.025"}} 1' in lines
+    assert f'checkin_request_phase_seconds_bucket{{{base},le="0.5"}} 1' in lines
+    assert f'checkin_request_phase_seconds_bucket{{{base},le="1.0"}} 2' in lines
+    assert f'checkin_request_phase_seconds_bucket{{{base},le="+Inf"}} 2' in lines
+    assert f'checkin_request_phase_seconds_count{{{base}}} 2' in lines
+    # 复用连接的请求没有 dns 阶段，不计入该阶段的直方图
+    assert 'checkin_request_phase_seconds_count{phase="dns",host="h"} 1' in lines
+    assert 'checkin_requests_total{host="h",task="任务\\"1\\"",outcome="failure"} 1' in lines
+    assert 'checkin_bytes_decoded_total{host="h"} 80' in lines
+    assert 'checkin_rate_limit_wait_seconds_total{host="h"} 0.5' in lines
+    assert lines.count("# TYPE checkin_requests_total counter") == 1
+
+
+def test_snapshot_merge_adds_up():
+    first, second = MetricsRegistry(), MetricsRegistry()
+    first.record_request("t", "h", RequestTimings(total=0.01), True)
+    second.record_request("t", "h", RequestTimings(total=0.02), True)
+    second.record_retry("t", "h")
+    first.merge(second.snapshot())
+    assert first.host_summary()[0]["count"] == 2
+    assert 'checkin_retries_total{host="h",task="t"} 1' in first.render_prometheus()
+
+
+def test_write_file_replaces_atomically(tmp_path):
+    registry = MetricsRegistry()
+    registry.record_request("t", "h", RequestTimings(total=0.01), True)
+    path = tmp_path / "metrics.prom"
+    registry.write_file(str(path))
+    assert path.read_text(encoding='utf-8') == registry.render_prometheus()
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]
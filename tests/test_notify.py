@@ -0,0 +1,142 @@
+import http.server
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import config
+from notify import WxPusherNotifier
+from notify_dispatcher import NotificationDispatcher
+from retry_policy import RetryPolicy
+
+
+class _FixedBackoff(RetryPolicy):
+    """退避时间固定的重试策略，便于测试。"""
+    def backoff(self, retry_num: int) -> float:
+        return self.base_delay
+
+
+class _StubPushService:
+    """本地替身推送服务，记录收到的消息；ok 为 False 时返回 500。"""
+    def __init__(self):
+        self.ok = True
+        self.messages = []
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.messages.append(payload)
+                body = json.dumps({"code": 1000 if stub.ok else 500, "msg": "stub"}).encode()
+                self.send_response(200 if stub.ok else 500)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/send/message"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def push_service(monkeypatch):
+    stub = _StubPushService()
+    monkeypatch.setattr(config, 'WXPUSHER_APP_TOKEN', 'token', raising=False)
+    monkeypatch.setattr(config, 'WXPUSHER_UIDS', 'uid1', raising=False)
+    monkeypatch.setattr(config, 'WXPUSHER_API_URL', stub.url, raising=False)
+    monkeypatch.setattr(config, 'NOTIFY_TIMEOUT', 5.0, raising=False)
+    yield stub
+    stub.close()
+
+
+def _dispatcher(outbox, merge_window=0.0, retry=None):
+    notifier = WxPusherNotifier()
+    dispatcher = NotificationDispatcher({notifier.name: notifier}, str(outbox), merge_window,
+                                        retry or _FixedBackoff(max_attempts=3, base_delay=0.05))
+    return dispatcher, notifier
+
+
+def test_unsent_notification_stays_in_outbox_and_is_replayed(push_service, tmp_path):
+    push_service.ok = False
+    first, notifier = _dispatcher(tmp_path, retry=_FixedBackoff(max_attempts=2, base_delay=0.05))
+    first.submit('wxpusher', '签到任务成功', '<p>ok</p>')
+    assert first.flush(5) is False
+    first.close(0)
+    notifier.close()
+    assert len(push_service.messages) == 2
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.json')]) == 1
+
+    push_service.ok = True
+    second, notifier = _dispatcher(tmp_path)
+    second.start()
+    assert second.flush(5) is True
+    second.close(0)
+    notifier.close()
+    assert push_service.messages[-1]["summary"] == '签到任务成功'
+    assert push_service.messages[-1]["content"] == '<p>ok</p>'
+    assert os.listdir(tmp_path) == []
+
+
+def _wait_for_messages(push_service, count):
+    deadline = time.monotonic() + 5
+    while len(push_service.messages) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.1)
+
+
+def test_notifications_within_merge_window_are_sent_as_one(push_service, tmp_path):
+    dispatcher, notifier = _dispatcher(tmp_path, merge_window=0.3)
+    try:
+        for i in range(3):
+            dispatcher.submit('wxpusher', f"标题{i}", f"**{i}**", content_type=3)
+        _wait_for_messages(push_service, 1)
+        assert len(push_service.messages) == 1
+        message = push_service.messages[0]
+        assert message["summary"] == "标题0 等3条通知"
+        assert message["content"] == "**0**\n\n---\n\n**1**\n\n---\n\n**2**"
+    finally:
+        dispatcher.close(1)
+        notifier.close()
+
+
+def test_html_notifications_are_not_merged(push_service, tmp_path):
+    dispatcher, notifier = _dispatcher(tmp_path, merge_window=0.3)
+    try:
+        documents = [f"<html><body><p>{i}</p></body></html>" for i in range(2)]
+        for i, document in enumerate(documents):
+            dispatcher.submit('wxpusher', f"标题{i}", document)
+        _wait_for_messages(push_service, 2)
+        assert [m["content"] for m in push_service.messages] == documents
+        assert [m["summary"] for m in push_service.messages] == ["标题0", "标题1"]
+    finally:
+        dispatcher.close(1)
+        notifier.close()
+
+
+def test_flush_is_bounded_while_backing_off(push_service, tmp_path):
+    push_service.ok = False
+    dispatcher, notifier = _dispatcher(tmp_path, retry=_FixedBackoff(max_attempts=5, base_delay=30))
+    try:
+        dispatcher.submit('wxpusher', '签到任务失败', '<p>x</p>')
+        start = time.monotonic()
+        assert dispatcher.flush(0.5) is False
+        assert 0.4 <= time.monotonic() - start < 2
+        # 第一次失败后进入 30 秒的退避，flush 期间不再重试
+        assert len(push_service.messages) == 1
+
+        # close 只使用 flush 剩余的等待时间，不再等待一个完整的 timeout
+        start = time.monotonic()
+        dispatcher.close(10)
+        assert time.monotonic() - start < 1
+    finally:
+        notifier.close()
+    assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,36 @@
+import os
+import pickle
+import threading
+
+import config
+import plan_cache
+
+
+def test_concurrent_writers_use_separate_temp_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'PLAN_CACHE_DIR', str(tmp_path), raising=False)
+    cache_path = plan_cache._cache_path(str(tmp_path / 'a.har'))
+    writers = 8
+    # 所有写入方都写完临时文件后再一起重命名，模拟同时写入同一缓存
+    barrier = threading.Barrier(writers)
+    real_dump = pickle.dump
+
+    def dump_then_wait(obj, f, *args, **kwargs):
+        real_dump(obj, f, *args, **kwargs)
+        f.flush()
+        barrier.wait(timeout=5)
+
+    monkeypatch.setattr(plan_cache.pickle, 'dump', dump_then_wait)
+    failures = []
+    monkeypatch.setattr(plan_cache.logger, 'warning', failures.append)
+
+    entries = [{'version': plan_cache._CACHE_VERSION, 'writer': i, 'payload': 'x' * (1000 * (i + 1))}
+               for i in range(writers)]
+    threads = [threading.Thread(target=plan_cache._write_entry, args=(cache_path, entry)) for entry in entries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert plan_cache._read_entry(cache_path) in entries
+    assert os.listdir(tmp_path) == [os.path.basename(cache_path)]
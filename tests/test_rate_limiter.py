@@ -0,0 +1,73 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from rate_limiter import HostRateLimiter, _parse_host_limits, parse_retry_after
+
+
+def test_burst_then_steady_rate():
+    limiter = HostRateLimiter(default_rate=10, default_burst=3)
+    waits = [limiter.reserve("api.example.test") for _ in range(6)]
+    # 空闲时可以连续突发 3 个请求，之后每 0.1 秒一个
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3:] == pytest.approx([0.1, 0.2, 0.3], abs=0.01)
+
+
+def test_reservation_beyond_max_wait_is_not_taken():
+    limiter = HostRateLimiter(default_rate=10, default_burst=1)
+    assert limiter.reserve("h") == 0.0
+    assert limiter.reserve("h", max_wait=0.05) is None
+    # 被拒绝的预约不占用令牌
+    assert limiter.reserve("h", max_wait=1) == pytest.approx(0.1, abs=0.01)
+
+
+def test_unused_tokens_accumulate_up_to_the_burst():
+    limiter = HostRateLimiter(default_rate=20, default_burst=2)
+    for _ in range(4):
+        limiter.reserve("h")
+    time.sleep(0.3)
+    waits = [limiter.reserve("h") for _ in range(3)]
+    assert waits[:2] == [0.0, 0.0] and waits[2] == pytest.approx(0.05, abs=0.01)
+
+
+def test_hosts_are_limited_independently_and_per_host_limits_apply():
+    limiter = HostRateLimiter(host_limits=_parse_host_limits("slow.test=1:1, fast.test:8443=100"))
+    assert limiter.reserve("slow.test") == 0.0
+    assert limiter.reserve("slow.test") == pytest.approx(1.0, abs=0.01)
+    assert limiter.reserve("slow.test:443") == 0.0   # 端口不同的 netloc 按主机名匹配限额，但各自计数
+    assert limiter.reserve("other.test") == 0.0
+    assert limiter.reserve("other.test") == 0.0
+    assert limiter._bucket("fast.test:8443").interval == pytest.approx(0.01)
+
+
+def test_no_limits_means_no_waiting():
+    limiter = HostRateLimiter()
+    assert all(limiter.reserve("h") == 0.0 for _ in range(100))
+
+
+def test_pause_delays_all_requests_to_the_host_up_to_max_pause():
+    limiter = HostRateLimiter(max_pause=2)
+    limiter.pause("h", 30)
+    assert limiter.reserve("h") == pytest.approx(2, abs=0.01)
+    assert limiter.reserve("h") == pytest.approx(2, abs=0.01)
+    assert limiter.reserve("other") == 0.0
+    limiter.pause("h", -5)
+    assert limiter.reserve("h") == pytest.approx(2, abs=0.01)
+
+
+def test_parse_host_limits_uses_default_burst_and_skips_bad_items(monkeypatch):
+    import config
+    monkeypatch.setattr(config, 'RATE_LIMIT_BURST', 7, raising=False)
+    assert _parse_host_limits("A.test=2:5, b.test=0.5, bad=x, ") == {"a.test": (2.0, 5), "b.test": (0.5, 7)}
+
+
+@pytest.mark.parametrize("value, expected", [("120", 120.0), (" 0 ", 0.0), (None, None), ("", None),
+                                             ("soon", None), ("-5", None)])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    assert parse_retry_after(formatdate(time.time() + 60, usegmt=True)) == pytest.approx(60, abs=2)
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
@@ -0,0 +1,57 @@
+import re
+
+import pytest
+
+from report import render_report
+
+
+def _results(n: int, message: str = "签到成功，获得 {reward_days} 天") -> list[dict]:
+    return [{"name": f"任务{i:03d}", "success": i % 7 != 3, "duration": 1.5, "message": message} for i in range(n)]
+
+
+def _report(n: int = 60, **kwargs):
+    hosts = [{"host": f"h{i}.example.test", "count": 3, "p50": 0.01, "p95": 0.2} for i in range(5)]
+    return render_report(_results(n), 12.0, "累计签到: 10天", {"reward_days": 30}, host_rows=hosts, **kwargs)
+
+
+def _rows(html: str) -> list[str]:
+    return re.findall(r'<tr><td>([^<]+)</td>', html)
+
+
+def test_small_report_is_a_single_chunk():
+    report = _report(3)
+    assert report.chunks(None) == [report.render()]
+    assert report.chunks(100_000) == [report.render()]
+    assert "获得 30 天" in report.render() and "第 1/1 部分" not in report.render()
+
+
+@pytest.mark.parametrize("limit", [2500, 4000, 8000])
+def test_chunks_respect_the_limit_and_keep_every_row_once(limit):
+    report = _report()
+    full = report.render()
+    chunks = report.chunks(limit)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= limit for chunk in chunks)
+    # 每份都是完整的 HTML 文档，带有编号
+    for index, chunk in enumerate(chunks, 1):
+        assert chunk.startswith('<html>') and chunk.endswith('</body></html>')
+        assert chunk.count('<table>') == chunk.count('</table>') >= 1
+        assert f"第 {index}/{len(chunks)} 部分" in chunk
+    assert [row for chunk in chunks for row in _rows(chunk)] == _rows(full)
+
+
+def test_oversized_row_gets_its_own_chunk():
+    results = _results(3)
+    results[1]["message"] = "x" * 5000
+    report = render_report(results, 1.0, "", {})
+    chunks = report.chunks(3000)
+    assert [len(_rows(chunk)) for chunk in chunks] == [1, 1, 1]
+    assert len(chunks[1]) > 3000 and all(len(chunk) <= 3000 for chunk in (chunks[0], chunks[2]))
+
+
+def test_compact_mode_collapses_successful_tasks():
+    html = _report(20, compact=True).render()
+    failed = [r["name"] for r in _results(20) if not r["success"]]
+    assert _rows(html)[0] == f"{20 - len(failed)} 个任务"
+    assert _rows(html)[1:1 + len(failed)] == failed
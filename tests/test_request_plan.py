@@ -0,0 +1,71 @@
+import pytest
+
+import blob_store
+import config
+from blob_store import BlobRef
+from request_plan import compile_request
+
+
+def test_compile_request_splits_url_and_recomputes_length_headers():
+    plan = compile_request('post', 'https://api.example.test:8443/v1/checkin?day=1', {
+        'Content-Type': 'application/json',
+        'Content-Length': '999',
+        'Accept-Encoding': 'br',
+        'Transfer-Encoding': 'chunked',
+        'Cookie': 'sid=abc; theme=dark',
+        'X-Token': 't',
+    }, '{"a": "签到"}')
+
+    assert (plan.method, plan.scheme, plan.host, plan.port) == ('POST', 'https', 'api.example.test', 8443)
+    assert plan.netloc == 'api.example.test:8443'
+    assert plan.path == '/v1/checkin?day=1'
+    assert plan.body == '{"a": "签到"}'.encode('utf-8')
+    assert plan.headers == (('Content-Type', 'application/json'), ('X-Token', 't'),
+                            ('Content-Length', str(len(plan.body))))
+    assert plan.cookie == 'sid=abc; theme=dark'
+    assert plan.cookie_pairs == (('sid', 'sid=abc'), ('theme', 'theme=dark'))
+    assert not plan.skip_host
+
+
+@pytest.mark.parametrize("method, expected", [('POST', (('Content-Length', '0'),)), ('GET', ())])
+def test_empty_body_sends_content_length_only_for_body_methods(method, expected):
+    plan = compile_request(method, 'http://example.test', {}, None)
+    assert plan.body is None and plan.headers == expected
+    assert plan.path == '/'
+
+
+def test_explicit_host_header_is_kept():
+    plan = compile_request('GET', 'http://10.0.0.1/x', {'Host': 'example.test'}, None)
+    assert plan.skip_host and plan.headers == (('Host', 'example.test'),)
+
+
+def test_plan_is_immutable():
+    plan = compile_request('GET', 'http://example.test/', {}, None)
+    with pytest.raises(AttributeError):
+        plan.method = 'POST'
+
+
+def test_redirect_to_becomes_bodyless_get_on_the_new_host():
+    plan = compile_request('POST', 'https://a.example.test/login', {
+        'Host': 'a.example.test', 'Content-Type': 'application/x-www-form-urlencoded', 'Cookie': 'sid=1',
+    }, 'user=x')
+    redirected = plan.redirect_to('http://b.example.test:8080/home?ok=1')
+
+    assert (redirected.method, redirected.scheme, redirected.host, redirected.port) == ('GET', 'http', 'b.example.test', 8080)
+    assert redirected.netloc == 'b.example.test:8080' and redirected.path == '/home?ok=1'
+    assert redirected.body is None and not redirected.skip_host
+    assert redirected.headers == (('Content-Type', 'application/x-www-form-urlencoded'),)
+    assert redirected.cookie == 'sid=1'
+    # 原计划保持不变
+    assert plan.method == 'POST' and plan.body == b'user=x'
+
+
+def test_large_body_is_kept_in_the_blob_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'BLOB_DIR', str(tmp_path), raising=False)
+    monkeypatch.setattr(config, 'BLOB_MIN_BYTES', 16, raising=False)
+    body = b'\x00\x01' * 32
+    plan = compile_request('PUT', 'http://example.test/upload', {}, body)
+    assert isinstance(plan.body, BlobRef) and len(plan.body) == len(body)
+    assert ('Content-Length', str(len(body))) in plan.headers
+    assert bytes(plan.body.view()) == body
+    blob_store.close()
@@ -0,0 +1,33 @@
+import pytest
+
+from response_check import SuccessCheck
+from task_runner import load_task_requests
+
+
+@pytest.mark.parametrize("contains", [5, {"text": "ok"}, ["ok", 1]])
+def test_contains_must_be_text(contains):
+    with pytest.raises(ValueError, match="success_check.contains"):
+        SuccessCheck({"contains": contains})
+
+
+@pytest.mark.parametrize("steps", [3, "2", [0], [1, "2"], [True]])
+def test_steps_must_be_a_list_of_step_numbers(steps):
+    with pytest.raises(ValueError, match="success_check.steps"):
+        SuccessCheck({"steps": steps})
+
+
+def test_valid_contains_and_steps():
+    check = SuccessCheck({"contains": ["签到成功", "ok"], "steps": [2]})
+    assert check.needles == ("签到成功".encode('utf-8'), b"ok")
+    assert not check.applies_to(1) and check.applies_to(2)
+    assert SuccessCheck({"contains": "ok"}).needles == (b"ok",)
+
+
+@pytest.mark.parametrize("spec", [{"contains": 5}, {"steps": 3}])
+def test_bad_field_is_reported_as_task_config_error(tmp_path, spec):
+    har = tmp_path / "a.har"
+    har.write_text("{}")
+    requests_list, failure = load_task_requests({"name": "t", "har_file": str(har), "success_check": spec})
+    assert requests_list is None
+    assert failure["success"] is False
+    assert failure["message"].startswith("任务配置错误: success_check.")
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+import retry_policy
+from response_check import SendResult
+from retry_policy import CircuitBreaker, RetryBudget, RetryPolicy, next_retry_delay
+
+
+@pytest.mark.parametrize("value", ["false", "0", 0, 1, None])
+def test_retry_check_failures_must_be_a_bool(value):
+    with pytest.raises(ValueError, match="retry_check_failures"):
+        RetryPolicy.from_task({"retry": {"retry_check_failures": value}})
+
+
+def test_retry_check_failures_accepts_json_booleans():
+    assert RetryPolicy.from_task({"retry": {"retry_check_failures": True}}).retry_check_failures is True
+    assert RetryPolicy.from_task({"retry": {"retry_check_failures": False}}).retry_check_failures is False
+    assert RetryPolicy.from_task({}).retry_check_failures is False
+
+
+_OK = SendResult(True, "OK", 200)
+_NETWORK = SendResult(False, "网络错误", error='network')
+_NOT_FOUND = SendResult(False, "404", 404, 'status')
+
+
+def test_retry_budget_limits_retries_to_a_share_of_requests():
+    budget = RetryBudget(ratio=0.5, capacity=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+    # 令牌数不超过 capacity
+    for _ in range(100):
+        budget.deposit()
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+
+
+def test_circuit_opens_after_consecutive_failures_and_half_opens_after_reset():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    policy = RetryPolicy()
+
+    breaker.record("h", _NETWORK, policy)
+    assert breaker.allow("h")
+    breaker.record("h", _NETWORK, policy)
+    assert not breaker.allow("h")
+    assert breaker.allow("other")
+
+    time.sleep(0.06)
+    # 半开: 只放行一个探测请求，探测失败后重新打开
+    assert breaker.allow("h")
+    assert not breaker.allow("h")
+    breaker.record("h", _NETWORK, policy)
+    assert not breaker.allow("h")
+
+    time.sleep(0.06)
+    assert breaker.allow("h")
+    breaker.record("h", _OK, policy)
+    assert breaker.allow("h") and breaker.allow("h")
+
+
+def test_deterministic_failures_do_not_count_towards_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2)
+    policy = RetryPolicy()
+    for result in (_NETWORK, _NOT_FOUND, _NETWORK, SendResult(False, "x", 200, 'check')):
+        breaker.record("h", result, policy)
+    assert breaker.allow("h")
+    breaker.record("h", SendResult(False, "503", 503, 'status'), policy)
+    breaker.record("h", _NETWORK, policy)
+    assert not breaker.allow("h")
+
+
+def test_next_retry_delay_respects_attempts_retryability_and_budget(monkeypatch):
+    budget = RetryBudget(ratio=0, capacity=1)
+    monkeypatch.setattr(retry_policy, '_budget', budget)
+    policy = RetryPolicy(max_attempts=3, base_delay=1, max_delay=1)
+
+    assert next_retry_delay(policy, 0, _NOT_FOUND) is None
+    assert next_retry_delay(policy, 2, _NETWORK) is None
+    assert 0 <= next_retry_delay(policy, 0, _NETWORK) <= 1
+    # 预算已耗尽
+    assert next_retry_delay(policy, 1, _NETWORK) is None
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    assert all(0 <= policy.backoff(n) <= min(5, 2 ** (n - 1)) for n in range(1, 10) for _ in range(20))
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+import round_scheduler
+import task_runner
+from round_scheduler import RoundScheduler
+
+
+class _Rounds(list):
+    """各轮的开始记录 [(任务名, 轮次, 开始时间)]；fail 中的 (任务名, 轮次) 返回失败。"""
+    def __init__(self):
+        super().__init__()
+        self.fail = set()
+
+
+@pytest.fixture
+def rounds(monkeypatch):
+    """替换 run_round，只记录各轮的开始时间。"""
+    started = _Rounds()
+    lock = threading.Lock()
+
+    def run_round(task_name, requests_list, round_idx, count, success_check, retry_policy, cancel=None):
+        with lock:
+            started.append((task_name, round_idx, time.monotonic()))
+        if (task_name, round_idx) in started.fail:
+            return False, "步骤 1 失败 - 状态码 500"
+        return True, ""
+
+    monkeypatch.setattr(round_scheduler, 'run_round', run_round)
+    return started
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RoundScheduler(max_workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_interval_waits_do_not_block_other_tasks(rounds, scheduler):
+    slow = scheduler.submit({"name": "slow", "count": 3, "interval_seconds": 0.1}, [])
+    fast = scheduler.submit({"name": "fast", "count": 3}, [])
+    assert fast.result(2)["success"] and slow.result(2)["success"]
+
+    slow_starts = [at for name, _, at in rounds if name == "slow"]
+    assert [idx for name, idx, _ in rounds if name == "slow"] == [0, 1, 2]
+    assert all(b - a >= 0.09 for a, b in zip(slow_starts, slow_starts[1:]))
+    # 单个工作线程在 slow 的间隔等待期间跑完了 fast 的所有轮次
+    fast_done = max(at for name, _, at in rounds if name == "fast")
+    assert fast_done < slow_starts[1]
+
+
+def test_failed_round_stops_remaining_rounds(rounds, scheduler):
+    rounds.fail.add(("t", 1))
+    result = scheduler.submit({"name": "t", "count": 5, "fail_msg": "签到失败"}, []).result(2)
+    assert not result["success"]
+    assert result["message"] == "签到失败: 步骤 1 失败 - 状态码 500"
+    assert [idx for _, idx, _ in rounds] == [0, 1]
+
+
+def test_concurrent_rounds_report_the_failing_round(rounds, scheduler):
+    rounds.fail.add(("t", 0))
+    result = scheduler.submit({"name": "t", "count": 4, "concurrency": 2, "fail_msg": "失败"}, []).result(2)
+    assert not result["success"] and result["message"].startswith("失败: 第 1 轮")
+
+
+def test_round_exception_is_raised_from_the_future(monkeypatch, scheduler):
+    def run_round(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(round_scheduler, 'run_round', run_round)
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.submit({"name": "t", "count": 2}, []).result(2)
+
+
+def test_deadline_cancels_waiting_rounds(rounds, scheduler):
+    task_runner.set_run_deadline(time.time() + 0.25)
+    try:
+        started = time.monotonic()
+        result = scheduler.submit({"name": "t", "count": 10, "interval_seconds": 0.1}, []).result(2)
+    finally:
+        task_runner.set_run_deadline(None)
+    assert not result["success"]
+    assert result["message"].startswith("已取消: 超过运行截止时间 (完成 ")
+    assert result["message"].endswith("/10 轮)")
+    assert 2 <= len(rounds) <= 4
+    # 截止时间到达时立即结束，不再等待下一个间隔
+    assert time.monotonic() - started < 0.5
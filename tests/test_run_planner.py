@@ -0,0 +1,46 @@
+import logging
+
+from run_planner import estimate_duration, plan_run
+
+
+def test_estimate_without_history_counts_waits_and_rounds():
+    assert estimate_duration({"count": 3, "interval_seconds": 10}) == 23.0
+    assert estimate_duration({"count": 6, "interval_seconds": 2, "concurrency": 3}) == 12.0
+    assert estimate_duration({"count": 0}) == 0.0
+    assert estimate_duration({}) == 1.0
+
+
+def test_estimate_prefers_history_but_not_below_the_planned_wait():
+    task = {"count": 3, "interval_seconds": 10}
+    assert estimate_duration(task, {"runs": 4, "avg_duration": 45.0}) == 45.0
+    assert estimate_duration(task, {"runs": 4, "avg_duration": 5.0}) == 20.0
+    assert estimate_duration(task, {"runs": 0, "avg_duration": 0}) == 23.0
+
+
+def test_plan_orders_by_priority_then_longest_estimate():
+    tasks = [
+        {"name": "short"},
+        {"name": "long", "count": 5, "interval_seconds": 60},
+        {"name": "urgent", "priority": 5},
+        {"name": "history"},
+        {"name": "background", "priority": -1, "count": 100, "interval_seconds": 60},
+        {"name": "bad-priority", "priority": "high", "count": 2},
+    ]
+    stats = {"history": {"runs": 3, "avg_duration": 100.0}}
+    planned = plan_run(tasks, stats)
+    assert [t["name"] for t in planned] == ["urgent", "long", "history", "bad-priority", "short", "background"]
+    # 返回新列表，不修改调用方的任务顺序
+    assert tasks[0]["name"] == "short"
+
+
+def test_plan_keeps_original_order_for_ties():
+    tasks = [{"name": name} for name in "abc"]
+    assert [t["name"] for t in plan_run(tasks, {})] == ["a", "b", "c"]
+
+
+def test_plan_warns_about_tasks_longer_than_the_deadline(caplog):
+    tasks = [{"name": "slow", "count": 4, "interval_seconds": 30}, {"name": "quick"}]
+    with caplog.at_level(logging.WARNING, logger='CheckinTask'):
+        plan_run(tasks, {}, deadline_seconds=60)
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1 and "'slow'" in warnings[0]
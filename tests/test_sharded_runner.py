@@ -0,0 +1,67 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+from metrics import get_registry
+from sharded_runner import run_sharded
+
+
+class _OkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def har(tmp_path, monkeypatch):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _OkHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    path = tmp_path / "ok.har"
+    path.write_text(json.dumps({"log": {"entries": [
+        {"request": {"method": "GET", "url": f"{url}/login", "headers": []}},
+        {"request": {"method": "GET", "url": f"{url}/checkin", "headers": []}},
+    ]}}))
+    # 工作进程按环境变量计算配置，不向仓库目录写入缓存
+    monkeypatch.setenv('PLAN_CACHE_ENABLED', 'false')
+    monkeypatch.setenv('DNS_CACHE_ENABLED', 'false')
+    yield str(path), f"127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_results_and_metrics_from_all_workers_are_merged(har):
+    har_file, netloc = har
+    tasks = [{"name": f"t{i}", "har_file": har_file, "count": 2} for i in range(4)]
+    tasks.append({"name": "missing", "har_file": "/nonexistent/missing.har"})
+    baseline = get_registry().snapshot()
+
+    results = run_sharded(tasks, processes=2, threads_per_process=2)
+
+    by_name = {result["name"]: result for result in results}
+    assert sorted(by_name) == ["missing", "t0", "t1", "t2", "t3"]
+    assert all(by_name[f"t{i}"]["success"] for i in range(4))
+    assert not by_name["missing"]["success"] and "HAR文件未找到" in by_name["missing"]["message"]
+
+    # 4 个任务 × 2 轮 × 2 个步骤，指标来自两个工作进程的快照
+    rows = get_registry().since(baseline).host_summary()
+    assert [(row["host"], row["count"]) for row in rows] == [(netloc, 16)]
+
+
+def test_workers_inherit_the_run_deadline(har):
+    har_file, _ = har
+    tasks = [{"name": "late", "har_file": har_file, "count": 3}]
+    results = run_sharded(tasks, processes=1, threads_per_process=1, deadline=time.time() - 1)
+    assert len(results) == 1
+    assert results[0]["message"] == "已取消: 超过运行截止时间 (完成 0/3 轮)"
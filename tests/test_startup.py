@@ -0,0 +1,16 @@
+import startup_check
+
+
+def test_cold_import_of_main_stays_within_budget_and_has_no_side_effects():
+    median, timings, result = startup_check.measure('main', runs=5)
+    assert median < startup_check.DEFAULT_BUDGET_MS, f"导入 main 耗时 {timings}"
+    assert startup_check.side_effects(result) == []
+    assert 'task.log' not in result["new_files"]
+    assert result["log_handlers"] == 0 and not result["notifier_created"]
+
+
+def test_side_effects_are_reported():
+    result = {"env_loaded": False, "config_loaded": False, "threads": [], "new_files": ["task.log"],
+              "log_handlers": 1, "notifier_created": True}
+    problems = startup_check.side_effects(result)
+    assert len(problems) == 3 and any("task.log" in problem for problem in problems)
@@ -0,0 +1,255 @@
+import threading
+import time
+
+import pytest
+
+import config
+import task_runner
+from run_planner import plan_run
+
+
+def _make_hars(tmp_path, names):
+    paths = {}
+    for name in names:
+        path = tmp_path / f"{name}.har"
+        path.write_text("{}")
+        paths[name] = str(path)
+    return paths
+
+
+def test_iter_task_requests_does_not_wait_for_a_slow_first_har(tmp_path, monkeypatch):
+    hars = _make_hars(tmp_path, ["big", "small"])
+    release = threading.Event()
+
+    def load_plan(har_file):
+        if har_file == hars["big"]:
+            release.wait(5)
+        return [har_file]
+
+    monkeypatch.setattr(task_runner, "load_plan", load_plan)
+    monkeypatch.setattr(config, "DNS_CACHE_ENABLED", False, raising=False)
+
+    tasks = [{"name": "big", "har_file": hars["big"], "priority": 10},
+             {"name": "small", "har_file": hars["small"]}]
+    planned = plan_run(tasks, {})
+    assert [t["name"] for t in planned] == ["big", "small"]
+
+    stream = task_runner.iter_task_requests(planned, max_workers=2)
+    first = next(stream)
+    # 排在计划最前面的 HAR 仍在解析时，已就绪的任务先产出
+    assert first[0]["name"] == "small" and not release.is_set()
+    release.set()
+    assert [task["name"] for task, _, _ in stream] == ["big"]
+
+
+def test_iter_task_requests_prefers_planned_order_among_ready_tasks(tmp_path, monkeypatch):
+    names = ["first", "second", "third", "fourth"]
+    hars = _make_hars(tmp_path, names)
+    release = threading.Event()
+    fourth_loaded = threading.Event()
+
+    def load_plan(har_file):
+        if har_file == hars["first"]:
+            time.sleep(0.3)
+        elif har_file == hars["third"]:
+            release.wait(5)
+            # 比 fourth 晚解析完成
+            fourth_loaded.wait(5)
+        elif har_file == hars["fourth"]:
+            release.wait(5)
+            fourth_loaded.set()
+        return [har_file]
+
+    monkeypatch.setattr(task_runner, "load_plan", load_plan)
+    monkeypatch.setattr(config, "DNS_CACHE_ENABLED", False, raising=False)
+
+    tasks = [{"name": name, "har_file": hars[name]} for name in names]
+    stream = task_runner.iter_task_requests(tasks, max_workers=4)
+    assert next(stream)[0]["name"] == "second"
+    release.set()
+    # 调用方处理 second 期间 third 与 fourth 都已就绪，按计划顺序先产出 third
+    time.sleep(0.1)
+    assert [task["name"] for task, _, _ in stream] == ["third", "fourth", "first"]
+
+
+def test_iter_task_requests_yields_config_errors_first_and_shares_har(tmp_path, monkeypatch):
+    hars = _make_hars(tmp_path, ["a", "b"])
+    loads = []
+
+    def load_plan(har_file):
+        loads.append(har_file)
+        return [har_file]
+
+    monkeypatch.setattr(task_runner, "load_plan", load_plan)
+    monkeypatch.setattr(config, "DNS_CACHE_ENABLED", False, raising=False)
+
+    tasks = [
+        {"name": "b1", "har_file": hars["b"]},
+        {"name": "a1", "har_file": hars["a"]},
+        {"name": "bad", "har_file": hars["a"], "priority": "high"},
+        {"name": "b2", "har_file": hars["b"]},
+    ]
+    yielded = list(task_runner.iter_task_requests(tasks))
+    names = [task["name"] for task, _, _ in yielded]
+    assert names[0] == "bad" and sorted(names[1:]) == ["a1", "b1", "b2"]
+    assert names.index("b1") < names.index("b2")
+    assert "priority" in yielded[0][2]["message"]
+    assert sorted(loads) == sorted([hars["a"], hars["b"]])
+    plans = {task["name"]: plan for task, plan, _ in yielded}
+    assert plans["b1"] is plans["b2"]
+
+
+def test_threaded_engine_submits_ready_task_while_other_har_parses(tmp_path, monkeypatch):
+    import main
+
+    hars = _make_hars(tmp_path, ["slow", "fast"])
+    release = threading.Event()
+    started_while_parsing = []
+
+    def load_plan(har_file):
+        if har_file == hars["slow"]:
+            # 只有 fast 任务开始执行后才会解析完成；未流水线化时会等到超时
+            release.wait(5)
+        return [har_file]
+
+    def run_task(task, requests_list):
+        if task["name"] == "fast":
+            started_while_parsing.append(not release.is_set())
+            release.set()
+        return {"name": task["name"], "success": True, "duration": 0, "message": "OK"}
+
+    monkeypatch.setattr(task_runner, "load_plan", load_plan)
+    monkeypatch.setattr(main, "run_task", run_task)
+    monkeypatch.setattr(config, "DNS_CACHE_ENABLED", False, raising=False)
+
+    tasks = [{"name": "slow", "har_file": hars["slow"]}, {"name": "fast", "har_file": hars["fast"]}]
+    results = []
+    started = time.monotonic()
+    main._run_tasks_threaded(tasks, results)
+
+    assert started_while_parsing == [True]
+    assert time.monotonic() - started < 2
+    assert sorted(r["name"] for r in results) == ["fast", "slow"]
+
+
+class _ConcurrentRounds:
+    """替换 run_round：记录各轮的开始时间与同时进行的最大轮数，fail 中的轮次返回失败。"""
+    def __init__(self, duration: float = 0.05, fail=()):
+        self.duration = duration
+        self.fail = set(fail)
+        self.started = {}
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, task_name, requests_list, round_idx, count, success_check, retry_policy, cancel=None):
+        with self._lock:
+            self.started[round_idx] = time.monotonic()
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.duration)
+            if round_idx in self.fail:
+                return False, "步骤 1 失败 - 状态码 500"
+            return True, ""
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_concurrent_rounds_fill_the_window_and_count_every_round(monkeypatch):
+    rounds = _ConcurrentRounds()
+    monkeypatch.setattr(task_runner, "run_round", rounds)
+    result = task_runner.run_task({"name": "t", "count": 7, "concurrency": 3, "success_msg": "完成"}, [])
+    assert result["success"] and result["message"] == "完成"
+    assert sorted(rounds.started) == list(range(7))
+    assert rounds.max_active == 3
+
+
+def test_concurrent_rounds_keep_the_interval_between_starts(monkeypatch):
+    rounds = _ConcurrentRounds(duration=0.2)
+    monkeypatch.setattr(task_runner, "run_round", rounds)
+    result = task_runner.run_task({"name": "t", "count": 3, "concurrency": 3, "interval_seconds": 0.05}, [])
+    starts = [rounds.started[i] for i in range(3)]
+    assert result["success"]
+    assert all(b - a >= 0.045 for a, b in zip(starts, starts[1:]))
+    # 各轮在前一轮结束前就已开始
+    assert rounds.max_active == 3
+
+
+def test_failed_concurrent_round_stops_new_rounds(monkeypatch):
+    rounds = _ConcurrentRounds(fail={2})
+    monkeypatch.setattr(task_runner, "run_round", rounds)
+    result = task_runner.run_task({"name": "t", "count": 20, "concurrency": 3, "fail_msg": "签到失败"}, [])
+    assert not result["success"]
+    assert result["message"] == "签到失败: 第 3 轮步骤 1 失败 - 状态码 500"
+    assert len(rounds.started) < 20
+
+
+def test_deadline_reports_completed_concurrent_rounds(monkeypatch):
+    rounds = _ConcurrentRounds(duration=0.1)
+    monkeypatch.setattr(task_runner, "run_round", rounds)
+    task_runner.set_run_deadline(time.time() + 0.25)
+    try:
+        result = task_runner.run_task({"name": "t", "count": 20, "concurrency": 2}, [])
+    finally:
+        task_runner.set_run_deadline(None)
+    completed = len(rounds.started)
+    assert not result["success"]
+    assert result["message"] == f"已取消: 超过运行截止时间 (完成 {completed}/20 轮)"
+    assert 2 <= completed < 20
+
+
+def test_deadline_stops_a_sequential_task_between_steps(monkeypatch):
+    from request_plan import compile_request
+
+    sent = []
+
+    def send(task_name, plan, current, total, cookie_jar, check, policy):
+        sent.append(current)
+        time.sleep(0.05)
+        return True, "OK"
+
+    monkeypatch.setattr(task_runner, "_send_request_with_retry", send)
+    steps = [compile_request('GET', f"http://example.test/{i}", {}, None) for i in range(3)]
+    task_runner.set_run_deadline(time.time() + 0.2)
+    try:
+        result = task_runner.run_task({"name": "t", "count": 10}, steps)
+    finally:
+        task_runner.set_run_deadline(None)
+    # 第一轮的 3 个步骤完成，第二轮在截止时间到达后的下一个步骤前停止，不计入完成轮数
+    assert result["message"] == "已取消: 超过运行截止时间 (完成 1/10 轮)"
+    assert sent[:3] == ["1-1", "1-2", "1-3"] and 3 < len(sent) < 6
+
+
+def test_expired_deadline_cancels_before_the_first_round(monkeypatch):
+    monkeypatch.setattr(task_runner, "run_round", lambda *args: pytest.fail("不应开始任何轮次"))
+    task_runner.set_run_deadline(time.time() - 1)
+    try:
+        result = task_runner.run_task({"name": "t", "count": 2, "interval_seconds": 5}, [])
+    finally:
+        task_runner.set_run_deadline(None)
+    assert not result["success"] and result["message"] == "已取消: 超过运行截止时间 (完成 0/2 轮)"
+
+
+def test_rate_limit_wait_past_the_deadline_cancels_the_step():
+    from rate_limiter import HostRateLimiter, set_rate_limiter
+    from request_plan import compile_request
+    from retry_policy import get_circuit_breaker
+
+    limiter = HostRateLimiter(default_rate=0.1, default_burst=1)
+    # 先用掉突发额度，下一个请求需要等待约 10 秒
+    limiter.reserve("example.test")
+    previous = set_rate_limiter(limiter)
+    task_runner.set_run_deadline(time.time() + 0.5)
+    try:
+        start = time.monotonic()
+        result = task_runner.run_task({"name": "t", "count": 2},
+                                      [compile_request('GET', "http://example.test/", {}, None)])
+        assert time.monotonic() - start < 0.5
+    finally:
+        task_runner.set_run_deadline(None)
+        set_rate_limiter(previous)
+    assert not result["success"]
+    assert result["message"] == "已取消: 超过运行截止时间 (完成 0/2 轮)"
+    assert get_circuit_breaker().allow("example.test")